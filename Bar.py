@@ -1,55 +1,218 @@
+from math import isclose
+
+DEFAULT_STOCK_LENGTH = 24.0 #feet, the length extrusions are bought in
+
 class BarType:
-    def __init__(self, name, cost_per_unit: float, thickness ):
+    def __init__(self, name, cost_per_unit: float, thickness, stock_length: float = DEFAULT_STOCK_LENGTH, type_id = None):
         self.name = name
         self.cost_per_unit = cost_per_unit 
         self.thickness = thickness
+        self.stock_length = stock_length
+        self.type_id = type_id #id in the catalog, None for types that aren't from it
 
 class Bar:
-    def __init__(self, bar_type, length: float):
+    def __init__(self, bar_type, length: float, elevation: float = 0.0, height: float = 0.0):
         self.bar_type = bar_type
         #self.cost_per_unit = cost_per_unit
         self.length = length
+        self.elevation = elevation #feet above the ground at the bar's start
+        self.height = height #feet the bar rises from its start to its end
 
     def cost(self):
         return self.length * self.bar_type.cost_per_unit
     
+class TypeTotals:
+    """ Running count, footage and cost of one bar type in a project """
+    def __init__(self, bar_type):
+        self.bar_type = bar_type
+        self.count = 0
+        self.footage = 0.0
+        self.cost = 0.0
+
 class PoolProject:
-    def __init__(self):
-        self.bars = []
+    def __init__(self, check = False, store = None):
+        self.bars = {} #id(bar) -> bar
+        #optional BarStore.BarStore the bars live in as rows, make them with new_bar
+        self.store = store
+        self.total_cost = 0.0
+        self.type_totals = {} #BarType -> TypeTotals
+        #check mode recomputes everything after each change and compares it to the running totals
+        self.check = check
+        #called with a BarType after every change to that type's totals, see InventoryModel
+        self.listeners = []
+
+    def new_bar(self, bar_type, length, elevation = 0.0, height = 0.0):
+        """ A bar for add_bar: a row of the store when the project has one, a Bar otherwise.
+        A row is a BarView, keep the one returned here, another view of the row isn't the same bar to the project """
+        if self.store is None:
+            return Bar(bar_type = bar_type, length = length, elevation = elevation, height = height)
+        #only counts in the store once it's added, one that never is keeps its row until the store is cleared
+        return self.store.append(bar_type, length, elevation = elevation, height = height, live = False)
+
+    def _stored(self, bar):
+        return self.store is not None and getattr(bar, 'store', None) is self.store
+
+    def __contains__(self, bar):
+        return id(bar) in self.bars
+
+    def __len__(self):
+        return len(self.bars)
+
     def add_bar(self, bar: Bar):
-        self.bars.append(bar)
+        self.bars[id(bar)] = bar
+        if self._stored(bar):
+            self.store.attach(bar)
+        self._apply(bar, 1)
+        self._check()
+        self._changed(bar.bar_type)
+
+    def add_bars(self, bars):
+        """ Adds many bars in one go, each type's listeners are called once however many of its bars came in """
+        touched = {}
+        for bar in bars:
+            self.bars[id(bar)] = bar
+            if self._stored(bar):
+                self.store.attach(bar)
+            self._apply(bar, 1)
+            touched[bar.bar_type] = None
+        self._check()
+        for bar_type in touched:
+            self._changed(bar_type)
 
     def remove_bar(self, bar: Bar):
-        self.bars.remove(bar)
+        del self.bars[id(bar)]
+        self._apply(bar, -1)
+        if self._stored(bar):
+            #kept while something still holds the bar, an undo can add it back
+            self.store.detach(bar)
+        self._check()
+        self._changed(bar.bar_type)
+
+    def set_bar_length(self, bar: Bar, length: float):
+        self._apply(bar, -1)
+        bar.length = length
+        self._apply(bar, 1)
+        self._check()
+        self._changed(bar.bar_type)
+
+    def set_bar_type(self, bar: Bar, bar_type: BarType):
+        old_type = bar.bar_type
+        self._apply(bar, -1)
+        bar.bar_type = bar_type
+        self._apply(bar, 1)
+        self._check()
+        self._changed(old_type)
+        if bar_type is not old_type:
+            self._changed(bar_type)
+
+    def update_bars(self, changes):
+        """ Sets the type and length of many bars in one go, changes being (bar, bar type, length).
+        Each type touched has its listeners called once, however many of its bars changed """
+        touched = {}
+        for bar, bar_type, length in changes:
+            touched[bar.bar_type] = touched[bar_type] = None
+            self._apply(bar, -1)
+            bar.bar_type = bar_type
+            bar.length = length
+            self._apply(bar, 1)
+        self._check()
+        for bar_type in touched:
+            self._changed(bar_type)
+
+    def clear(self):
+        bar_types = list(self.type_totals)
+        for bar in self.bars.values():
+            if self._stored(bar):
+                self.store.detach(bar)
+        self.bars.clear()
+        self.type_totals.clear()
+        self.total_cost = 0.0
+        for bar_type in bar_types:
+            self._changed(bar_type)
+
+    def _apply(self, bar, sign):
+        totals = self.type_totals.get(bar.bar_type)
+        if totals is None:
+            totals = self.type_totals[bar.bar_type] = TypeTotals(bar.bar_type)
+        cost = bar.cost()
+        totals.count += sign
+        totals.footage += sign * bar.length
+        totals.cost += sign * cost
+        self.total_cost += sign * cost
+        #drop empty entries so rounding error can't pile up in them
+        if totals.count <= 0:
+            del self.type_totals[bar.bar_type]
+        if not self.bars:
+            self.total_cost = 0.0
+
+    def reprice(self, bar_types):
+        """ Brings the totals of bar_types up to date after their prices changed.
+
+        A type's cost is its footage times its price, so this costs one step per type
+        whatever the number of bars, and only those types' listeners are called.
+        A store has its own prices, they're set to the types' new ones first.
+        """
+        if self.store is not None:
+            self.store.reprice({bar_type: bar_type.cost_per_unit for bar_type in bar_types})
+        for bar_type in bar_types:
+            totals = self.type_totals.get(bar_type)
+            if totals is None:
+                continue
+            new_cost = totals.footage * self.price_of(bar_type)
+            self.total_cost += new_cost - totals.cost
+            totals.cost = new_cost
+        self._check()
+        for bar_type in bar_types:
+            if bar_type in self.type_totals:
+                self._changed(bar_type)
+
+    def price_of(self, bar_type):
+        return bar_type.cost_per_unit if self.store is None else self.store.price_of(bar_type)
+
+    def _changed(self, bar_type):
+        for listener in self.listeners:
+            listener(bar_type)
+
+    def _check(self):
+        if self.check:
+            self.verify_totals()
 
     def calculate_total_cost(self):
-        total_price = 0
-        for bar in self.bars:
-            total_price += bar.cost()
-        return total_price
-
-BAR_TYPES = [
-    BarType(name = 'Select Bar Type', cost_per_unit= 0, thickness = 2),
-    BarType(name = '1X2 Open Back', cost_per_unit= .912, thickness = 2),
-    BarType(name = '2X2 Post', cost_per_unit= 1.79, thickness = 2),
-    BarType(name = '2X4', cost_per_unit= 1.58, thickness = 2),
-    BarType(name = '2X5', cost_per_unit= 1.98, thickness = 2),
-    BarType(name = '2X6', cost_per_unit= 2.25, thickness = 2),
-    BarType(name = '2X7', cost_per_unit= 2.50, thickness = 2),
-    BarType(name = '2X8', cost_per_unit= 3.45, thickness = 2),
-    BarType(name = '2X9', cost_per_unit= 3.98, thickness = 2),
-    BarType(name = '2X10', cost_per_unit= 6.13, thickness = 2),
-    BarType(name = '7in Super Gutter', cost_per_unit= 6.50, thickness = 2),
-    BarType(name = '5in Super Gutter', cost_per_unit= 4.60, thickness = 2),
-    BarType(name = "2X10 Rec Tube", cost_per_unit= 16.80, thickness= 4),
-    BarType(name = "2X8 Rec Tube", cost_per_unit= 9.50, thickness= 4),
-    BarType(name = "4X4 Post", cost_per_unit= 8.30, thickness= 4),
-    BarType(name = "4X4 Casting", cost_per_unit= 7.81, thickness= 4),
-]
+        return self.total_cost
+
+    def recalculate_totals(self):
+        """ Full recompute of the aggregates, without touching the running ones """
+        total_cost = 0.0
+        type_totals = {}
+        for bar in self.bars.values():
+            totals = type_totals.get(bar.bar_type)
+            if totals is None:
+                totals = type_totals[bar.bar_type] = TypeTotals(bar.bar_type)
+            totals.count += 1
+            totals.footage += bar.length
+            totals.cost += bar.cost()
+            total_cost += bar.cost()
+        return total_cost, type_totals
+
+    def verify_totals(self):
+        total_cost, type_totals = self.recalculate_totals()
+        if not isclose(total_cost, self.total_cost, abs_tol = 1e-6):
+            raise AssertionError(f"Cached total cost {self.total_cost} != recomputed {total_cost}")
+        if type_totals.keys() != self.type_totals.keys():
+            raise AssertionError("Cached bar types do not match the project's bars")
+        for bar_type, totals in type_totals.items():
+            cached = self.type_totals[bar_type]
+            if (cached.count != totals.count
+                    or not isclose(cached.footage, totals.footage, abs_tol = 1e-6)
+                    or not isclose(cached.cost, totals.cost, abs_tol = 1e-6)):
+                raise AssertionError(f"Cached totals for {bar_type.name} do not match the project's bars")
+        if self.store is not None and not isclose(self.store.calculate_total_cost(), self.total_cost, abs_tol = 1e-6):
+            raise AssertionError(f"Store total {self.store.calculate_total_cost()} != cached {self.total_cost}")
+
 if __name__ == "__main__":
     project = PoolProject()
-    bar1 = Bar(name = "2x2", cost_per_unit= 15, length=5.0)
-    bar2 = Bar(name = "2x4", cost_per_unit = 20, length=3.0)
+    bar1 = Bar(bar_type = BarType(name = "2x2", cost_per_unit = 15, thickness = 2), length = 5.0)
+    bar2 = Bar(bar_type = BarType(name = "2x4", cost_per_unit = 20, thickness = 4), length = 3.0)
     project.add_bar(bar1)
     project.add_bar(bar2)
     print(f"Total cost: {project.calculate_total_cost()}")
\ No newline at end of file
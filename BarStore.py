@@ -0,0 +1,267 @@
+import weakref
+from array import array
+from Bar import Bar, TypeTotals
+from Catalog import BAR_TYPES
+try:
+    import numpy as np
+except ImportError: #numpy is optional, the plain loops below give the same answers
+    np = None
+
+DELETED = -1 #type index of a free row
+WHITE = 0xFFFFFFFF
+
+class BarView:
+    """ Lightweight stand-in for Bar that reads and writes one row of a BarStore """
+    __slots__ = ('store', 'row', '__weakref__')
+
+    def __init__(self, store, row):
+        self.store = store
+        self.row = row
+
+    @property
+    def bar_type(self):
+        return self.store.bar_types[self.store.type_index[self.row]]
+
+    @bar_type.setter
+    def bar_type(self, bar_type):
+        self.store.set_bar_type(self, bar_type)
+
+    @property
+    def length(self):
+        return self.store.length[self.row]
+
+    @length.setter
+    def length(self, length):
+        self.store.set_bar_length(self, length)
+
+    @property
+    def start(self):
+        return self.store.x1[self.row], self.store.y1[self.row]
+
+    @property
+    def end(self):
+        return self.store.x2[self.row], self.store.y2[self.row]
+
+    @property
+    def color(self):
+        return self.store.color[self.row]
+
+    @property
+    def elevation(self):
+        return self.store.elevation[self.row]
+
+    @elevation.setter
+    def elevation(self, elevation):
+        self.store.elevation[self.row] = elevation
+
+    @property
+    def height(self):
+        return self.store.height[self.row]
+
+    @height.setter
+    def height(self, height):
+        self.store.height[self.row] = height
+
+    def cost(self):
+        return self.length * self.store.price[self.store.type_index[self.row]]
+
+    def __eq__(self, other):
+        return isinstance(other, BarView) and other.store is self.store and other.row == self.row
+
+    def __hash__(self):
+        return hash((id(self.store), self.row))
+
+class BarStore:
+    """ Array-backed storage for a PoolProject's bars, see PoolProject(store = ...).
+
+    Every bar is one row across typed columns (type index, length, x1/y1/x2/y2, ARGB color,
+    elevation, height), so a bar costs about 66 bytes instead of several Python objects.
+    Only live rows count towards len(), iteration and the totals. Rows freed by remove_bar()
+    are reused by later bars, so a BarView must not be used after that. A detach()ed row
+    stops counting but keeps its values for as long as its view is alive, which is what lets
+    an undo put a removed bar back. Prices are the store's own, one per entry in bar_types,
+    taken from each type when it's first seen and changed only by reprice(), never on the
+    shared BarTypes.
+    """
+    def __init__(self, bar_types = BAR_TYPES):
+        self.bar_types = list(bar_types)
+        self.type_ids = {bar_type: index for index, bar_type in enumerate(self.bar_types)}
+        self.price = array('d', (bar_type.cost_per_unit for bar_type in self.bar_types))
+        self.type_index = array('h')
+        self.length = array('d')
+        self.x1 = array('d')
+        self.y1 = array('d')
+        self.x2 = array('d')
+        self.y2 = array('d')
+        self.color = array('I')
+        self.elevation = array('d')
+        self.height = array('d')
+        self.live = array('b') #1 for rows that count, 0 for free and detached ones
+        self.count = 0
+        self.free_rows = []
+        self.finalizers = {} #row -> weakref.finalize freeing a detached row with its view
+
+    def __len__(self):
+        return self.count
+
+    def __contains__(self, view):
+        return view.store is self and self.live[view.row] == 1
+
+    def __iter__(self):
+        for row, live in enumerate(self.live):
+            if live:
+                yield BarView(self, row)
+
+    def append(self, bar_type, length, x1 = 0.0, y1 = 0.0, x2 = 0.0, y2 = 0.0, color = WHITE, elevation = 0.0, height = 0.0, live = True):
+        """ A new row, live=False leaves it uncounted until attach() """
+        type_index = self._type_id(bar_type)
+        if self.free_rows:
+            row = self.free_rows.pop()
+            self.type_index[row] = type_index
+            self.length[row] = length
+            self.x1[row], self.y1[row], self.x2[row], self.y2[row] = x1, y1, x2, y2
+            self.color[row] = color
+            self.elevation[row] = elevation
+            self.height[row] = height
+            self.live[row] = live
+        else:
+            row = len(self.type_index)
+            self.type_index.append(type_index)
+            self.length.append(length)
+            self.x1.append(x1)
+            self.y1.append(y1)
+            self.x2.append(x2)
+            self.y2.append(y2)
+            self.color.append(color)
+            self.elevation.append(elevation)
+            self.height.append(height)
+            self.live.append(live)
+        self.count += live
+        return BarView(self, row)
+
+    def add_bar(self, bar: Bar):
+        """ Copies a Bar into the store, returns its view """
+        return self.append(bar.bar_type, bar.length, elevation = bar.elevation, height = bar.height)
+
+    def remove_bar(self, view: BarView):
+        #freeing a row twice would later hand it to two bars
+        if self.type_index[view.row] == DELETED:
+            raise KeyError(f"row {view.row} was already removed")
+        self._free(view.row)
+
+    def _free(self, row):
+        finalizer = self.finalizers.pop(row, None)
+        if finalizer is not None:
+            finalizer.detach()
+        if self.live[row]:
+            self.count -= 1
+        self.type_index[row] = DELETED
+        self.length[row] = 0.0
+        self.live[row] = 0
+        self.free_rows.append(row)
+
+    def detach(self, view: BarView):
+        """ Stops counting the bar, its row is kept until attach(view) or until view is garbage """
+        if not self.live[view.row]:
+            return
+        self.live[view.row] = 0
+        self.count -= 1
+        self.finalizers[view.row] = weakref.finalize(view, self._release, view.row)
+
+    def attach(self, view: BarView):
+        """ Counts a detached bar again """
+        finalizer = self.finalizers.pop(view.row, None)
+        if finalizer is not None:
+            finalizer.detach()
+        if not self.live[view.row]:
+            self.live[view.row] = 1
+            self.count += 1
+
+    def _release(self, row):
+        #the last reference to a detached bar's view is gone, nothing can attach it any more
+        del self.finalizers[row]
+        self._free(row)
+
+    def set_bar_length(self, view: BarView, length: float):
+        self.length[view.row] = length
+
+    def set_bar_type(self, view: BarView, bar_type):
+        self.type_index[view.row] = self._type_id(bar_type)
+
+    def _type_id(self, bar_type):
+        type_index = self.type_ids.get(bar_type)
+        if type_index is None:
+            type_index = self.type_ids[bar_type] = len(self.bar_types)
+            self.bar_types.append(bar_type)
+            self.price.append(bar_type.cost_per_unit)
+        return type_index
+
+    def clear(self):
+        for finalizer in self.finalizers.values():
+            finalizer.detach()
+        self.finalizers.clear()
+        for column in (self.type_index, self.length, self.x1, self.y1, self.x2, self.y2, self.color, self.elevation, self.height, self.live):
+            del column[:]
+        self.count = 0
+        self.free_rows.clear()
+
+    def price_of(self, bar_type):
+        type_index = self.type_ids.get(bar_type)
+        return bar_type.cost_per_unit if type_index is None else self.price[type_index]
+
+    def prices(self):
+        return self.price.tolist()
+
+    def calculate_total_cost(self, prices = None):
+        """ Total cost, optionally under a different price list (one price per entry in bar_types) """
+        if prices is None:
+            prices = self.prices()
+        if np is not None:
+            types = np.frombuffer(self.type_index, dtype = np.int16)
+            lengths = np.frombuffer(self.length, dtype = np.float64)
+            live = np.frombuffer(self.live, dtype = np.int8)
+            #free rows index the last price, live zeroes them out along with the detached ones
+            return float(lengths @ (np.asarray(prices, dtype = np.float64)[types] * live))
+        return sum(length * prices[type_index] for type_index, length, live in zip(self.type_index, self.length, self.live) if live)
+
+    def footage_by_type(self):
+        """ Returns (count, footage) lists indexed like bar_types """
+        size = len(self.bar_types)
+        if np is not None:
+            types = np.frombuffer(self.type_index, dtype = np.int16)
+            live = np.frombuffer(self.live, dtype = np.int8).astype(bool)
+            counts = np.bincount(types[live], minlength = size)
+            footage = np.bincount(types[live], weights = np.frombuffer(self.length, dtype = np.float64)[live], minlength = size)
+            return counts.tolist(), footage.tolist()
+        counts = [0] * size
+        footage = [0.0] * size
+        for type_index, length, live in zip(self.type_index, self.length, self.live):
+            if live:
+                counts[type_index] += 1
+                footage[type_index] += length
+        return counts, footage
+
+    @property
+    def type_totals(self):
+        """ Same shape as PoolProject.type_totals """
+        counts, footage = self.footage_by_type()
+        type_totals = {}
+        for bar_type, price, count, feet in zip(self.bar_types, self.price, counts, footage):
+            if count:
+                totals = type_totals[bar_type] = TypeTotals(bar_type)
+                totals.count = count
+                totals.footage = feet
+                totals.cost = feet * price
+        return type_totals
+
+    @property
+    def total_cost(self):
+        return self.calculate_total_cost()
+
+    def reprice(self, prices):
+        """ Applies a new price list (bar type or name -> cost per unit) to this store and returns the new total """
+        for type_index, bar_type in enumerate(self.bar_types):
+            new_price = prices.get(bar_type, prices.get(bar_type.name))
+            if new_price is not None:
+                self.price[type_index] = new_price
+        return self.calculate_total_cost()
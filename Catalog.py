@@ -0,0 +1,113 @@
+""" The price catalog: bar types loaded from a JSON data file instead of code.
+
+catalog.json is a list of {"id", "name", "cost_per_unit", "thickness", "stock_length"}
+objects. Ids are what identify a type across reloads, so a type can be renamed or
+repriced without losing track of the bars drawn with it. Reloading updates the existing
+BarType objects in place, every Bar already holding one sees the new values with no
+pass over the bars, and listeners are told which types' prices changed so projects can
+refresh just those totals, and which were renamed so the names shown can follow.
+"""
+import os
+import json
+from numbers import Real
+from Bar import BarType, DEFAULT_STOCK_LENGTH
+
+CATALOG_PATH = os.environ.get('POOLSCREEN_CATALOG', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'catalog.json'))
+
+class CatalogError(ValueError):
+    """ Raised when a catalog file can't be read, the catalog is left as it was """
+
+def parse_entries(entries, source):
+    """ Checks a decoded catalog file, returns its entries as (id, name, cost, thickness, stock length) """
+    if not isinstance(entries, list):
+        raise CatalogError(f"{source}: expected a list of bar types")
+    parsed = []
+    ids = set()
+    names = set()
+    for index, entry in enumerate(entries):
+        if not isinstance(entry, dict):
+            raise CatalogError(f"{source}: entry {index} is not an object")
+        type_id = entry.get('id')
+        name = entry.get('name')
+        cost = entry.get('cost_per_unit')
+        thickness = entry.get('thickness')
+        stock_length = entry.get('stock_length', DEFAULT_STOCK_LENGTH)
+        if not isinstance(type_id, int) or type_id in ids:
+            raise CatalogError(f"{source}: entry {index} needs a unique integer id")
+        if not isinstance(name, str) or not name or name in names:
+            raise CatalogError(f"{source}: entry {index} needs a unique name")
+        if not isinstance(cost, Real) or cost < 0:
+            raise CatalogError(f"{source}: {name} needs a cost_per_unit of 0 or more")
+        if not isinstance(thickness, int) or thickness <= 0:
+            raise CatalogError(f"{source}: {name} needs a positive integer thickness")
+        if not isinstance(stock_length, Real) or stock_length <= 0:
+            raise CatalogError(f"{source}: {name} needs a positive stock_length")
+        ids.add(type_id)
+        names.add(name)
+        parsed.append((type_id, name, float(cost), thickness, float(stock_length)))
+    if not parsed:
+        raise CatalogError(f"{source}: no bar types")
+    return parsed
+
+class Catalog:
+    """ Bar types indexed by id and by name, reloadable from the file they came from """
+    def __init__(self, path = CATALOG_PATH):
+        self.path = path
+        self.types = [] #in file order, what the UI offers, the same list object for the catalog's lifetime
+        self.by_id = {}
+        self.by_name = {}
+        #called with {BarType: old cost_per_unit} and {BarType: old name} after a reload changes
+        #prices or names, see PoolProject.reprice
+        self.listeners = []
+        self.load()
+
+    def __getitem__(self, type_id):
+        return self.by_id[type_id]
+
+    def __len__(self):
+        return len(self.types)
+
+    def __iter__(self):
+        return iter(self.types)
+
+    def get(self, name, default = None):
+        return self.by_name.get(name, default)
+
+    def load(self):
+        """ (Re)reads the file. Returns {BarType: old cost_per_unit} for the types whose price changed.
+        Listeners get that and {BarType: old name} for the types renamed, when either has any """
+        try:
+            with open(self.path) as f:
+                entries = parse_entries(json.load(f), self.path)
+        except (OSError, json.JSONDecodeError) as e:
+            raise CatalogError(f"{self.path}: {e}") from e
+        #everything was checked above, nothing below can fail halfway
+        repriced = {}
+        renamed = {}
+        types = []
+        for type_id, name, cost, thickness, stock_length in entries:
+            bar_type = self.by_id.get(type_id)
+            if bar_type is None:
+                bar_type = self.by_id[type_id] = BarType(name = name, cost_per_unit = cost, thickness = thickness,
+                                                         stock_length = stock_length, type_id = type_id)
+            else:
+                if bar_type.cost_per_unit != cost:
+                    repriced[bar_type] = bar_type.cost_per_unit
+                if bar_type.name != name:
+                    renamed[bar_type] = bar_type.name
+                bar_type.name = name
+                bar_type.cost_per_unit = cost
+                bar_type.thickness = thickness
+                bar_type.stock_length = stock_length
+            types.append(bar_type)
+        #types dropped from the file stay in by_id for bars that still use them, they're just no longer offered
+        self.types[:] = types
+        self.by_name = {bar_type.name: bar_type for bar_type in types}
+        if repriced or renamed:
+            for listener in self.listeners:
+                listener(repriced, renamed)
+        return repriced
+
+catalog = Catalog()
+#the catalog's types, reloads update this list in place
+BAR_TYPES = catalog.types
@@ -0,0 +1,152 @@
+from collections import deque
+from PyQt6.QtCore import QLineF
+
+UNDO_LIMIT = 500
+
+class Command:
+    """ One undoable change. redo() applies it, undo() reverts it, both in O(1) """
+    def redo(self):
+        raise NotImplementedError
+
+    def undo(self):
+        raise NotImplementedError
+
+    def merge(self, command):
+        """ Folds a newer command into this one, returns True if it did """
+        return False
+
+class AddBarCommand(Command):
+    def __init__(self, window, bar_data):
+        self.window = window
+        self.bar_data = bar_data
+
+    def redo(self):
+        self.window.attach_bar(self.bar_data)
+
+    def undo(self):
+        self.window.detach_bar(self.bar_data)
+
+class DeleteBarCommand(AddBarCommand):
+    def redo(self):
+        self.window.detach_bar(self.bar_data)
+
+    def undo(self):
+        self.window.attach_bar(self.bar_data)
+
+class EditLengthCommand(Command):
+    def __init__(self, window, bar_data, new_length, new_line):
+        self.window = window
+        self.bar_data = bar_data
+        self.old_length = bar_data['bar'].length
+        self.old_line = QLineF(bar_data['item'].line())
+        self.new_length = new_length
+        self.new_line = QLineF(new_line)
+
+    def redo(self):
+        self.window.apply_bar_length(self.bar_data, self.new_length, self.new_line)
+
+    def undo(self):
+        self.window.apply_bar_length(self.bar_data, self.old_length, self.old_line)
+
+class ChangeTypeCommand(Command):
+    def __init__(self, window, bar_data, new_type):
+        self.window = window
+        self.bar_data = bar_data
+        self.old_type = bar_data['bar'].bar_type
+        self.new_type = new_type
+
+    def redo(self):
+        self.window.apply_bar_type(self.bar_data, self.new_type)
+
+    def undo(self):
+        self.window.apply_bar_type(self.bar_data, self.old_type)
+
+class ChangeHeightCommand(Command):
+    def __init__(self, window, bar_data, new_elevation, new_height):
+        self.window = window
+        self.bar_data = bar_data
+        self.old_elevation = bar_data['bar'].elevation
+        self.old_height = bar_data['bar'].height
+        self.new_elevation = new_elevation
+        self.new_height = new_height
+
+    def redo(self):
+        self.window.apply_bar_height(self.bar_data, self.new_elevation, self.new_height)
+
+    def undo(self):
+        self.window.apply_bar_height(self.bar_data, self.old_elevation, self.old_height)
+
+class EditBarsCommand(Command):
+    """ A bulk edit of the selection, moved, rotated, scaled, retyped or resized, as one undo step """
+    def __init__(self, window, edits):
+        #edits are (bar_data, bar type, length, line) as each bar is to end up
+        self.window = window
+        self.old = [(bar_data, bar_data['bar'].bar_type, bar_data['bar'].length, QLineF(bar_data['item'].line())) for bar_data, _, _, _ in edits]
+        self.new = [(bar_data, bar_type, length, QLineF(line)) for bar_data, bar_type, length, line in edits]
+
+    def redo(self):
+        self.window.apply_bar_edits(self.new)
+
+    def undo(self):
+        self.window.apply_bar_edits(self.old)
+
+class AddTextCommand(Command):
+    def __init__(self, scene, text_item):
+        self.scene = scene
+        self.text_item = text_item
+
+    def redo(self):
+        self.scene.addItem(self.text_item)
+
+    def undo(self):
+        self.scene.removeItem(self.text_item)
+
+class DeleteTextCommand(AddTextCommand):
+    def redo(self):
+        self.scene.removeItem(self.text_item)
+
+    def undo(self):
+        self.scene.addItem(self.text_item)
+
+class UndoStack:
+    """ Undo/redo history holding at most limit commands, the oldest are forgotten first """
+    def __init__(self, limit = UNDO_LIMIT):
+        self.undo_commands = deque(maxlen = limit)
+        self.redo_commands = []
+
+    @property
+    def limit(self):
+        return self.undo_commands.maxlen
+
+    def set_limit(self, limit):
+        self.undo_commands = deque(self.undo_commands, maxlen = limit)
+
+    def push(self, command):
+        """ Applies the command and records it """
+        command.redo()
+        self.redo_commands.clear()
+        if self.undo_commands and self.undo_commands[-1].merge(command):
+            return
+        self.undo_commands.append(command)
+
+    def can_undo(self):
+        return bool(self.undo_commands)
+
+    def can_redo(self):
+        return bool(self.redo_commands)
+
+    def undo(self):
+        if self.undo_commands:
+            command = self.undo_commands.pop()
+            command.undo()
+            self.redo_commands.append(command)
+
+    def redo(self):
+        if self.redo_commands:
+            command = self.redo_commands.pop()
+            command.redo()
+            self.undo_commands.append(command)
+
+    def clear(self):
+        self.undo_commands.clear()
+        self.redo_commands.clear()
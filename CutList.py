@@ -0,0 +1,180 @@
+import time
+import random
+from bisect import bisect_left, insort
+
+DEFAULT_KERF = 0.125 / 12 #1/8 in saw blade, in feet like every other length
+
+class StockPiece:
+    """ One length of stock and the cuts taken from it """
+    def __init__(self, stock_length):
+        self.stock_length = stock_length
+        self.cuts = []
+        self.remaining = stock_length #usable length left, the kerf after each cut is already taken off
+
+    def waste(self):
+        return self.stock_length - sum(self.cuts)
+
+class CutPlan:
+    """ How one bar type's cuts are taken from its stock """
+    def __init__(self, bar_type, stock_length, kerf, lengths, pieces, oversize):
+        self.bar_type = bar_type
+        self.stock_length = stock_length
+        self.kerf = kerf
+        self.lengths = lengths #sorted lengths the plan was made for
+        self.pieces = pieces
+        self.oversize = oversize #cuts longer than the stock, made from spliced pieces
+
+    @property
+    def stock_count(self):
+        return len(self.pieces)
+
+    @property
+    def cut_length(self):
+        return sum(sum(piece.cuts) for piece in self.pieces)
+
+    @property
+    def waste(self):
+        return self.stock_count * self.stock_length - self.cut_length
+
+    @property
+    def cost(self):
+        """ What the stock costs, as opposed to pricing each bar by its own length """
+        return self.stock_count * self.stock_length * self.bar_type.cost_per_unit
+
+def pack_cuts(lengths, stock_length, kerf = DEFAULT_KERF, time_budget = 0.0):
+    """ Packs cut lengths into as few stock pieces as it can.
+
+    Best-fit decreasing does the packing. With a time_budget (seconds) the improvement
+    pass then tries to do better until the budget runs out. Returns (pieces, oversize cuts).
+    """
+    deadline = time.perf_counter() + time_budget
+    oversize = [length for length in lengths if length > stock_length]
+    cuts = [length for length in lengths if 0 < length <= stock_length]
+    for length in oversize:
+        #whole pieces for the spliced part, the rest is packed like any other cut
+        whole, rest = divmod(length, stock_length)
+        cuts.extend([stock_length] * int(whole))
+        if rest > kerf:
+            cuts.append(rest)
+    cuts.sort(reverse = True)
+    pieces = best_fit(cuts, stock_length, kerf)
+    if time_budget > 0:
+        pieces = improve(cuts, pieces, stock_length, kerf, deadline)
+    return pieces, oversize
+
+def best_fit(cuts, stock_length, kerf):
+    """ Puts each cut, in the order given, into the piece it leaves the least room in """
+    pieces = []
+    #(remaining, piece index) of pieces with room left, sorted so the tightest fit is a bisect away
+    open_pieces = []
+    for length in cuts:
+        index = bisect_left(open_pieces, (length, -1))
+        if index < len(open_pieces):
+            _, piece_index = open_pieces.pop(index)
+            piece = pieces[piece_index]
+        else:
+            piece_index = len(pieces)
+            piece = StockPiece(stock_length)
+            pieces.append(piece)
+        piece.cuts.append(length)
+        #a cut that uses up the rest of the stock doesn't need a saw pass after it
+        piece.remaining = max(0.0, piece.remaining - length - kerf)
+        if piece.remaining > 0:
+            insort(open_pieces, (piece.remaining, piece_index))
+    return pieces
+
+def improve(cuts, pieces, stock_length, kerf, deadline):
+    """ Spends the time until deadline looking for a plan with fewer pieces.
+
+    The first half repacks in shuffled near-decreasing orders, which finds the mixed
+    patterns (say 9 + 8 + 7) that a strictly decreasing order walks past. The rest goes
+    to dissolving the emptiest pieces of the best plan into the others.
+    """
+    #each cut plus its kerf, and a piece holds at most stock plus one kerf of that, so no plan can beat this
+    lower_bound = -(-(sum(cuts) + kerf * len(cuts)) // (stock_length + kerf))
+    rng = random.Random(0) #the same project always gets the same plan
+    halfway = time.perf_counter() + (deadline - time.perf_counter()) / 2
+    while len(pieces) > lower_bound and time.perf_counter() < halfway:
+        order = sorted(cuts, key = lambda length: length * rng.uniform(0.8, 1.2), reverse = True)
+        trial = best_fit(order, stock_length, kerf)
+        if len(trial) < len(pieces):
+            pieces = trial
+
+    failed = set() #pieces that wouldn't dissolve since the last one that did
+    while len(pieces) > lower_bound and time.perf_counter() < deadline:
+        candidates = [piece for piece in pieces if id(piece) not in failed]
+        if not candidates:
+            break
+        target = max(candidates, key = lambda piece: piece.remaining)
+        others = [piece for piece in pieces if piece is not target]
+        if dissolve(target.cuts, others, stock_length, kerf, deadline):
+            pieces = others
+            failed.clear()
+        else:
+            failed.add(id(target))
+    return pieces
+
+def dissolve(cuts, pieces, stock_length, kerf, deadline, max_swaps = 100):
+    """ Fits cuts into pieces, swapping a cut for a shorter one already there when nothing has room.
+
+    Each swap hands back a shorter cut, so the ones left to place keep getting easier
+    to fit. Works on copies and changes nothing unless every cut found a place.
+    """
+    trial = [list(piece.cuts) for piece in pieces]
+    #what a piece can still give up, the next cut needs its length plus a kerf of it
+    slack = [stock_length - sum(piece_cuts) - kerf * (len(piece_cuts) - 1) for piece_cuts in trial]
+    pool = sorted(cuts)
+    swaps = 0
+    while pool:
+        length = pool.pop()
+        best = None
+        for index, room in enumerate(slack):
+            if room >= length + kerf and (best is None or room < slack[best]):
+                best = index
+        if best is not None:
+            trial[best].append(length)
+            slack[best] -= length + kerf
+            continue
+        if swaps >= max_swaps or time.perf_counter() >= deadline:
+            return False
+        best = None
+        best_room = None
+        for index, piece_cuts in enumerate(trial):
+            room = slack[index]
+            for position, other in enumerate(piece_cuts):
+                after = room + other - length
+                if other < length and after >= 0 and (best is None or after < best_room):
+                    best = (index, position)
+                    best_room = after
+        if best is None:
+            return False
+        index, position = best
+        insort(pool, trial[index][position])
+        trial[index][position] = length
+        slack[index] = best_room
+        swaps += 1
+    for piece, piece_cuts, room in zip(pieces, trial, slack):
+        piece.cuts = piece_cuts
+        piece.remaining = max(0.0, room - kerf)
+    return True
+
+def cut_list(project, kerf = DEFAULT_KERF, time_budget = 0.0, previous = None):
+    """ CutPlan for every bar type in a PoolProject.
+
+    previous is the result of an earlier call, types whose cuts haven't changed reuse
+    their plan from it instead of being packed again.
+    """
+    lengths = {}
+    for bar in project.bars.values():
+        lengths.setdefault(bar.bar_type, []).append(bar.length)
+    plans = {}
+    for bar_type, type_lengths in lengths.items():
+        type_lengths.sort()
+        old = previous.get(bar_type) if previous else None
+        if (old is not None and old.stock_length == bar_type.stock_length and old.kerf == kerf
+                and old.lengths == type_lengths):
+            plans[bar_type] = old
+            continue
+        pieces, oversize = pack_cuts(type_lengths, bar_type.stock_length, kerf, time_budget)
+        plans[bar_type] = CutPlan(bar_type, bar_type.stock_length, kerf, type_lengths, pieces, oversize)
+    return plans
@@ -1,24 +1,97 @@
+import time
+STARTED = time.perf_counter() #before the imports below, for the startup report
 import sys
-import requests
-import threading 
-import subprocess
-from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QToolBar, QInputDialog, QGraphicsTextItem, QComboBox, QTabWidget, QTableWidget, QTableWidgetItem, QColorDialog, QFileDialog
-from PyQt6.QtCore import Qt, QPointF, QRectF
-from PyQt6.QtGui import QPainter, QPen, QAction, QKeySequence, QIcon, QColor
-from PyQt6.QtPrintSupport import QPrinter
+import os
+import json
+import traceback
+from PyQt6.QtWidgets import QApplication, QMainWindow, QVBoxLayout, QWidget, QToolBar, QInputDialog, QGraphicsTextItem, QComboBox, QTabWidget, QTableWidget, QTableWidgetItem, QColorDialog, QFileDialog, QLabel, QProgressDialog, QLineEdit, QTableView, QToolButton
+from PyQt6.QtCore import Qt, QPointF, QRectF, QTimer, QLineF, QFileSystemWatcher, QThread, QObject, QEvent, pyqtSignal
+from PyQt6.QtGui import QPainter, QPen, QAction, QKeySequence, QIcon, QColor, QTransform
 from math import sqrt
-from Bar import PoolProject, BarType, Bar, BAR_TYPES
-from DrawingSection import DrawingArea
+from itertools import islice
+from Bar import PoolProject, BarType
+from Catalog import catalog, BAR_TYPES, CatalogError
+from DrawingSection import DrawingArea, bar_to_json, JOINT_TOLERANCE
+from SpatialHash import joint_degrees, estimate_fittings
+from SyncEngine import SyncEngine
+from CutList import cut_list, DEFAULT_KERF
+from InventoryModel import InventoryModel, InventoryFilter, TYPE as TYPE_COLUMN
+from ProjectFile import ProjectWriter, BarRecord, TextRecord, read_project, PROJECT_SUFFIX
+from Commands import UndoStack, AddBarCommand, DeleteBarCommand, EditLengthCommand, ChangeTypeCommand, ChangeHeightCommand, AddTextCommand, DeleteTextCommand, EditBarsCommand, UNDO_LIMIT
+from Views import VIEW_TYPE, ProjectionView
+IMPORTED = time.perf_counter()
 SERVER_URL = "http://127.0.0.1:5000"
+CUT_LIST_BUDGET = 0.05 #seconds spent improving the cut list of each bar type that changed
+AUTOSAVE_INTERVAL = 30000 #ms between autosaves of an open project file
+LOAD_CHUNK = 2000 #bars created per pass of the event loop while a project opens
+CATALOG_SETTLE = 200 #ms to wait after the catalog file changes, editors often write it in several steps
+MIXED = "(mixed)" #shown in the selection's properties where its bars differ
+
+def fetch_server_bars(server_url = SERVER_URL):
+    """ The server's /get_bars list, None if it couldn't be had """
+    import requests #only the network code needs it, and it's slow to import
+    try:
+        response = requests.get(f"{server_url}/get_bars", timeout = 5)
+    except requests.exceptions.RequestException as e:
+        print("Error fetching bars:", e)
+        return None
+    return response.json() if response.status_code == 200 else None
+
+class ServerBarsLoader(QThread):
+    """ fetch_server_bars on a thread, so the window shows without waiting on the server """
+    loaded = pyqtSignal(object) #the bars, or None
+
+    def __init__(self, server_url = SERVER_URL, parent = None):
+        super().__init__(parent)
+        self.server_url = server_url
+
+    def run(self):
+        self.loaded.emit(fetch_server_bars(self.server_url))
+
+def resized_line(line, length):
+    """ line made length feet long along its own direction, from the same start """
+    vector_length = line.length()
+    if vector_length == 0:
+        direction = QPointF(1, 0)
+    else:
+        direction = QPointF(line.dx() / vector_length, line.dy() / vector_length)
+    return QLineF(line.p1(), line.p1() + direction * length * 10)
+
+def server_bars(bars, skipped = None):
+    """ Bars from /get_bars in the form MainWindow.add_bars takes. The ids of bars that are
+    missing a field or have one that isn't a number go in skipped rather than stopping the load """
+    for bar_json in bars:
+        if isinstance(bar_json, dict) and 'start_x' not in bar_json and 'position' in bar_json:
+            continue #bars added from the web page only have a position, they aren't drawn
+        try:
+            bar_id, name, length = bar_json['id'], bar_json['bar_type'], bar_json['length']
+            x1, y1, x2, y2 = bar_json['start_x'], bar_json['start_y'], bar_json['end_x'], bar_json['end_y']
+            elevation, height = bar_json.get('elevation', 0.0), bar_json.get('height', 0.0)
+        except (KeyError, TypeError):
+            if skipped is not None:
+                skipped.append(bar_json.get('id') if isinstance(bar_json, dict) else None)
+            continue
+        numbers = (length, x1, y1, x2, y2, elevation, height)
+        if not isinstance(bar_id, str) or not isinstance(name, str) or any(type(number) not in (int, float) for number in numbers):
+            if skipped is not None:
+                skipped.append(bar_id)
+            continue
+        color = bar_json.get('color')
+        yield (bar_id, catalog.get(name, BAR_TYPES[0]), length, QPointF(x1, y1), QPointF(x2, y2),
+               QColor(color if isinstance(color, str) else '#ffffffff'), elevation, height)
 
 class MainWindow(QMainWindow):
+    project_opened = pyqtSignal() #once every bar of a project being opened is in the drawing
+
     def __init__(self):
         super().__init__()
         self.project = PoolProject()
         self.current_bar_type = None
         self.current_cost_per_unit = None
-        self.bar_counts = {}
-        self.history = []
+        self.undo_stack = UndoStack(UNDO_LIMIT)
+        self.export_worker = None
+        self.project_file = None #ProjectWriter for the file being edited, once there is one
+        self.loading = None #iterator of add_bars tuples still to be created, see start_loading
         self.setWindowTitle("Pool Screen Designer")
         self.setGeometry(100, 100, 800, 600)
 
@@ -34,14 +107,56 @@ class MainWindow(QMainWindow):
 
         self.create_drawing_tab()
         self.create_inventory_tab()
+        #the other views are projections of the drawing, each built the first time its tab is opened
+        self.projection_views = []
+        for view_type in VIEW_TYPE:
+            if not view_type.is_plan:
+                view = ProjectionView(view_type, self.drawing_area)
+                self.projection_views.append(view)
+                self.tabs.addTab(view, view_type.name)
+        self.tabs.currentChanged.connect(self.update_cut_list)
 
        # self.drawing_area = DrawingArea()
         #self.setCentralWidget(self.drawing_area)
 
         self.create_toolbar()
-        self.Ctrl_Z_shortcut() #allows for Ctrl + Z, Ctrl + P, and Ctrl + V
+        self.Ctrl_Z_shortcut() #allows for Ctrl + Z and Ctrl + Shift + Z / Ctrl + Y
         self.statusBar().showMessage("Total cost: $0.00")
-        self.load_bars_from_server()
+
+        #bar changes go to the server from a background thread, the label shows how far behind it is
+        self.sync = SyncEngine(SERVER_URL)
+        self.sync.start()
+        self.sync_label = QLabel()
+        self.statusBar().addPermanentWidget(self.sync_label)
+        #shown once the server has refused changes, sends it the whole drawing again
+        self.resync_action = QAction("Resync", self)
+        self.resync_action.setToolTip("Replace the server's bars with the ones in this drawing")
+        self.resync_action.triggered.connect(self.resync)
+        self.resync_button = QToolButton()
+        self.resync_button.setDefaultAction(self.resync_action)
+        self.resync_button.hide()
+        self.statusBar().addPermanentWidget(self.resync_button)
+        self.sync_timer = QTimer(self)
+        self.sync_timer.timeout.connect(self.update_sync_status)
+        self.sync_timer.start(500)
+
+        self.autosave_timer = QTimer(self)
+        self.autosave_timer.timeout.connect(self.autosave)
+        self.autosave_timer.start(AUTOSAVE_INTERVAL)
+
+        #price changes in the catalog file are picked up while the app runs
+        self.catalog_watcher = QFileSystemWatcher([catalog.path], self)
+        self.catalog_timer = QTimer(self)
+        self.catalog_timer.setSingleShot(True)
+        self.catalog_timer.setInterval(CATALOG_SETTLE)
+        self.catalog_timer.timeout.connect(self.reload_catalog)
+        self.catalog_watcher.fileChanged.connect(self.catalog_timer.start)
+        catalog.listeners.append(self.catalog_changed)
+
+        #the server's bars arrive after the window is up
+        self.server_loader = ServerBarsLoader(SERVER_URL, self)
+        self.server_loader.loaded.connect(self.server_bars_loaded)
+        self.server_loader.start()
     
     
     def create_drawing_tab(self):
@@ -52,11 +167,33 @@ class MainWindow(QMainWindow):
     
     def create_inventory_tab(self):
         layout = QVBoxLayout()
-        self.inventory_table = QTableWidget(0,2)
-        self.inventory_table.setHorizontalHeaderLabels(["Bar Type", "Count"])
+        self.inventory_filter_edit = QLineEdit()
+        self.inventory_filter_edit.setPlaceholderText("Filter bar types")
+        layout.addWidget(self.inventory_filter_edit)
+        #the model follows the project's per-type totals, each change repaints only its own row
+        self.inventory_model = InventoryModel(self.project, self)
+        self.inventory_filter = InventoryFilter(self)
+        self.inventory_filter.setSourceModel(self.inventory_model)
+        self.inventory_filter_edit.textChanged.connect(self.inventory_filter.setFilterFixedString)
+        self.inventory_table = QTableView()
+        self.inventory_table.setModel(self.inventory_filter)
+        self.inventory_table.setSortingEnabled(True)
+        self.inventory_table.sortByColumn(TYPE_COLUMN, Qt.SortOrder.AscendingOrder)
         layout.addWidget(self.inventory_table)
+        self.stock_label = QLabel()
+        layout.addWidget(self.stock_label)
+        self.joint_label = QLabel()
+        layout.addWidget(self.joint_label)
         self.inventory_tab.setLayout(layout)
 
+        #the cut list is worked out a moment after the last change, and only while the tab is showing
+        self.cut_plans = {}
+        self.cut_list_timer = QTimer(self)
+        self.cut_list_timer.setSingleShot(True)
+        self.cut_list_timer.setInterval(250)
+        self.cut_list_timer.timeout.connect(self.update_cut_list)
+        self.project.listeners.append(lambda bar_type: self.cut_list_timer.start())
+
     def create_toolbar(self):
         toolbar = QToolBar("Main Toolbar")
         self.addToolBar(toolbar)
@@ -65,6 +202,19 @@ class MainWindow(QMainWindow):
         select_action.triggered.connect(self.enable_select_mode)
         toolbar.addAction(select_action)
 
+        select_all_action = QAction("Select All", self)
+        select_all_action.setShortcut(QKeySequence("Ctrl+A"))
+        select_all_action.triggered.connect(self.select_all)
+        self.addAction(select_all_action)
+
+        rotate_action = QAction("Rotate Selection", self)
+        rotate_action.triggered.connect(self.rotate_selection)
+        toolbar.addAction(rotate_action)
+
+        scale_action = QAction("Scale Selection", self)
+        scale_action.triggered.connect(self.scale_selection)
+        toolbar.addAction(scale_action)
+
         draw_action = QAction(QIcon("icons/drawline.png"), "Draw Bar", self)
         draw_action.triggered.connect(self.enable_draw_mode)
         toolbar.addAction(draw_action)
@@ -85,10 +235,25 @@ class MainWindow(QMainWindow):
         textbox_action.triggered.connect(self.enable_text_mode)
         toolbar.addAction(textbox_action)
 
-        save_action = QAction(QIcon("icons/saveImage.png"),"Save", self)
+        save_action = QAction(QIcon("icons/saveImage.png"),"Export PDF", self)
         save_action.triggered.connect(self.export_to_pdf)
         toolbar.addAction(save_action)
 
+        open_project_action = QAction("Open", self)
+        open_project_action.setShortcut(QKeySequence("Ctrl+O"))
+        open_project_action.triggered.connect(lambda: self.open_project())
+        toolbar.addAction(open_project_action)
+
+        save_project_action = QAction("Save Project", self)
+        save_project_action.setShortcut(QKeySequence("Ctrl+S"))
+        save_project_action.triggered.connect(self.save_project)
+        toolbar.addAction(save_project_action)
+
+        save_project_as_action = QAction("Save Project As", self)
+        save_project_as_action.setShortcut(QKeySequence("Ctrl+Shift+S"))
+        save_project_as_action.triggered.connect(self.save_project_as)
+        self.addAction(save_project_as_action)
+
 
         self.combo_box = QComboBox()
         for bar_type in BAR_TYPES:
@@ -98,37 +263,40 @@ class MainWindow(QMainWindow):
 
     def export_to_pdf(self):
         file_path, _ = QFileDialog.getSaveFileName(self, "Save PDF", "", "*.pdf")
-        if file_path:
-            if not file_path.endswith(".pdf"):
-                file_path += ".pdf"
-            
-            printer = QPrinter(QPrinter.PrinterMode.HighResolution)
-            printer.setOutputFormat(QPrinter.OutputFormat.PdfFormat)
-            printer.setOutputFileName(file_path)
-
-            printer.setResolution(1200)
-
-            painter = QPainter(printer)
-            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+        if not file_path:
+            return
+        if not file_path.endswith(".pdf"):
+            file_path += ".pdf"
+        #imported here so startup doesn't pay for the export code
+        from PdfExport import EXPORT_SCALES, PdfExportWorker, snapshot_scene
+        if self.export_worker is not None:
+            self.statusBar().showMessage("An export is already running")
+            return
+        scale_name, ok = QInputDialog.getItem(self, "Export Scale", "Scale:", list(EXPORT_SCALES), 0, False)
+        if not ok:
+            return
 
-            background_color = QColor(Qt.GlobalColor.black)
-            painter.fillRect(printer.pageRect(QPrinter.Unit.Point), background_color)
+        #the snapshot is the only part that touches the scene, the worker draws from the copy
+        worker = PdfExportWorker(snapshot_scene(self.drawing_area.scene), file_path, EXPORT_SCALES[scale_name])
+        progress = QProgressDialog("Exporting PDF...", "Cancel", 0, 100, self)
+        progress.setWindowTitle("Export")
+        progress.setMinimumDuration(300)
+        progress.setAutoClose(False)
+        progress.setAutoReset(False)
+        progress.canceled.connect(worker.requestInterruption)
+        worker.progress.connect(progress.setValue)
+        worker.succeeded.connect(lambda path: print(f"Saved drawing to {path}"))
+        worker.succeeded.connect(lambda path: self.statusBar().showMessage(f"Saved drawing to {path}", 5000))
+        worker.failed.connect(lambda message: self.statusBar().showMessage(f"PDF export failed: {message}", 5000))
+        worker.finished.connect(progress.close)
+        worker.finished.connect(self.export_finished)
+        self.export_worker = worker
+        worker.start()
 
+    def export_finished(self):
+        self.export_worker.deleteLater()
+        self.export_worker = None
 
-            rect = self.drawing_area.scene.sceneRect()
-            page_rect = printer.pageRect(QPrinter.Unit.Point)
-            scale_factor = min(page_rect.width() / rect.width(),
-                                page_rect.height() / rect.height())
-            painter.scale(scale_factor, scale_factor)
-
-            painter.translate((page_rect.width() - rect.width() * scale_factor) / 2,
-                              (page_rect.height() - rect.height() * scale_factor) / 2)
-
-            self.drawing_area.scene.render(painter, QRectF(0,0,rect.width(),rect.height()),rect)
-
-            painter.end()
-            print(f"Saved drawing to {file_path}")
-    
     def Ctrl_Z_shortcut(self):
         undo_action = QAction("Undo", self)
         undo_shortcut = QKeySequence("Ctrl+Z")
@@ -136,6 +304,11 @@ class MainWindow(QMainWindow):
         undo_action.triggered.connect(self.undo)
         self.addAction(undo_action)
 
+        redo_action = QAction("Redo", self)
+        redo_action.setShortcuts([QKeySequence("Ctrl+Shift+Z"), QKeySequence("Ctrl+Y")])
+        redo_action.triggered.connect(self.redo)
+        self.addAction(redo_action)
+
 
     def update_bar_type(self, index):
         selected_bar_type = self.combo_box.itemData(index)
@@ -144,93 +317,321 @@ class MainWindow(QMainWindow):
             self.current_cost_per_unit = selected_bar_type.cost_per_unit
             print(f"Selected bar type: {self.current_bar_type.name}, Cost per unit: {self.current_cost_per_unit}")
 
-    def update_inventory_table(self):
-        self.inventory_table.setRowCount(len(self.bar_counts))
-        for row, (bar_type, count) in enumerate(self.bar_counts.items()):
-            self.inventory_table.setItem(row, 0, QTableWidgetItem(bar_type))
-            self.inventory_table.setItem(row,1, QTableWidgetItem(str(count)))
+    def reload_catalog(self):
+        #an editor that saves by replacing the file leaves the watcher watching nothing
+        if catalog.path not in self.catalog_watcher.files() and os.path.exists(catalog.path):
+            self.catalog_watcher.addPath(catalog.path)
+        try:
+            repriced = catalog.load()
+        except CatalogError as e:
+            print("Error reloading catalog:", e)
+            self.statusBar().showMessage(f"Catalog not reloaded: {e}", 5000)
+            return
+        self.refresh_bar_type_box()
+        print(f"Reloaded catalog {catalog.path} ({len(repriced)} repriced)")
 
-    def add_drawn_bar(self, length, start_point, end_point):
-        if self.current_bar_type is None or self.current_cost_per_unit is None:
-            self.statusBar().showMessage("Please select a bar type first")
-            return None
-        bar = Bar(bar_type = self.current_bar_type, length = length/10)
-        self.project.add_bar(bar)
-        self.update_total_cost()
+    def catalog_changed(self, repriced, renamed):
+        """ Catalog listener, reprices the project in one pass over the changed types and relabels the bars of renamed ones """
+        messages = []
+        if repriced:
+            self.project.reprice(repriced)
+            self.update_total_cost()
+            if self.current_bar_type is not None:
+                self.current_cost_per_unit = self.current_bar_type.cost_per_unit
+            self.cut_list_timer.start() #stock cost follows the new prices too
+            messages.append(f"Prices updated for {', '.join(bar_type.name for bar_type in repriced)}")
+        if renamed:
+            self.types_renamed(renamed)
+            messages.append(f"Renamed {', '.join(f'{old} to {bar_type.name}' for bar_type, old in renamed.items())}")
+        selection = self.drawing_area.selection.values()
+        if getattr(self, 'properties_table', None) is not None and any(bar_data['bar'].bar_type in repriced or bar_data['bar'].bar_type in renamed
+                                                                       for bar_data in selection):
+            self.show_selection_properties()
+        self.statusBar().showMessage("; ".join(messages), 5000)
+
+    def types_renamed(self, renamed):
+        """ Labels of the bars of renamed types, their inventory rows, and the server and project file, which store types by name """
+        for bar_data in self.drawing_area.drawn_bars.values():
+            if bar_data['bar'].bar_type in renamed:
+                self.drawing_area.refresh_label(bar_data)
+                self.bar_changed(bar_data)
+        for bar_type in renamed:
+            if bar_type in self.inventory_model.rows:
+                self.inventory_model.type_changed(bar_type)
 
-        text_item = QGraphicsTextItem(f"{self.current_bar_type.name} ( {length / 10:.2f} ft)")
-        text_item.setPos((start_point.x() +  end_point.x()) / 2, (start_point.y() + end_point.y()) /2)
-        self.drawing_area.scene.addItem(text_item)
+    def refresh_bar_type_box(self):
+        """ Rebuilds the bar type picker from the catalog, keeping the current choice """
+        current = self.combo_box.currentData()
+        self.combo_box.blockSignals(True)
+        self.combo_box.clear()
+        for bar_type in BAR_TYPES:
+            self.combo_box.addItem(bar_type.name, bar_type)
+        index = next((index for index, bar_type in enumerate(BAR_TYPES) if bar_type is current), 0)
+        self.combo_box.setCurrentIndex(index)
+        self.combo_box.blockSignals(False)
+        if BAR_TYPES[index] is not current:
+            self.update_bar_type(index)
 
+    def update_cut_list(self):
+        if self.tabs.currentWidget() is not self.inventory_tab:
+            return
+        self.cut_list_timer.stop()
+        #types whose cuts haven't changed keep their plan, so an edit only repacks its own type
+        self.cut_plans = cut_list(self.project, DEFAULT_KERF, CUT_LIST_BUDGET, self.cut_plans)
+        self.inventory_model.set_cut_plans(self.cut_plans)
+        stock_cost = sum(plan.cost for plan in self.cut_plans.values())
+        self.stock_label.setText(f"Stock cost: ${stock_cost:.2f} (priced by length: ${self.project.total_cost:.2f})")
+        degrees = joint_degrees(self.drawing_area.endpoints, JOINT_TOLERANCE)
+        joints = ", ".join(f"{count} where {degree} meet" for degree, count in sorted(degrees.items()) if degree >= 2)
+        fittings = ", ".join(f"{name}: {count}" for name, count in estimate_fittings(degrees).items())
+        self.joint_label.setText(f"Joints: {joints or 'none'} ({fittings})")
+
+    def add_drawn_bar(self, length, start_point, end_point, bar_type = None, color = None, item = None, bar_id = None):
+        #without a bar type this is a bar the user just drew with the current tool settings
+        if bar_type is None:
+            if self.current_bar_type is None or self.current_cost_per_unit is None:
+                self.statusBar().showMessage("Please select a bar type first")
+                return None
+            bar_type = self.current_bar_type
+            color = self.drawing_area.current_color
+            item = self.drawing_area.current_line
+        bar_data = self.new_bar_data(self.project.new_bar(bar_type, length/10), start_point, end_point, color, item)
+        if bar_id is None:
+            self.undo_stack.push(AddBarCommand(self, bar_data))
+        else:
+            #bars loaded from the server are already synced and aren't something to undo
+            bar_data['id'] = bar_id
+            self.attach_bar(bar_data, sync = False)
+        return bar_data
+
+    def new_bar_data(self, bar, start_point, end_point, color, item):
         bar_data = {
-            'line': self.drawing_area.current_line, 
-            'text': text_item,
+            'item': item,
             'bar': bar,
             'start_point' : start_point,
             'end_point' : end_point,
-            'original_color' : self.drawing_area.current_color
+            'original_color' : color
             }
-        
-        self.drawing_area.drawn_bars.append(bar_data)
-        self.history.append(('add', bar_data))
+        item.bar_data = bar_data
+        self.drawing_area.refresh_label(bar_data)
+        return bar_data
 
-        #updates the inventory 
-        if self.current_bar_type.name in self.bar_counts:
-            self.bar_counts[self.current_bar_type.name] += 1
-        else:
-            self.bar_counts[self.current_bar_type.name] = 1
-        self.update_inventory_table()
+    def add_bars(self, bars):
+        """ Bulk path for bars that already exist elsewhere (server, project file).
 
-        return bar_data
+        bars yields (bar id, bar type, length in feet, start point, end point, color, elevation, height). The
+        bars skip the undo stack and the sync engine. They go into the project together at the
+        end, so the inventory and the cut list hear once per bar type, and the totals are shown once.
+        """
+        #Qt's BSP index already files new items lazily in one go, turning it off around this was measured slower
+        area = self.drawing_area
+        scene = area.scene
+        project = self.project
+        added = []
+        try:
+            for bar_id, bar_type, length, start_point, end_point, color, elevation, height in bars:
+                item = area.new_bar_item(start_point, end_point, bar_type, color)
+                bar = project.new_bar(bar_type, length, elevation, height)
+                bar_data = self.new_bar_data(bar, start_point, end_point, color, item)
+                bar_data['id'] = bar_id
+                scene.addItem(item) #labelled first, so the index files it once
+                area.register_bar(bar_data)
+                added.append(bar)
+        finally:
+            #bars already in the drawing are in the totals too, even if a later one failed
+            project.add_bars(added)
+            self.update_total_cost()
+        return len(added)
+
+    def attach_bar(self, bar_data, sync = True):
+        """ Puts a bar into the scene, the project and the registry """
+        scene = self.drawing_area.scene
+        if bar_data['item'].scene() is not scene:
+            scene.addItem(bar_data['item'])
+        if bar_data['bar'] not in self.project:
+            self.project.add_bar(bar_data['bar'])
+        self.drawing_area.register_bar(bar_data)
+        if sync:
+            self.bar_changed(bar_data)
+        self.update_total_cost()
+
+    def detach_bar(self, bar_data, sync = True):
+        scene = self.drawing_area.scene
+        if bar_data['item'].scene() is scene:
+            scene.removeItem(bar_data['item'])
+        if bar_data['bar'] in self.project:
+            self.project.remove_bar(bar_data['bar'])
+        self.drawing_area.deselect(bar_data)
+        self.drawing_area.unregister_bar(bar_data)
+        if sync:
+            self.bar_removed(bar_data)
+        self.update_total_cost()
     
     def delete_bar(self, item):
-        for bar_data in self.drawing_area.drawn_bars:
-            if bar_data['line'] == item or bar_data['text'] == item:
-                print(f"Deleting bar: {bar_data} ")
-                self.drawing_area.scene.removeItem(bar_data['line'])
-                self.drawing_area.scene.removeItem(bar_data['text'])
-                #remove from flask
-                try:
-                    requests.post(f"{SERVER_URL}/clear", json={"bar_id": id(bar_data['bar'])}) 
-                except requests.exceptions.RequestException as e:
-                    print("Error deleting bar:", e)
-
-                self.project.bars.remove(bar_data['bar'])
-                self.update_total_cost()
-
-                bar_type_name = bar_data['bar'].bar_type.name
-                if bar_type_name in self.bar_counts:
-                    self.bar_counts[bar_type_name] -= 1
-                    if self.bar_counts[bar_type_name] <= 0:
-                        del self.bar_counts[bar_type_name]
-                self.update_inventory_table()
-                    
-                self.drawing_area.drawn_bars.remove(bar_data)
-                self.history.append(('delete', bar_data))
-                break
+        bar_data = self.drawing_area.bar_for_item(item)
+        if bar_data is None:
+            #free text placed with the text tool
+            if isinstance(item, QGraphicsTextItem):
+                self.undo_stack.push(DeleteTextCommand(self.drawing_area.scene, item))
+                self.texts_changed()
+            return
+        print(f"Deleting bar: {bar_data} ")
+        self.undo_stack.push(DeleteBarCommand(self, bar_data))
+
+    def add_text(self, text, position):
+        text_item = QGraphicsTextItem(text)
+        text_item.setPos(position)
+        self.undo_stack.push(AddTextCommand(self.drawing_area.scene, text_item))
+        self.texts_changed()
     
     def edit_bar(self, item):
-        for bar_data in self.drawing_area.drawn_bars:
-            if bar_data['line'] == item or bar_data['text'] == item:
-                print(f"Editing bar: {bar_data}")
-                new_length, ok = QInputDialog.getDouble(self, 'Edit Bar Length', 'Enter new bar length:', min = 0 )
-                if ok:
-                    bar_data['bar'].length = new_length
-                    self.project.calculate_total_cost()
-                    self.update_total_cost()
-                    #updates actual line
-                    start_point = bar_data['start_point']
-                    end_point = bar_data['end_point']
-                    direction_vector = QPointF(end_point.x() - start_point.x(), end_point.y() - start_point.y())
-                    vector_length = sqrt(direction_vector.x()**2 + direction_vector.y()**2)
-                    normalized_vector = QPointF(direction_vector.x() / vector_length, direction_vector.y() / vector_length)
-                
-                # Calculate the new end point
-                    new_end_point = QPointF(start_point.x() + normalized_vector.x() * new_length * 10,
-                                        start_point.y() + normalized_vector.y() * new_length * 10)
-                    bar_data['line'].setLine(start_point.x(), start_point.y(), new_end_point.x(), new_end_point.y())
-                    bar_data['text'].setPlainText(f"{bar_data['bar'].bar_type.name} ({new_length:.2f} ft)")
-                    bar_data['text'].setPos((start_point.x() + new_end_point.x()) / 2, (start_point.y() + new_end_point.y()) / 2)
+        bar_data = self.drawing_area.bar_for_item(item)
+        if bar_data is None:
+            return
+        print(f"Editing bar: {bar_data}")
+        new_length, ok = QInputDialog.getDouble(self, 'Edit Bar Length', 'Enter new bar length:', min = 0 )
+        if ok:
+            self.set_bar_length(bar_data, new_length)
+
+    def set_bar_length(self, bar_data, new_length, record = True):
+        """ Resizes a bar along its current direction, keeping its start point """
+        new_line = resized_line(bar_data['item'].line(), new_length)
+        if record:
+            self.undo_stack.push(EditLengthCommand(self, bar_data, new_length, new_line))
+        else:
+            self.apply_bar_length(bar_data, new_length, new_line)
+
+    def apply_bar_length(self, bar_data, length, line):
+        self.project.set_bar_length(bar_data['bar'], length)
+        bar_data['item'].setLine(line)
+        self.drawing_area.bar_geometry_changed(bar_data)
+        self.drawing_area.refresh_label(bar_data)
+        self.bar_changed(bar_data)
+        self.update_total_cost()
+
+    def apply_bar_type(self, bar_data, bar_type):
+        self.project.set_bar_type(bar_data['bar'], bar_type)
+        self.drawing_area.refresh_label(bar_data)
+        self.bar_changed(bar_data)
+        self.update_total_cost()
+
+    def apply_bar_edits(self, edits):
+        """ Bulk apply_bar_length and apply_bar_type for (bar_data, bar type, length, line) edits.
+
+        The project's totals are updated in one pass, with one call per bar type to its
+        listeners, and the status bar once.
+        """
+        area = self.drawing_area
+        changes = [(bar_data['bar'], bar_type, length) for bar_data, bar_type, length, line in edits
+                   if bar_data['bar'].bar_type is not bar_type or bar_data['bar'].length != length]
+        if changes:
+            self.project.update_bars(changes)
+        for bar_data, bar_type, length, line in edits:
+            bar_data['item'].setLine(line)
+            area.bar_geometry_changed(bar_data)
+            area.refresh_label(bar_data) #only lays the text out again if it changed
+            self.bar_changed(bar_data)
+        self.update_total_cost()
+
+    def edit_selection(self, edit):
+        """ Applies edit(bar_data, line) -> (bar type, length, line) to every selected bar, as one undo step """
+        selection = self.drawing_area.selection.values()
+        if not selection:
+            self.statusBar().showMessage("Select bars first", 5000)
+            return
+        edits = [(bar_data, *edit(bar_data, bar_data['item'].line())) for bar_data in selection]
+        self.undo_stack.push(EditBarsCommand(self, edits))
+
+    def move_selection(self, delta):
+        self.edit_selection(lambda bar_data, line: (bar_data['bar'].bar_type, bar_data['bar'].length, line.translated(delta)))
+
+    def transform_selection(self, transform, scale = 1.0):
+        """ Maps the selected bars through a transform about the selection's centre, lengths change by scale """
+        centre = self.selection_bounds().center()
+        about = QTransform.fromTranslate(-centre.x(), -centre.y()) * transform * QTransform.fromTranslate(centre.x(), centre.y())
+        self.edit_selection(lambda bar_data, line: (bar_data['bar'].bar_type, bar_data['bar'].length * scale, about.map(line)))
+
+    def rotate_selection(self):
+        if not self.drawing_area.selection:
+            self.statusBar().showMessage("Select bars first", 5000)
+            return
+        degrees, ok = QInputDialog.getDouble(self, 'Rotate Selection', 'Degrees clockwise:', 90, -360, 360, 2)
+        if ok and degrees:
+            self.transform_selection(QTransform().rotate(degrees))
+
+    def scale_selection(self):
+        if not self.drawing_area.selection:
+            self.statusBar().showMessage("Select bars first", 5000)
+            return
+        factor, ok = QInputDialog.getDouble(self, 'Scale Selection', 'Scale by:', 1.0, 0.01, 100, 3)
+        if ok and factor != 1.0:
+            self.transform_selection(QTransform.fromScale(factor, factor), factor)
+
+    def set_selection_type(self, bar_type):
+        self.edit_selection(lambda bar_data, line: (bar_type, bar_data['bar'].length, line))
+
+    def set_selection_length(self, length):
+        self.edit_selection(lambda bar_data, line: (bar_data['bar'].bar_type, length, resized_line(line, length)))
+
+    def selection_bounds(self):
+        """ Bounding rectangle of the selected bars' ends """
+        xs = []
+        ys = []
+        for bar_data in self.drawing_area.selection.values():
+            line = bar_data['item'].line()
+            xs += (line.x1(), line.x2())
+            ys += (line.y1(), line.y2())
+        return QRectF(QPointF(min(xs), min(ys)), QPointF(max(xs), max(ys)))
+
+    def selection_cost(self):
+        return sum(bar_data['bar'].cost() for bar_data in self.drawing_area.selection.values())
+
+    def select_all(self):
+        self.enable_select_mode()
+        self.drawing_area.select_bars(self.drawing_area.drawn_bars.values())
+
+    def apply_bar_height(self, bar_data, elevation, height):
+        bar_data['bar'].elevation = elevation
+        bar_data['bar'].height = height
+        self.drawing_area.bar_geometry_changed(bar_data)
+        self.bar_changed(bar_data)
+
+    def bar_changed(self, bar_data):
+        self.sync.upsert(bar_data['id'], bar_to_json(bar_data))
+        if self.project_file is not None:
+            self.project_file.bar_changed(bar_data['id'])
+
+    def bar_removed(self, bar_data):
+        self.sync.delete(bar_data['id'])
+        if self.project_file is not None:
+            self.project_file.bar_removed(bar_data['id'])
+
+    def texts_changed(self):
+        if self.project_file is not None:
+            self.project_file.texts_changed = True
+
+    def bar_json(self, bar_id):
+        bar_data = self.drawing_area.drawn_bars.get(bar_id)
+        return None if bar_data is None else bar_to_json(bar_data)
+
+    def update_sync_status(self):
+        #bars that changed while the queue was full go in as it drains
+        self.sync.refill(self.bar_json)
+        if self.sync.last_error:
+            text = f"Sync: {self.sync.depth} queued, retrying ({self.sync.last_error})"
+        elif self.sync.depth:
+            text = f"Sync: {self.sync.depth} queued, {self.sync.lag:.1f}s behind"
+        else:
+            text = "Sync: up to date"
+        dropped = self.sync.dropped
+        if dropped:
+            text += f", {dropped} bar{'s' if dropped != 1 else ''} refused by the server"
+        self.sync_label.setText(text)
+        self.resync_button.setVisible(bool(dropped))
+
+    def resync(self):
+        self.sync.resync({bar_id: bar_to_json(bar_data) for bar_id, bar_data in self.drawing_area.drawn_bars.items()})
+        self.update_sync_status()
     
     def enable_draw_mode(self):
         self.clear_properties_table()
@@ -274,8 +675,56 @@ class MainWindow(QMainWindow):
         if color.isValid():
             self.drawing_area.set_color(color)
     
+    def show_selection_properties(self):
+        """ The properties table for whatever is selected: one bar's own, or the shared ones of several """
+        selection = list(self.drawing_area.selection.values())
+        if len(selection) == 1:
+            self.show_bar_properties(selection[0])
+        elif selection:
+            self.show_bulk_properties(selection)
+        else:
+            self.remove_properties_table()
+
+    def show_bulk_properties(self, selection):
+        """ Type and length rows show the value the bars share, editing one sets it on all of them """
+        self.remove_properties_table()
+        bar_types = {bar_data['bar'].bar_type.name for bar_data in selection}
+        lengths = {bar_data['bar'].length for bar_data in selection}
+        self.properties_table = QTableWidget(4,2)
+        self.properties_table.setHorizontalHeaderLabels(['Property', 'Value'])
+        self.properties_table.setItem(0, 0, QTableWidgetItem('Bar Type'))
+        self.properties_table.setItem(0, 1, QTableWidgetItem(bar_types.pop() if len(bar_types) == 1 else MIXED))
+        self.properties_table.setItem(1, 0, QTableWidgetItem('Length'))
+        self.properties_table.setItem(1, 1, QTableWidgetItem(str(lengths.pop()) if len(lengths) == 1 else MIXED))
+        self.properties_table.setItem(2, 0, QTableWidgetItem('Price'))
+        self.properties_table.setItem(2, 1, QTableWidgetItem(str(self.selection_cost())))
+        self.properties_table.setItem(3, 0, QTableWidgetItem('Bars'))
+        self.properties_table.setItem(3, 1, QTableWidgetItem(str(len(selection))))
+
+        self.properties_table.itemChanged.connect(self.update_bulk_properties)
+
+        layout = self.drawing_tab.layout()
+        layout.addWidget(self.properties_table)
+
+    def update_bulk_properties(self, item):
+        if item.row() == 1:
+            try:
+                new_length = float(item.text())
+            except ValueError:
+                return
+            self.set_selection_length(new_length)
+        elif item.row() == 0:
+            bar_type = catalog.get(item.text())
+            if bar_type is None:
+                return
+            self.set_selection_type(bar_type)
+        else:
+            return
+        self.properties_table.item(2,1).setText(str(self.selection_cost()))
+
     def show_bar_properties(self, bar_data):
-        self.properties_table = QTableWidget(3,2)
+        self.remove_properties_table() #selecting another bar replaces the table, they don't pile up in the layout
+        self.properties_table = QTableWidget(5,2)
         self.properties_table.setHorizontalHeaderLabels(['Property', 'Value'])
         self.properties_table.setItem(0, 0, QTableWidgetItem('Bar Type'))
         self.properties_table.setItem(0, 1, QTableWidgetItem(bar_data['bar'].bar_type.name))
@@ -283,6 +732,10 @@ class MainWindow(QMainWindow):
         self.properties_table.setItem(1, 1, QTableWidgetItem(str(bar_data['bar'].length)))
         self.properties_table.setItem(2, 0, QTableWidgetItem('Price'))
         self.properties_table.setItem(2, 1, QTableWidgetItem(str(bar_data['bar'].cost())))
+        self.properties_table.setItem(3, 0, QTableWidgetItem('Elevation (ft)'))
+        self.properties_table.setItem(3, 1, QTableWidgetItem(str(bar_data['bar'].elevation)))
+        self.properties_table.setItem(4, 0, QTableWidgetItem('Height (ft)'))
+        self.properties_table.setItem(4, 1, QTableWidgetItem(str(bar_data['bar'].height)))
 
         self.properties_table.itemChanged.connect(lambda item: self.update_bar_properties(item, bar_data))
 
@@ -292,116 +745,288 @@ class MainWindow(QMainWindow):
     def update_bar_properties(self, item, bar_data):
         if item.row() == 1:
             new_length = float(item.text())
-            bar_data['bar'].length = new_length
-            self.project.calculate_total_cost()
-            self.update_total_cost()
-            start_point = bar_data['start_point']
-            end_point = bar_data['end_point']
-            direction_vector = QPointF(end_point.x() - start_point.x(), end_point.y() - start_point.y())
-            vector_length = sqrt(direction_vector.x()**2 + direction_vector.y()**2)
-            normalized_vector = QPointF(direction_vector.x() / vector_length, direction_vector.y() / vector_length)
-                
-             # Calculate the new end point
-            new_end_point = QPointF(start_point.x() + normalized_vector.x() * new_length * 10,
-                                     start_point.y() + normalized_vector.y() * new_length * 10)
-            bar_data['line'].setLine(start_point.x(), start_point.y(), new_end_point.x(), new_end_point.y())
-            bar_data['text'].setPlainText(f"{bar_data['bar'].bar_type.name} ({new_length:.2f} ft)")
-            bar_data['text'].setPos((start_point.x() + new_end_point.x()) / 2, (start_point.y() + new_end_point.y()) / 2)
+            self.set_bar_length(bar_data, new_length)
 
             #updates cost for new length 
             self.properties_table.item(2,1).setText(str(bar_data['bar'].cost()))
         elif item.row() == 0:
-            new_bar_type_name = item.text()
-            for bar_type in BAR_TYPES:
-                if bar_type.name == new_bar_type_name:
-                    bar_data['bar'].bar_type = bar_type
-                    self.properties_table.item(1,1).setText(str(bar_type.cost_per_unit))
-                    break
+            bar_type = catalog.get(item.text())
+            if bar_type is not None:
+                self.undo_stack.push(ChangeTypeCommand(self, bar_data, bar_type))
+                self.properties_table.item(2,1).setText(str(bar_data['bar'].cost()))
+        elif item.row() in (3, 4):
+            try:
+                value = float(item.text())
+            except ValueError:
+                return
+            bar = bar_data['bar']
+            elevation, height = (value, bar.height) if item.row() == 3 else (bar.elevation, value)
+            if (elevation, height) != (bar.elevation, bar.height):
+                self.undo_stack.push(ChangeHeightCommand(self, bar_data, elevation, height))
 
-    def clear_properties_table(self):
-        if hasattr(self, 'properties_table') and self.properties_table is not None:
-            self.drawing_tab.layout().removeWidget(self.properties_table)
-            self.properties_table.deleteLater()
-            self.properties_table = None
+    def remove_properties_table(self):
+        if getattr(self, 'properties_table', None) is None:
+            return False
+        self.drawing_tab.layout().removeWidget(self.properties_table)
+        self.properties_table.deleteLater()
+        self.properties_table = None
+        return True
 
-            #sets bar color back to black
-            if self.drawing_area.selected_bar:
-                self.drawing_area.selected_bar['line'].setPen(QPen(Qt.GlobalColor.white))
-                self.drawing_area.selected_bar = None
+    def clear_properties_table(self):
+        self.remove_properties_table()
+        self.drawing_area.clear_selection(notify = False)
 
     def toggle_grid(self):
         self.drawing_area.grid_enabled = not self.drawing_area.grid_enabled
         self.drawing_area.viewport().update()
     
     def undo(self):
-        if not self.history:
-            return 
-        last_action, bar_data = self.history.pop()
-        if last_action == 'add':
-            if bar_data['line'] in self.drawing_area.scene.items():
-                self.drawing_area.scene.removeItem(bar_data['line'])
-            if bar_data['text'] in self.drawing_area.scene.items():
-                self.drawing_area.scene.removeItem(bar_data['text'])
-            if bar_data['bar'] in self.project.bars:
-                self.project.bars.remove(bar_data['bar'])
-            if bar_data in self.drawing_area.drawn_bars:
-                self.drawing_area.drawn_bars.remove(bar_data)
-            #remove from flask server 
-            try:
-                requests.post(f"{SERVER_URL}/clear", json={"bar_id": id(bar_data['bar'])})
-            except requests.exceptions.RequestException as e:
-                print("Error syncing undo", e)
-            #updates bar inventory and cost 
-            bar_type_name = bar_data['bar'].bar_type.name
-            if bar_type_name in self.bar_counts:
-                self.bar_counts[bar_type_name] -= 1
-                if self.bar_counts[bar_type_name] <= 0:
-                    del self.bar_counts[bar_type_name]
-            self.update_inventory_table()
-            self.update_total_cost()
-        elif last_action == 'delete':
-            if bar_data['line'] not in self.drawing_area.scene.items():
-                self.drawing_area.scene.addItem(bar_data['line'])
-            if bar_data['text'] not in self.drawing_area.scene.items():
-                self.drawing_area.scene.addItem(bar_data['text'])
-            if bar_data['bar'] not in self.project.bars:
-                self.project.bars.append(bar_data['bar'])
-            if bar_data not in self.drawing_area.drawn_bars:
-                self.drawing_area.drawn_bars.append(bar_data)
-
-            bar_type_name = bar_data['bar'].bar_type.name
-            if bar_type_name in self.bar_counts:
-                self.bar_counts[bar_type_name] += 1
-            else:
-                self.bar_counts[bar_type_name] = 1
-            self.update_inventory_table()
-            self.update_total_cost()
-
+        self.undo_stack.undo()
+        self.texts_changed() #the step may have been a text, saving the few texts again is cheap
 
+    def redo(self):
+        self.undo_stack.redo()
+        self.texts_changed()
 
     def update_total_cost(self):
-        total_cost = self.project.calculate_total_cost()
+        total_cost = self.project.total_cost
         self.statusBar().showMessage(f"Total cost: ${total_cost:.2f}")
     
     def load_bars_from_server(self):
+        self.show_server_bars(fetch_server_bars(SERVER_URL))
+
+    def server_bars_loaded(self, bars):
+        if self.project_file is not None or self.loading is not None:
+            return #a project was opened while the request was out, it replaces the server's drawing
+        self.show_server_bars(bars)
+
+    def show_server_bars(self, bars):
+        if not isinstance(bars, list) or not bars:
+            return
+        self.server_skipped = [] #ids of the server's bars that can't be drawn
+        self.start_loading(server_bars(bars, self.server_skipped), len(bars), "Loading the server's drawing", self.server_drawing_loaded)
+
+    def server_drawing_loaded(self):
+        if self.loading_done:
+            self.drawing_area.show_drawing()
+        if self.server_skipped:
+            print(f"Skipped server bars with missing or bad fields: {self.server_skipped}")
+            self.statusBar().showMessage(f"Skipped {len(self.server_skipped)} of the server's bars, they're missing fields or have bad ones", 10000)
+
+    def bar_record(self, writer, bar_id):
+        bar_data = self.drawing_area.drawn_bars.get(bar_id)
+        if bar_data is None:
+            return None
+        bar = bar_data['bar']
+        line = bar_data['item'].line()
+        return BarRecord(bar_id, writer.type_index(bar.bar_type), bar.length,
+                         line.x1(), line.y1(), line.x2(), line.y2(), QColor(bar_data['original_color']).rgba(),
+                         bar.elevation, bar.height)
+
+    def text_records(self):
+        """ Free text placed with the text tool, bar labels are rebuilt from their bars """
+        records = []
+        for item in self.drawing_area.scene.items(Qt.SortOrder.AscendingOrder):
+            if isinstance(item, QGraphicsTextItem):
+                records.append(TextRecord(item.toPlainText(), item.pos().x(), item.pos().y(), item.defaultTextColor().rgba()))
+        return records
+
+    def save_project(self):
+        if self.project_file is None:
+            self.save_project_as()
+            return
+        self.write_project(self.project_file)
+
+    def write_project(self, project_file):
+        """ Saves the whole drawing to project_file, returns whether it did """
+        if self.loading is not None:
+            self.statusBar().showMessage("Still loading the drawing, try again in a moment")
+            return False
         try:
-            response = requests.get(f"{SERVER_URL}/get_bars")
-            if response.status_code == 200:
-                bars = response.json()
-                for bar_data in bars:
-                # Recreate bars visually
-                    new_bar = self.add_drawn_bar(bar_data['bar']['length'] * 10,  # Convert to pixels
-                                             QPointF(bar_data['start_point']['x'], bar_data['start_point']['y']),
-                                             QPointF(bar_data['end_point']['x'], bar_data['end_point']['y']))
-                    if new_bar:
-                        self.drawing_area.drawn_bars.append(new_bar)
-        except requests.exceptions.RequestException as e:
-            print("Error fetching bars:", e)
+            project_file.save(lambda writer: (self.bar_record(writer, bar_id) for bar_id in self.drawing_area.drawn_bars),
+                              self.text_records())
+        except OSError as e:
+            self.statusBar().showMessage(f"Saving failed: {e}")
+            return False
+        self.setWindowTitle(f"Pool Screen Designer - {os.path.basename(project_file.path)}")
+        print(f"Saved project to {project_file.path}")
+        return True
 
-    
+    def save_project_as(self):
+        file_path, _ = QFileDialog.getSaveFileName(self, "Save Project", "", f"*{PROJECT_SUFFIX}")
+        if not file_path:
+            return
+        if not file_path.endswith(PROJECT_SUFFIX):
+            file_path += PROJECT_SUFFIX
+        #only edited through, and autosaved to, once it holds a snapshot of the drawing
+        project_file = ProjectWriter(file_path)
+        if self.write_project(project_file):
+            self.project_file = project_file
 
-if __name__ == "__main__":
+    def autosave(self):
+        """ Appends what changed since the last save, or rewrites the file once the appends outgrow it """
+        project_file = self.project_file
+        if project_file is None or self.loading is not None or not project_file.dirty:
+            return
+        if project_file.needs_compaction:
+            self.save_project()
+            return
+        try:
+            project_file.append(self.bar_record, self.text_records() if project_file.texts_changed else None)
+        except OSError as e:
+            self.statusBar().showMessage(f"Autosave failed: {e}")
+
+    def open_project(self, file_path = None):
+        if file_path is None:
+            file_path, _ = QFileDialog.getOpenFileName(self, "Open Project", "", f"*{PROJECT_SUFFIX}")
+            if not file_path:
+                return
+        try:
+            data = read_project(file_path)
+        except (OSError, ValueError) as e:
+            self.statusBar().showMessage(f"Could not open {file_path}: {e}")
+            return
+        self.clear_drawing()
+        self.project_file = ProjectWriter(file_path, data)
+        self.setWindowTitle(f"Pool Screen Designer - {os.path.basename(file_path)}")
+
+        #file types resolve to the catalog entry of the same name, so the project picks up current prices
+        self.loading_types = [catalog.get(record.name) or BarType(name = record.name, cost_per_unit = record.cost_per_unit,
+                                                                         thickness = record.thickness, stock_length = record.stock_length)
+                              for record in data.types]
+        for record in data.texts:
+            text_item = QGraphicsTextItem(record.text)
+            text_item.setPos(record.x, record.y)
+            text_item.setDefaultTextColor(QColor.fromRgba(record.color))
+            self.drawing_area.scene.addItem(text_item)
+        types = self.loading_types
+        bars = ((record.id, types[record.bar_type], record.length, QPointF(record.x1, record.y1),
+                 QPointF(record.x2, record.y2), QColor.fromRgba(record.color), record.elevation, record.height)
+                for record in list(data.bars.values()))
+        self.start_loading(bars, len(data.bars), "Opening project", self.project_loaded)
+
+    def project_loaded(self):
+        self.drawing_area.show_drawing()
+        if self.loading_error is not None:
+            #saving what did load would overwrite the file with part of the project
+            print(f"Opening project {self.project_file.path} failed after {self.loading_done} bars: {self.loading_error}")
+            self.project_file = None
+            self.setWindowTitle("Pool Screen Designer")
+        else:
+            print(f"Opened project {self.project_file.path} with {self.loading_total} bars")
+        self.project_opened.emit()
+
+    def start_loading(self, bars, total, message, finished):
+        """ Adds bars, tuples as add_bars takes them, LOAD_CHUNK at a time so the window stays
+        usable meanwhile. finished() runs once the last one is in or loading failed, with the
+        error in loading_error. clear_drawing() stops it """
+        self.loading = iter(bars)
+        self.loading_total = total
+        self.loading_done = 0
+        self.loading_message = message
+        self.loading_finished = finished
+        self.loading_error = None
+        QTimer.singleShot(0, self.load_chunk)
+
+    def load_chunk(self):
+        if self.loading is None:
+            return
+        before = len(self.drawing_area.drawn_bars)
+        try:
+            added = self.add_bars(islice(self.loading, LOAD_CHUNK))
+        except Exception as e:
+            #an exception out of a timer slot aborts the app, and a load left running blocks saving
+            traceback.print_exc()
+            self.loading_error = e
+            added = len(self.drawing_area.drawn_bars) - before #the ones in before it failed
+        self.loading_done += added
+        if self.loading_error is None and added == LOAD_CHUNK:
+            self.statusBar().showMessage(f"{self.loading_message}: {self.loading_done} of {self.loading_total} bars")
+            QTimer.singleShot(0, self.load_chunk)
+            return
+        self.loading = None
+        self.loading_finished()
+        if self.loading_error is not None:
+            self.statusBar().showMessage(f"{self.loading_message} failed after {self.loading_done} bars: {self.loading_error}")
+
+    def clear_drawing(self):
+        """ Empties the drawing without telling the server or the project file """
+        self.loading = None
+        self.clear_properties_table()
+        #the undo history holds items about to be deleted, so it goes first
+        self.undo_stack.clear()
+        self.drawing_area.selection.clear()
+        self.drawing_area.current_line = None
+        self.drawing_area.snap_marker = None
+        self.drawing_area.drawn_bars.clear()
+        self.drawing_area.endpoints.clear()
+        self.drawing_area.scene.clear()
+        for view in self.projection_views:
+            view.clear()
+        self.project.clear()
+        self.update_total_cost()
+
+    def closeEvent(self, event):
+        self.autosave()
+        if self.export_worker is not None:
+            self.export_worker.requestInterruption()
+            self.export_worker.wait()
+        self.server_loader.wait() #at most the request's timeout, Qt aborts on a QThread destroyed while running
+        self.sync.stop()
+        if self.catalog_changed in catalog.listeners:
+            catalog.listeners.remove(self.catalog_changed)
+        super().closeEvent(event)
+
+class StartupReport(QObject):
+    """ Writes how long startup took to a JSON file, then closes the window.
+
+    Set POOLSCREEN_STARTUP_REPORT to the file's path to get one, see the suite's startup
+    group. It's written once the drawing is first painted and, when a project was given,
+    opened. Times are seconds since DrawingApp started running, which in a frozen build
+    is after the bootloader is done, the suite also times the whole process from outside.
+    """
+    def __init__(self, path, window, opening):
+        super().__init__()
+        self.path = path
+        self.window = window
+        self.report = {'imports': IMPORTED - STARTED, 'window': time.perf_counter() - STARTED,
+                       'frozen': getattr(sys, 'frozen', False)}
+        self.opening = opening
+        window.project_opened.connect(self.project_opened)
+        window.drawing_area.viewport().installEventFilter(self)
+
+    def eventFilter(self, watched, event):
+        if event.type() == QEvent.Type.Paint and 'first_paint' not in self.report:
+            self.report['first_paint'] = time.perf_counter() - STARTED
+            self.report['modules'] = len(sys.modules)
+            self.finish()
+        return False
+
+    def project_opened(self):
+        self.report['project_opened'] = time.perf_counter() - STARTED
+        self.opening = False
+        self.finish()
+
+    def finish(self):
+        if self.opening or 'first_paint' not in self.report:
+            return
+        with open(self.path + '.tmp', 'w') as f:
+            json.dump(self.report, f)
+        os.replace(self.path + '.tmp', self.path) #whoever waits for the file never sees half of it
+        #closeEvent tidies up, the last window closing quits
+        QTimer.singleShot(0, self.window.close)
+
+def main():
     app = QApplication(sys.argv)
     main_window = MainWindow()
+    report_path = os.environ.get('POOLSCREEN_STARTUP_REPORT')
+    if report_path:
+        report = StartupReport(report_path, main_window, opening = len(sys.argv) > 1)
     main_window.show()
-    sys.exit(app.exec())
\ No newline at end of file
+    if len(sys.argv) > 1:
+        #after the first paint, the bars then come in a chunk at a time
+        QTimer.singleShot(0, lambda: main_window.open_project(sys.argv[1]))
+    sys.exit(app.exec())
+
+if __name__ == "__main__":
+    main()
\ No newline at end of file
@@ -1,45 +1,57 @@
 # -*- mode: python ; coding: utf-8 -*-
 
+#unused parts of PyQt6 and the standard library, so they're neither collected nor scanned
+excludes = ['tkinter', 'unittest', 'pydoc', 'PyQt6.QtNetwork', 'PyQt6.QtPrintSupport', 'PyQt6.QtQml', 'PyQt6.QtQuick',
+            'PyQt6.QtSql', 'PyQt6.QtSvg', 'PyQt6.QtTest', 'PyQt6.QtWebEngineCore', 'PyQt6.QtMultimedia', 'PyQt6.QtBluetooth',
+            'PyQt6.QtDBus', 'PyQt6.QtDesigner', 'PyQt6.QtHelp', 'PyQt6.QtOpenGL', 'PyQt6.QtOpenGLWidgets', 'PyQt6.QtXml']
 
 a = Analysis(
     ['DrawingApp.py'],
     pathex=[],
     binaries=[],
-    datas=[('Bar.py', '.'), ('DrawingSection.py', '.')],
-    hiddenimports=['Bar', 'PyQt6.QtWidgets', 'PyQt6.QtGui', 'PyQt6.QtCore'],
+    datas=[('catalog.json', '.')],
+    hiddenimports=[],
     hookspath=[],
     hooksconfig={},
     runtime_hooks=[],
-    excludes=[],
+    excludes=excludes,
     noarchive=False,
     optimize=0,
 )
 pyz = PYZ(a.pure)
 
+#onedir: a onefile build unpacks every library to a temporary directory on each start
 exe = EXE(
     pyz,
     a.scripts,
-    a.binaries,
-    a.datas,
     [],
+    exclude_binaries=True,
     name='DrawingApp',
     debug=False,
     bootloader_ignore_signals=False,
     strip=False,
-    upx=True,
-    upx_exclude=[],
-    runtime_tmpdir=None,
+    upx=False,
     console=False,
     disable_windowed_traceback=False,
     argv_emulation=False,
     target_arch=None,
     codesign_identity=None,
     entitlements_file=None,
-   
 )
 
-app = BUNDLE(
+#UPX-packed libraries are decompressed on every load, that costs more startup than it saves disk
+coll = COLLECT(
     exe,
+    a.binaries,
+    a.datas,
+    strip=False,
+    upx=False,
+    upx_exclude=[],
+    name='DrawingApp',
+)
+
+app = BUNDLE(
+    coll,
     name='DrawingApp.app',
 
     bundle_identifier=None,
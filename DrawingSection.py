@@ -1,28 +1,176 @@
 import sys
-import requests
-from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QInputDialog, QGraphicsLineItem, QGraphicsTextItem, QGraphicsEllipseItem, QGraphicsRectItem
-from PyQt6.QtCore import Qt, QPointF
-from PyQt6.QtGui import QPainter, QPen, QAction, QKeySequence
+import uuid
+from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QInputDialog, QGraphicsEllipseItem, QGraphicsRectItem, QStyleOptionGraphicsItem, QGraphicsItem, QRubberBand
+from PyQt6.QtCore import Qt, QPointF, QRectF, QRect, QSize, QSizeF, QLineF
+from PyQt6.QtGui import QPainter, QPen, QAction, QKeySequence, QColor, QPixmap, QStaticText, QFont, QFontMetricsF, QPainterPath, QPainterPathStroker
 from math import sqrt, atan2, pi, cos, sin
-from Bar import PoolProject, BarType, Bar, BAR_TYPES
+from Bar import PoolProject, BarType, Bar
+from SpatialHash import SpatialHash
 SERVER_URL = "http://127.0.0.1:5000"
+GRID_SPACING = 20
+GRID_TILE_PIXELS = 240 #rough size of the cached grid tile on screen
+MIN_GRID_PIXELS = 8 #zoomed out further than this, only every 2nd, 4th, ... line is drawn
+SNAP_PIXELS = 10 #on screen, how close the cursor has to come to an endpoint to snap to it
+JOINT_TOLERANCE = 0.5 #scene units between endpoints that count as the same joint
+ZOOM_STEP = 1.25 #per wheel notch
+MIN_ZOOM = 0.05
+MAX_ZOOM = 20.0
+VIEW_EXTENT = 100000 #scene units the view can scroll over either side of the origin, 10,000 ft
+LABEL_HIDE_SCALE = 0.4 #zoomed out further than this, bar labels aren't drawn at all
+LABEL_MARGIN = 4.0 #between a bar's middle and its label's text
+LABEL_COLOR = Qt.GlobalColor.black
+SELECTION_COLOR = Qt.GlobalColor.red
 
-def send_bar_to_server(bar_data):
-    """ Sends bar data to the Flask server """
-    try:
-        data = {
-            "bar_type": bar_data['bar'].bar_type.name,
-            "length": bar_data['bar'].length,
-            "start_x": bar_data['start_point'].x(),
-            "start_y": bar_data['start_point'].y(),
-            "end_x": bar_data['end_point'].x(),
-            "end_y": bar_data['end_point'].y(),
-        }
-        response = requests.post(f"{SERVER_URL}/add_bar", json=data)
-        response.raise_for_status()  # Raises an error for bad responses (4xx, 5xx)
-        print(f"✅ Sent bar data to server: {response.json()}")
-    except requests.RequestException as e:
-        print(f"Error sending bar data to server: {e}")
+class BarItem(QGraphicsItem):
+    """ A bar as one scene item: its line and its label.
+
+    One item per bar rather than a line item and a text item halves what the scene's
+    index, hit tests and painting go through, and the label follows the line without
+    being moved by hand. The label is drawn from a QStaticText laid out once per text
+    change, and not at all zoomed out past LABEL_HIDE_SCALE. The label is part of shape(),
+    so clicking it picks the bar as clicking the line does.
+    """
+    font = None #shared by every label, made with the first item since it needs the application
+    metrics = None
+
+    def __init__(self, line, pen, bar_data = None):
+        super().__init__()
+        if BarItem.font is None:
+            BarItem.font = QFont()
+            BarItem.metrics = QFontMetricsF(BarItem.font)
+        self.bar_data = bar_data #the bar this item draws, set once the bar_data exists
+        self._line = QLineF(line)
+        self._pen = QPen(pen)
+        self.label = ""
+        self.label_size = QSizeF()
+        self.static_text = None
+        self.bounds = None
+        self.stroke = None #shape(), worked out on the first hit test that needs it
+
+    def line(self):
+        return QLineF(self._line)
+
+    def setLine(self, line):
+        self.prepareGeometryChange()
+        self._line = QLineF(line)
+        self.bounds = self.stroke = None
+
+    def pen(self):
+        return QPen(self._pen)
+
+    def setPen(self, pen):
+        if pen.widthF() != self._pen.widthF():
+            self.prepareGeometryChange()
+            self.bounds = self.stroke = None
+        self._pen = QPen(pen)
+        self.update()
+
+    def set_label(self, text):
+        if text == self.label:
+            return
+        self.prepareGeometryChange()
+        self.label = text
+        self.label_size = QSizeF(self.metrics.horizontalAdvance(text) + 2 * LABEL_MARGIN, self.metrics.height() + 2 * LABEL_MARGIN)
+        self.static_text = None
+        self.bounds = self.stroke = None
+
+    def label_rect(self):
+        """ Where the label is drawn, its top left corner at the middle of the line """
+        return QRectF(self._line.center(), self.label_size)
+
+    def boundingRect(self):
+        if self.bounds is None:
+            margin = self._pen.widthF() / 2 + 1
+            line = self._line
+            bounds = QRectF(line.p1(), line.p2()).normalized().adjusted(-margin, -margin, margin, margin)
+            self.bounds = bounds.united(self.label_rect()) if self.label else bounds
+        return self.bounds
+
+    def shape(self):
+        if self.stroke is None:
+            path = QPainterPath(self._line.p1())
+            path.lineTo(self._line.p2())
+            stroker = QPainterPathStroker()
+            stroker.setWidth(max(self._pen.widthF(), 1.0))
+            self.stroke = stroker.createStroke(path)
+            if self.label:
+                label = QPainterPath()
+                label.addRect(self.label_rect())
+                self.stroke = self.stroke.united(label)
+        return self.stroke
+
+    def paint(self, painter, option, widget = None):
+        painter.setPen(self._pen)
+        painter.drawLine(self._line)
+        if not self.label or QStyleOptionGraphicsItem.levelOfDetailFromTransform(painter.worldTransform()) < LABEL_HIDE_SCALE:
+            return
+        if self.static_text is None:
+            self.static_text = QStaticText(self.label)
+        painter.setPen(LABEL_COLOR)
+        painter.setFont(self.font)
+        painter.drawStaticText(self._line.center() + QPointF(LABEL_MARGIN, LABEL_MARGIN), self.static_text)
+
+class SelectionPreview(QGraphicsItem):
+    """ Stands in for the selection while it's dragged: its lines, drawn in one call per pen width.
+
+    The bars themselves are hidden until the drop. Moving their own items would have the
+    scene's index re-file every one of them on each mouse move, moving this is one item
+    whatever the size of the selection.
+    """
+    def __init__(self, bars):
+        super().__init__()
+        self.lines = {} #pen width -> lines
+        left = top = float('inf')
+        right = bottom = float('-inf')
+        for bar_data in bars:
+            line = bar_data['item'].line()
+            self.lines.setdefault(bar_data['item'].pen().widthF(), []).append(line)
+            left = min(left, line.x1(), line.x2())
+            right = max(right, line.x1(), line.x2())
+            top = min(top, line.y1(), line.y2())
+            bottom = max(bottom, line.y1(), line.y2())
+        margin = max(self.lines, default = 0) / 2 + 1
+        self.bounds = QRectF(left, top, right - left, bottom - top).adjusted(-margin, -margin, margin, margin)
+
+    def boundingRect(self):
+        return self.bounds
+
+    def paint(self, painter, option, widget = None):
+        for width, lines in self.lines.items():
+            painter.setPen(QPen(QColor(SELECTION_COLOR), width))
+            painter.drawLines(lines)
+
+def bar_to_json(bar_data):
+    """ Snapshot of a bar in the format the Flask server stores """
+    line = bar_data['item'].line()
+    return {
+        "bar_type": bar_data['bar'].bar_type.name,
+        "length": bar_data['bar'].length,
+        "start_x": line.x1(),
+        "start_y": line.y1(),
+        "end_x": line.x2(),
+        "end_y": line.y2(),
+        "color": QColor(bar_data['original_color']).name(QColor.NameFormat.HexArgb),
+        "elevation": bar_data['bar'].elevation,
+        "height": bar_data['bar'].height,
+    }
+
+def scroll_view(view, delta):
+    """ Scrolls by delta view pixels, the view blits what's already on screen and only paints the newly exposed strip """
+    view.horizontalScrollBar().setValue(view.horizontalScrollBar().value() + delta.x())
+    view.verticalScrollBar().setValue(view.verticalScrollBar().value() + delta.y())
+
+def wheel_zoom(view, event):
+    """ Zooms a view a step per wheel notch, keeping the point under the cursor still """
+    notches = event.angleDelta().y() / 120
+    if not notches:
+        return
+    zoom = view.transform().m11()
+    factor = min(max(zoom * ZOOM_STEP ** notches, MIN_ZOOM), MAX_ZOOM) / zoom
+    cursor = event.position().toPoint()
+    anchor = view.mapToScene(cursor)
+    view.scale(factor, factor)
+    scroll_view(view, view.mapFromScene(anchor) - cursor)
 
 class DrawingArea(QGraphicsView):
     def __init__(self, main_window):
@@ -31,7 +179,16 @@ class DrawingArea(QGraphicsView):
         self.scene = QGraphicsScene(self)
         self.setScene(self.scene)
         self.setRenderHint(QPainter.RenderHint.Antialiasing)
+        #a fixed area rather than the drawing's bounds, so there's always room to pan and zoom into
+        self.setSceneRect(QRectF(-VIEW_EXTENT, -VIEW_EXTENT, 2 * VIEW_EXTENT, 2 * VIEW_EXTENT))
+        self.setTransformationAnchor(QGraphicsView.ViewportAnchor.NoAnchor)
+        self.pan_start = None #view position of the last middle-drag event while panning
         self.grid_enabled = True
+        self.grid_spacing = GRID_SPACING
+        self.grid_pen = QPen(Qt.GlobalColor.lightGray, 0, Qt.PenStyle.DotLine)
+        self.grid_key = None #(spacing, zoom, device pixel ratio) the cached tile was drawn for
+        self.grid_tile = None
+        self.grid_block = 0 #scene units one tile covers
         self.drawing = False
         self.deleting = False
         self.editing = False
@@ -40,169 +197,352 @@ class DrawingArea(QGraphicsView):
         self.adding_text = False
         self.start_point = QPointF()
         self.current_line = None
-        self.drawn_bars = []
-        self.selected_bar = None
-        self.offset = QPointF()
+        self.drawn_bars = {} #bar id -> bar_data, keeps drawing order
+        self.selection = {} #bar id -> bar_data of the selected bars, in the order they were picked
+        self.band = None #the rubber band while one is being dragged out
+        self.band_origin = None #its fixed corner, in view coordinates
+        self.band_adds = False #Shift was held, the bars it catches join the selection
+        self.drag_start = None #scene position a drag of the selection started at
+        self.drag_bar = None #the selected bar the drag grabbed, the one that snaps
+        self.drag_preview = None #SelectionPreview while the selection is dragged
+        self.drag_delta = QPointF()
+        self.drag_exclude = set() #ends of the selected bars, which can't snap onto each other
         self.current_color = Qt.GlobalColor.white
+        #both ends of every bar keyed by (bar id, 0 or 1), for snapping and joint counting
+        self.endpoints = SpatialHash(GRID_SPACING)
+        self.snap_marker = None
+        #called with a bar's id whenever it's added, removed or its geometry changes, see Views.ProjectionView
+        self.bar_listeners = []
     
        
     def drawBackground(self, painter, rect):
         if self.grid_enabled:
-            pen = QPen(Qt.GlobalColor.lightGray, 0, Qt.PenStyle.DotLine)
-            painter.setPen(pen)
-            left = int(rect.left()) - (int(rect.left()) % 20)
-            top = int(rect.top()) - (int(rect.top()) % 20)
-            for x in range(left, int(rect.right()), 20):
-                painter.drawLine(x, int(rect.top()), x, int(rect.bottom()))
-            for y in range(top, int(rect.bottom()), 20):
-                painter.drawLine(int(rect.left()), y, int(rect.right()), y)
+            #the screen's ratio too, a tile drawn for a 1x screen is blurred when scaled up on a HiDPI one
+            key = (self.grid_spacing, self.transform().m11(), self.viewport().devicePixelRatioF())
+            if key != self.grid_key:
+                self.build_grid_tile(key)
+            #the tile repeats every grid_block scene units starting at the scene origin
+            offset = QPointF(rect.left() % self.grid_block, rect.top() % self.grid_block)
+            painter.drawTiledPixmap(rect, self.grid_tile, offset)
+
+    def build_grid_tile(self, key):
+        """ Draws a few grid cells once at the screen's resolution, repainting the grid is then a single tiled blit """
+        spacing, zoom, ratio = key
+        step = spacing
+        while step * zoom < MIN_GRID_PIXELS:
+            step *= 2
+        cells = max(1, round(GRID_TILE_PIXELS / (step * zoom)))
+        block = step * cells
+        pixels = max(1, round(block * zoom * ratio)) #device pixels
+        tile = QPixmap(pixels, pixels)
+        tile.fill(Qt.GlobalColor.transparent)
+        #painted at the screen's ratio, so the pen comes out as it did drawn straight onto the view
+        tile.setDevicePixelRatio(ratio)
+        painter = QPainter(tile)
+        painter.setPen(self.grid_pen)
+        size = pixels / ratio
+        for cell in range(cells):
+            position = round(cell * pixels / cells) / ratio #on a device pixel, so the line stays sharp
+            painter.drawLine(QPointF(position, 0), QPointF(position, size))
+            painter.drawLine(QPointF(0, position), QPointF(size, position))
+        painter.end()
+        #maps the tile to exactly block scene units, so it can't drift off the grid at odd zoom levels
+        tile.setDevicePixelRatio(pixels / block)
+        self.grid_tile = tile
+        self.grid_block = block
+        self.grid_key = key
+
+    def wheelEvent(self, event):
+        wheel_zoom(self, event)
+
+    def show_drawing(self):
+        """ Centres the view on whatever is drawn """
+        bounds = self.scene.itemsBoundingRect()
+        if not bounds.isNull():
+            self.centerOn(bounds.center())
 
     def mousePressEvent(self, event) -> None:
+        if event.button() == Qt.MouseButton.MiddleButton:
+            self.pan_start = event.position()
+            self.viewport().setCursor(Qt.CursorShape.ClosedHandCursor)
+            return
         if event.button() == Qt.MouseButton.LeftButton:
             scene_pos = self.mapToScene(event.pos())
             print(f"Mouse press at view coordinates: {event.pos()}, scene coordinates: {scene_pos}")
             if self.deleting:
-                items = self.scene.items(scene_pos)
-                if items:
-                    print(f"Deleting Item at scene position: {scene_pos} Item: {items[0]}")
-                    self.main_window.delete_bar(items[0])
+                item = self.scene.itemAt(scene_pos, self.transform())
+                if item:
+                    print(f"Deleting Item at scene position: {scene_pos} Item: {item}")
+                    self.main_window.delete_bar(item)
                    
             elif self.editing:
-                items = self.scene.items(scene_pos)
-                if items:
-                    print(f"Editing items at scene position: {scene_pos} Item: {items[0]}")
-                    self.main_window.edit_bar(items[0])
+                item = self.scene.itemAt(scene_pos, self.transform())
+                if item:
+                    print(f"Editing items at scene position: {scene_pos} Item: {item}")
+                    self.main_window.edit_bar(item)
                     self.editing = False
             elif self.selecting: 
-                items = self.scene.items(scene_pos)
-                for item in items:
-                    if isinstance(item, QGraphicsLineItem):
-                        self.select_bar(item)  
-                        self.moving = True 
-                        self.offset = scene_pos - item.line().p1()
-                        break
-                    if isinstance(item, QGraphicsTextItem):
-                        self.select_bar(item)
-                        break
+                item = self.scene.itemAt(scene_pos, self.transform())
+                bar_data = self.bar_for_item(item)
+                shift = event.modifiers() & Qt.KeyboardModifier.ShiftModifier
+                if bar_data is None:
+                    #empty space starts a rubber band, with Shift it adds to the selection
+                    if not shift:
+                        self.clear_selection()
+                    self.start_band(event.pos(), bool(shift))
+                elif shift:
+                    self.toggle_bar(bar_data)
+                else:
+                    if bar_data['id'] not in self.selection:
+                        self.select_bars([bar_data])
+                    self.moving = True
+                    self.drag_start = scene_pos
+                    self.drag_bar = bar_data
             elif self.adding_text:
                 text, ok = QInputDialog.getText(self, 'Add Text', 'Enter text:')
                 if ok and text:
-                    text_item = QGraphicsTextItem(text)
-                    text_item.setPos(scene_pos)
-                    self.scene.addItem(text_item)
+                    self.main_window.add_text(text, scene_pos)
             else:
                 self.drawing = True
-                self.start_point = self.mapToScene(event.pos())
-                self.current_line = QGraphicsLineItem()
+                self.start_point = self.snap(scene_pos, event)
                 pen_thickness = self.main_window.current_bar_type.thickness
                 pen = QPen(self.current_color)
                 pen.setWidth(pen_thickness)
-                self.current_line.setPen(pen)
+                #becomes the bar's item once it's drawn
+                self.current_line = BarItem(QLineF(self.start_point, self.start_point), pen)
                 self.scene.addItem(self.current_line)
     
     def mouseMoveEvent(self, event):
+        if self.pan_start is not None:
+            delta = self.pan_start - event.position()
+            self.pan_start = event.position()
+            scroll_view(self, delta.toPoint())
+            return
         if self.drawing:
-            end_point = self.mapToScene(event.pos())
-            if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
-               # end_point = snap_to_45_degrees(self.start_point, end_point)
-                
-                angle = atan2(end_point.y() - self.start_point.y(), end_point.x() - self.start_point.x())
-                angle = round(angle/ (pi /4)) * (pi / 4) # 45 degree increments
-                distance = sqrt((end_point.x() - self.start_point.x()) ** 2 + (end_point.y() - self.start_point.y()) ** 2)
-                end_point.setX(self.start_point.x() + cos(angle) * distance)
-                end_point.setY(self.start_point.y() + sin(angle) * distance)
-                
-            self.current_line.setLine(self.start_point.x(), self.start_point.y(), end_point.x(), end_point.y())
-            length = sqrt((end_point.x() - self.start_point.x()) ** 2 + (end_point.y() - self.start_point.y()) ** 2)
-        elif self.moving and self.selected_bar:
-            new_pos = self.mapToScene(event.pos()) - self.offset
-            self.move_selected_bar(new_pos)
+            end_point = self.drawing_end_point(event)
+            self.current_line.setLine(QLineF(self.start_point, end_point))
+        elif self.band is not None:
+            self.band.setGeometry(QRect(self.band_origin, event.pos()).normalized())
+        elif self.moving and self.selection:
+            self.drag_selection(self.mapToScene(event.pos()))
 
     def mouseReleaseEvent(self, event):
+        if event.button() == Qt.MouseButton.MiddleButton and self.pan_start is not None:
+            self.pan_start = None
+            self.viewport().unsetCursor()
+            return
         if event.button() == Qt.MouseButton.LeftButton and self.drawing:
             self.drawing = False
-            end_point = self.mapToScene(event.pos())
-            if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
-                angle = atan2(end_point.y() - self.start_point.y(), end_point.x() - self.start_point.x())
-                angle = round(angle/ (pi /4)) * (pi / 4) # 45 degree increments
-                distance = sqrt((end_point.x() - self.start_point.x()) ** 2 + (end_point.y() - self.start_point.y()) ** 2)
-                end_point.setX(self.start_point.x() + cos(angle) * distance)
-                end_point.setY(self.start_point.y() + sin(angle) * distance)
-             #   end_point = self.snap_to_45_degrees(self.start_point, end_point)
-            self.current_line.setLine(self.start_point.x(), self.start_point.y(), end_point.x(),  end_point.y())
+            end_point = self.drawing_end_point(event)
+            self.hide_snap()
+            self.current_line.setLine(QLineF(self.start_point, end_point))
             length = sqrt((end_point.x()- self.start_point.x())**2 + (end_point.y() - self.start_point.y())**2)
             bar_data = self.main_window.add_drawn_bar(length, self.start_point, end_point)
             if bar_data:
-                self.drawn_bars.append(bar_data)
-                self.main_window.history.append(('add', bar_data))
-                send_bar_to_server(bar_data)
-
-                
-
                 #prompts the user to select length when drawing bar 
                 new_length, ok = QInputDialog.getDouble(self,'Bar Length', 'Enter Bar Length', min = 0)
                 if ok and new_length != 0:
-                    bar_data['bar'].length = new_length
-                    self.main_window.project.calculate_total_cost()
-                    self.main_window.update_total_cost()
-                    #updates actual line
-                    start_point = bar_data['start_point']
-                    end_point = bar_data['end_point']
-                    direction_vector = QPointF(end_point.x() - start_point.x(), end_point.y() - start_point.y())
-                    vector_length = sqrt(direction_vector.x()**2 + direction_vector.y()**2)
-                    normalized_vector = QPointF(direction_vector.x() / vector_length, direction_vector.y() / vector_length)
-                
-                # Calculate the new end point
-                    new_end_point = QPointF(start_point.x() + normalized_vector.x() * new_length * 10,
-                                        start_point.y() + normalized_vector.y() * new_length * 10)
-                    bar_data['line'].setLine(start_point.x(), start_point.y(), new_end_point.x(), new_end_point.y())
-                    bar_data['text'].setPlainText(f"{bar_data['bar'].bar_type.name} ({new_length:.2f} ft)")
-                    bar_data['text'].setPos((start_point.x() + new_end_point.x()) / 2, (start_point.y() + new_end_point.y()) / 2)
-                send_bar_to_server(bar_data)
+                    #part of drawing the bar, not a separate undo step
+                    self.main_window.set_bar_length(bar_data, new_length, record = False)
             self.current_line = None
             self.scene.update()
 
+        elif event.button() == Qt.MouseButton.LeftButton and self.band is not None:
+            rect = self.mapToScene(self.band.geometry()).boundingRect()
+            self.band.hide()
+            self.band.deleteLater()
+            self.band = None
+            self.select_bars(self.bars_in_rect(rect), add = self.band_adds)
+
         elif self.moving:
             self.moving = False
-            if self.selected_bar:
-                self.selected_bar['line'].setPen(QPen(self.selected_bar['original_color']))
-            self.selected_bar = None 
+            self.end_drag()
 
-    def move_selected_bar(self, new_pos):
-        if not self.selected_bar:
-            return 
+    def start_band(self, origin, adds):
+        self.band_origin = origin
+        self.band_adds = adds
+        self.band = QRubberBand(QRubberBand.Shape.Rectangle, self.viewport())
+        self.band.setGeometry(QRect(origin, QSize()))
+        self.band.show()
 
-        delta = new_pos - self.selected_bar['line'].line().p1()
-        print(f"Delta for moving: {delta}")
+    def bars_in_rect(self, rect):
+        """ The bars whose lines or labels touch a scene rectangle, found through the scene's index """
+        bars = []
+        for item in self.scene.items(rect, Qt.ItemSelectionMode.IntersectsItemShape):
+            bar_data = self.bar_for_item(item)
+            if bar_data is not None:
+                bars.append(bar_data)
+        return bars
 
-        new_p1 = self.selected_bar['line'].line().p1() + delta
-        new_p2 = self.selected_bar['line'].line().p2() + delta
+    def drag_selection(self, scene_pos):
+        """ Moves the selection with the mouse. Only a SelectionPreview moves until the drop,
+        which updates the bars' lines, ends, labels and totals as one undo step """
+        if self.drag_preview is None:
+            self.drag_preview = SelectionPreview(self.selection.values())
+            self.scene.addItem(self.drag_preview)
+            for bar_data in self.selection.values():
+                bar_data['item'].setVisible(False)
+            self.drag_exclude = {(bar_id, end) for bar_id in self.selection for end in (0, 1)}
+        delta = scene_pos - self.drag_start
+        #whichever end of the grabbed bar is closer to an unselected bar's end snaps onto it
+        line = self.drag_bar['item'].line().translated(delta)
+        best = None
+        for end in (line.p1(), line.p2()):
+            found = self.endpoints.nearest(end.x(), end.y(), self.snap_radius(), self.drag_exclude)
+            if found is not None and (best is None or found[3] < best[1][3]):
+                best = (end, found)
+        if best is not None:
+            end, (_, x, y, _) = best
+            delta += QPointF(x, y) - end
+            self.show_snap(QPointF(x, y))
+        else:
+            self.hide_snap()
+        self.drag_delta = delta
+        self.drag_preview.setPos(delta)
 
-        self.selected_bar['line'].setLine(
-            new_p1.x(), new_p1.y(),
-            new_p2.x(), new_p2.y()
-        )
-        
-        self.selected_bar['text'].setPos(
-            (new_p1.x() + new_p2.x()) / 2,
-            (new_p1.y() + new_p2.y()) / 2
-        )
+    def end_drag(self):
+        self.hide_snap()
+        if self.drag_preview is None:
+            return #a click, not a drag
+        for bar_data in self.selection.values():
+            bar_data['item'].setVisible(True)
+        self.scene.removeItem(self.drag_preview)
+        self.drag_preview = None
+        self.drag_exclude = set()
+        if not self.drag_delta.isNull():
+            self.main_window.move_selection(self.drag_delta)
+
+    def highlight(self, bar_data, selected):
+        pen = bar_data['item'].pen() #keeps the bar type's width
+        pen.setColor(QColor(SELECTION_COLOR if selected else bar_data['original_color']))
+        bar_data['item'].setPen(pen)
+
+    @property
+    def selected_bar(self):
+        """ The selected bar when exactly one is """
+        if len(self.selection) == 1:
+            return next(iter(self.selection.values()))
+        return None
 
-        print(f"Moved bar to new position: {new_pos}")
-        self.update()
-                
     def select_bar(self, item):
-        if self.selected_bar:
-            self.selected_bar['line'].setPen(QPen(self.selected_bar['original_color']))
-
-        for bar_data in self.drawn_bars:
-            if bar_data['line'] == item: #or bar_data['text'] == item:
-                self.selected_bar = bar_data
-                self.selected_bar['line'].setPen(QPen(Qt.GlobalColor.red))
-                self.main_window.show_bar_properties(self.selected_bar)
-                print(f"Bar selected: {bar_data}")
-                break
+        """ Selects only the bar an item draws """
+        bar_data = self.bar_for_item(item)
+        if bar_data:
+            self.select_bars([bar_data])
+            print(f"Bar selected: {bar_data}")
+
+    def select_bars(self, bars, add = False):
+        """ Selects bars, in place of the current selection unless add """
+        if not add:
+            self.clear_selection(notify = False)
+        for bar_data in bars:
+            if bar_data['id'] not in self.selection:
+                self.selection[bar_data['id']] = bar_data
+                self.highlight(bar_data, True)
+        self.main_window.show_selection_properties()
+
+    def toggle_bar(self, bar_data):
+        if bar_data['id'] in self.selection:
+            self.deselect(bar_data)
+            self.main_window.show_selection_properties()
+        else:
+            self.select_bars([bar_data], add = True)
+
+    def deselect(self, bar_data):
+        if self.selection.pop(bar_data['id'], None) is not None:
+            self.highlight(bar_data, False)
+
+    def clear_selection(self, notify = True):
+        for bar_data in self.selection.values():
+            self.highlight(bar_data, False)
+        self.selection.clear()
+        if notify:
+            self.main_window.show_selection_properties()
+
+    def drawing_end_point(self, event):
+        """ Where the bar being drawn ends: held to 45 degree steps with Ctrl, otherwise snapped to a nearby end """
+        end_point = self.mapToScene(event.pos())
+        if event.modifiers() & Qt.KeyboardModifier.ControlModifier:
+            angle = atan2(end_point.y() - self.start_point.y(), end_point.x() - self.start_point.x())
+            angle = round(angle/ (pi /4)) * (pi / 4) # 45 degree increments
+            distance = sqrt((end_point.x() - self.start_point.x()) ** 2 + (end_point.y() - self.start_point.y()) ** 2)
+            end_point.setX(self.start_point.x() + cos(angle) * distance)
+            end_point.setY(self.start_point.y() + sin(angle) * distance)
+            return end_point
+        return self.snap(end_point, event)
+
+    def snap_radius(self):
+        """ SNAP_PIXELS in scene units at the current zoom """
+        return SNAP_PIXELS / max(self.transform().m11(), 1e-6)
+
+    def snap(self, point, event):
+        """ The nearest bar end within snapping range of point, or point itself. Alt turns snapping off """
+        found = None
+        if not event.modifiers() & Qt.KeyboardModifier.AltModifier:
+            found = self.endpoints.nearest(point.x(), point.y(), self.snap_radius())
+        if found is None:
+            self.hide_snap()
+            return point
+        snapped = QPointF(found[1], found[2])
+        self.show_snap(snapped)
+        return snapped
+
+    def show_snap(self, point):
+        if self.snap_marker is None:
+            self.snap_marker = QGraphicsEllipseItem(-5, -5, 10, 10)
+            self.snap_marker.setPen(QPen(QColor(Qt.GlobalColor.yellow), 0))
+            self.snap_marker.setFlag(QGraphicsEllipseItem.GraphicsItemFlag.ItemIgnoresTransformations)
+            self.snap_marker.setZValue(1)
+            self.scene.addItem(self.snap_marker)
+        self.snap_marker.setPos(point)
+
+    def hide_snap(self):
+        if self.snap_marker is not None:
+            self.scene.removeItem(self.snap_marker)
+            self.snap_marker = None
+
+    def bar_geometry_changed(self, bar_data):
+        """ Re-files a bar's ends and tells the listeners, after its line, elevation or height changed """
+        line = bar_data['item'].line()
+        bar_id = bar_data['id']
+        self.endpoints.move((bar_id, 0), line.x1(), line.y1())
+        self.endpoints.move((bar_id, 1), line.x2(), line.y2())
+        for listener in self.bar_listeners:
+            listener(bar_id)
+
+    def refresh_label(self, bar_data):
+        """ Puts a bar's label text in line with its type and length, the label's position follows the line by itself """
+        bar_data['item'].set_label(f"{bar_data['bar'].bar_type.name} ({bar_data['bar'].length:.2f} ft)")
+
+    def register_bar(self, bar_data):
+        """ Gives the bar a stable id and files it under that id """
+        bar_id = bar_data.get('id')
+        if bar_id is None:
+            bar_id = bar_data['id'] = uuid.uuid4().hex
+        self.drawn_bars[bar_id] = bar_data
+        self.bar_geometry_changed(bar_data)
+        return bar_id
+
+    def unregister_bar(self, bar_data):
+        self.drawn_bars.pop(bar_data['id'], None)
+        self.endpoints.remove((bar_data['id'], 0))
+        self.endpoints.remove((bar_data['id'], 1))
+        for listener in self.bar_listeners:
+            listener(bar_data['id'])
+
+    def bar_for_item(self, item):
+        """ The bar an item draws, None for anything that isn't a bar in the drawing """
+        bar_data = getattr(item, 'bar_data', None) #only BarItems have one
+        if bar_data is None or self.drawn_bars.get(bar_data.get('id')) is not bar_data:
+            return None
+        return bar_data
     
+    def new_bar_item(self, start_point, end_point, bar_type, color):
+        """ A BarItem drawn in the bar type's width, not yet in the scene """
+        pen = QPen(color)
+        pen.setWidth(bar_type.thickness)
+        return BarItem(QLineF(start_point, end_point), pen)
+
     def set_color(self, color):
         self.current_color = color
 
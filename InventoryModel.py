@@ -0,0 +1,108 @@
+from PyQt6.QtCore import Qt, QAbstractTableModel, QModelIndex, QSortFilterProxyModel
+
+COLUMNS = ["Bar Type", "Count", "Footage (ft)", "Cost", "Stock Pieces", "Waste (ft)", "Stock Cost"]
+TYPE, COUNT, FOOTAGE, COST, STOCK, WASTE, STOCK_COST = range(len(COLUMNS))
+SORT_ROLE = Qt.ItemDataRole.UserRole #raw numbers, so columns sort by value rather than by text
+
+class InventoryModel(QAbstractTableModel):
+    """ One row per bar type the project has used, read straight from PoolProject's running totals.
+
+    Rows are never removed or reordered, a type that drops to no bars keeps its row with
+    zeros and InventoryFilter hides it, so every change is a dataChanged on one row.
+    """
+    def __init__(self, project, parent = None):
+        super().__init__(parent)
+        self.project = project
+        self.bar_types = [] #row -> BarType
+        self.rows = {} #BarType -> row
+        self.cut_plans = {} #BarType -> CutPlan, see set_cut_plans
+        project.listeners.append(self.type_changed)
+        for bar_type in project.type_totals:
+            self.type_changed(bar_type)
+
+    def rowCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(self.bar_types)
+
+    def columnCount(self, parent = QModelIndex()):
+        return 0 if parent.isValid() else len(COLUMNS)
+
+    def headerData(self, section, orientation, role = Qt.ItemDataRole.DisplayRole):
+        if orientation == Qt.Orientation.Horizontal and role == Qt.ItemDataRole.DisplayRole:
+            return COLUMNS[section]
+        return None
+
+    def data(self, index, role = Qt.ItemDataRole.DisplayRole):
+        if not index.isValid():
+            return None
+        bar_type = self.bar_types[index.row()]
+        column = index.column()
+        if role == Qt.ItemDataRole.TextAlignmentRole:
+            if column != TYPE:
+                return Qt.AlignmentFlag.AlignRight | Qt.AlignmentFlag.AlignVCenter
+            return None
+        if role not in (Qt.ItemDataRole.DisplayRole, SORT_ROLE):
+            return None
+        if column == TYPE:
+            return bar_type.name
+        display = role == Qt.ItemDataRole.DisplayRole
+        if column <= COST:
+            totals = self.project.type_totals.get(bar_type)
+            if column == COUNT:
+                return totals.count if totals else 0
+            if column == FOOTAGE:
+                value = totals.footage if totals else 0.0
+                return f"{value:.2f}" if display else value
+            value = totals.cost if totals else 0.0
+            return f"${value:.2f}" if display else value
+        plan = self.cut_plans.get(bar_type)
+        if plan is None:
+            return None
+        if column == STOCK:
+            if not display:
+                return plan.stock_count
+            stock = f"{plan.stock_count} x {plan.stock_length:g} ft"
+            if plan.oversize:
+                stock += f" ({len(plan.oversize)} spliced)"
+            return stock
+        if column == WASTE:
+            return f"{plan.waste:.2f}" if display else plan.waste
+        return f"${plan.cost:.2f}" if display else plan.cost
+
+    def type_changed(self, bar_type):
+        """ PoolProject listener, one row's worth of work whatever the project's size """
+        row = self.rows.get(bar_type)
+        if row is None:
+            row = len(self.bar_types)
+            self.beginInsertRows(QModelIndex(), row, row)
+            self.bar_types.append(bar_type)
+            self.rows[bar_type] = row
+            self.endInsertRows()
+            return
+        #the stock columns too, a price change moves their cost, and the name for a renamed type
+        self.dataChanged.emit(self.index(row, TYPE), self.index(row, STOCK_COST))
+
+    def is_empty(self, row):
+        totals = self.project.type_totals.get(self.bar_types[row])
+        return totals is None or totals.count == 0
+
+    def set_cut_plans(self, plans):
+        """ Takes a new cut_list() result, only rows whose plan was redone are repainted """
+        old_plans = self.cut_plans
+        self.cut_plans = plans
+        for bar_type, row in self.rows.items():
+            if plans.get(bar_type) is not old_plans.get(bar_type):
+                self.dataChanged.emit(self.index(row, STOCK), self.index(row, STOCK_COST))
+
+class InventoryFilter(QSortFilterProxyModel):
+    """ Sorts by value, filters on the type name and hides types with no bars left """
+    def __init__(self, parent = None):
+        super().__init__(parent)
+        self.setSortRole(SORT_ROLE)
+        self.setFilterKeyColumn(TYPE)
+        self.setFilterCaseSensitivity(Qt.CaseSensitivity.CaseInsensitive)
+        self.setDynamicSortFilter(True)
+
+    def filterAcceptsRow(self, source_row, source_parent):
+        if self.sourceModel().is_empty(source_row):
+            return False
+        return super().filterAcceptsRow(source_row, source_parent)
@@ -0,0 +1,173 @@
+import os
+from math import floor, ceil
+from PyQt6.QtWidgets import QGraphicsLineItem, QGraphicsTextItem
+from PyQt6.QtCore import Qt, QThread, QRectF, QPointF, QMarginsF, pyqtSignal
+from PyQt6.QtGui import QPainter, QPen, QColor, QFont, QFontInfo, QPdfWriter, QPageSize, QPageLayout
+from DrawingSection import BarItem, LABEL_MARGIN, LABEL_COLOR
+
+PIXELS_PER_FOOT = 10 #scene units per foot of bar, same scale add_drawn_bar uses
+FIT_TO_PAGE = None
+#label -> inches of paper per foot of drawing, FIT_TO_PAGE squeezes everything onto one page
+EXPORT_SCALES = {
+    "Fit to one page": FIT_TO_PAGE,
+    '1/8" = 1 ft (tiled pages)': 1 / 8,
+    '1/4" = 1 ft (tiled pages)': 1 / 4,
+    '1/2" = 1 ft (tiled pages)': 1 / 2,
+}
+CHECK_EVERY = 500 #items drawn between progress updates and cancellation checks
+
+class SceneSnapshot:
+    """ Plain copy of what the scene draws, safe to hand to another thread """
+    def __init__(self, rect, lines, texts):
+        self.rect = rect
+        self.lines = lines #(QLineF, QColor, width)
+        self.texts = texts #(QPointF, text, family, pixel size, QColor)
+
+def snapshot_scene(scene):
+    """ Runs on the UI thread, costs one pass over the items and no painting """
+    lines = []
+    texts = []
+    last_font = None #QFontInfo is slow and labels almost always share one font
+    bar_font = None #family and pixel size of BarItem.font, every bar label uses it
+    for item in scene.items(Qt.SortOrder.AscendingOrder):
+        if not item.isVisible():
+            continue
+        if isinstance(item, BarItem):
+            pen = item.pen()
+            lines.append((item.line().translated(item.pos()), pen.color(), pen.widthF()))
+            if item.label:
+                if bar_font is None:
+                    bar_font = (BarItem.font.family(), QFontInfo(BarItem.font).pixelSize())
+                texts.append((item.pos() + item.line().center() + QPointF(LABEL_MARGIN, LABEL_MARGIN), item.label, *bar_font, QColor(LABEL_COLOR)))
+        elif isinstance(item, QGraphicsLineItem):
+            pen = item.pen()
+            lines.append((item.line().translated(item.pos()), pen.color(), pen.widthF()))
+        elif isinstance(item, QGraphicsTextItem):
+            font = item.font()
+            if font != last_font:
+                last_font = font
+                pixel_size = QFontInfo(font).pixelSize()
+            margin = item.document().documentMargin()
+            texts.append((item.pos() + QPointF(margin, margin), item.toPlainText(), font.family(), pixel_size, item.defaultTextColor()))
+    return SceneSnapshot(scene.itemsBoundingRect(), lines, texts)
+
+class PdfExportWorker(QThread):
+    """ Writes a SceneSnapshot to a PDF off the UI thread, cancel with requestInterruption() """
+    progress = pyqtSignal(int) #percent done
+    succeeded = pyqtSignal(str)
+    failed = pyqtSignal(str)
+
+    def __init__(self, snapshot, file_path, inches_per_foot = FIT_TO_PAGE, resolution = 1200, parent = None):
+        super().__init__(parent)
+        self.snapshot = snapshot
+        self.file_path = file_path
+        self.inches_per_foot = inches_per_foot
+        self.resolution = resolution
+
+    def run(self):
+        try:
+            finished = self.write()
+        except Exception as e:
+            self.failed.emit(str(e))
+            return
+        if finished:
+            self.succeeded.emit(self.file_path)
+        else:
+            #a cancelled export would leave a half-written file behind
+            if os.path.exists(self.file_path):
+                os.remove(self.file_path)
+            self.failed.emit("Export cancelled")
+
+    def write(self):
+        snapshot = self.snapshot
+        rect = snapshot.rect
+        if rect.isEmpty():
+            rect = QRectF(0, 0, 1, 1)
+        writer = QPdfWriter(self.file_path)
+        writer.setResolution(self.resolution)
+        orientation = QPageLayout.Orientation.Landscape if rect.width() > rect.height() else QPageLayout.Orientation.Portrait
+        writer.setPageLayout(QPageLayout(QPageSize(QPageSize.PageSizeId.Letter), orientation, QMarginsF(0.5, 0.5, 0.5, 0.5), QPageLayout.Unit.Inch))
+        page = QRectF(writer.pageLayout().paintRectPixels(self.resolution))
+        page.moveTo(0, 0)
+
+        if self.inches_per_foot is FIT_TO_PAGE:
+            scale = min(page.width() / rect.width(), page.height() / rect.height())
+            tiles = [rect]
+        else:
+            #device pixels per scene unit at true drawing scale, then as many pages as the drawing needs
+            scale = self.inches_per_foot * self.resolution / PIXELS_PER_FOOT
+            tile_width = page.width() / scale
+            tile_height = page.height() / scale
+            columns = max(1, ceil(rect.width() / tile_width))
+            rows = max(1, ceil(rect.height() / tile_height))
+            tiles = [QRectF(rect.left() + column * tile_width, rect.top() + row * tile_height, tile_width, tile_height)
+                     for row in range(rows) for column in range(columns)]
+        pages = self.bin_by_tile(tiles)
+        total = max(1, sum(len(lines) + len(texts) for lines, texts in pages))
+        done = 0
+
+        painter = QPainter(writer)
+        try:
+            painter.setRenderHint(QPainter.RenderHint.Antialiasing)
+            for index, (tile, (lines, texts)) in enumerate(zip(tiles, pages)):
+                if index:
+                    writer.newPage()
+                painter.resetTransform()
+                painter.fillRect(page, QColor(Qt.GlobalColor.black))
+                painter.setClipRect(page)
+                #centres a fitted drawing, tiled pages start at their top left corner
+                if self.inches_per_foot is FIT_TO_PAGE:
+                    painter.translate((page.width() - tile.width() * scale) / 2, (page.height() - tile.height() * scale) / 2)
+                painter.scale(scale, scale)
+                painter.translate(-tile.left(), -tile.top())
+                for line, color, width in lines:
+                    painter.setPen(QPen(color, width))
+                    painter.drawLine(line)
+                    done += 1
+                    if done % CHECK_EVERY == 0 and not self.report(done, total):
+                        return False
+                for position, text, family, pixel_size, color in texts:
+                    font = QFont(family)
+                    font.setPixelSize(max(1, pixel_size))
+                    painter.setFont(font)
+                    painter.setPen(color)
+                    painter.drawText(QRectF(position, position + QPointF(10000, 10000)), Qt.AlignmentFlag.AlignLeft | Qt.AlignmentFlag.AlignTop, text)
+                    done += 1
+                    if done % CHECK_EVERY == 0 and not self.report(done, total):
+                        return False
+        finally:
+            painter.end()
+        self.progress.emit(100)
+        return True
+
+    def report(self, done, total):
+        self.progress.emit(done * 100 // total)
+        return not self.isInterruptionRequested()
+
+    def bin_by_tile(self, tiles):
+        """ Sorts items into the pages they touch, so each page only draws its own share """
+        pages = [([], []) for _ in tiles]
+        if len(tiles) == 1:
+            return [(self.snapshot.lines, self.snapshot.texts)]
+        first = tiles[0]
+        width = first.width()
+        height = first.height()
+        columns = round((tiles[-1].left() - first.left()) / width) + 1
+        def touching(bounds):
+            for row in range(max(0, floor((bounds.top() - first.top()) / height)), floor((bounds.bottom() - first.top()) / height) + 1):
+                for column in range(max(0, floor((bounds.left() - first.left()) / width)), min(columns, floor((bounds.right() - first.left()) / width) + 1)):
+                    index = row * columns + column
+                    if index < len(tiles):
+                        yield index
+        for entry in self.snapshot.lines:
+            line, _, pen_width = entry
+            bounds = QRectF(line.p1(), line.p2()).normalized().adjusted(-pen_width, -pen_width, pen_width, pen_width)
+            for index in touching(bounds):
+                pages[index][0].append(entry)
+        for entry in self.snapshot.texts:
+            position, text, _, pixel_size, _ = entry
+            #labels are short, a generous box keeps ones that straddle a page edge on both pages
+            bounds = QRectF(position, position + QPointF(pixel_size * len(text), pixel_size * 1.5))
+            for index in touching(bounds):
+                pages[index][1].append(entry)
+        return pages
@@ -0,0 +1,208 @@
+""" Binary project files.
+
+A project file is a header followed by frames, each a 4 byte little-endian length and a
+msgpack body. The first frame is a Snapshot of the whole project; autosave appends Delta
+frames holding only the bars changed or removed since the previous save, so saving costs
+the size of the change rather than the size of the project. Reading replays the frames
+in order. A torn frame at the end (a crash mid-autosave) is ignored and cut off by the
+next writer. Bar types are stored with their prices and referenced by index, so a file
+still opens if the catalog it was drawn with has changed.
+"""
+import os
+import mmap
+import struct
+from typing import Optional, Union
+import msgspec
+
+MAGIC = b'PSPF\x00\x01\r\n'
+FRAME_HEADER = struct.Struct('<I')
+PROJECT_SUFFIX = '.psp'
+
+class TypeRecord(msgspec.Struct, array_like = True):
+    name: str
+    cost_per_unit: float
+    thickness: int
+    stock_length: float
+
+class BarRecord(msgspec.Struct, array_like = True):
+    id: str
+    bar_type: int #index into the file's type table
+    length: float #feet
+    x1: float
+    y1: float
+    x2: float
+    y2: float
+    color: int #0xAARRGGBB
+    elevation: float = 0.0 #feet, files from before bars had heights leave these out
+    height: float = 0.0
+
+class TextRecord(msgspec.Struct, array_like = True):
+    text: str
+    x: float
+    y: float
+    color: int
+
+class Snapshot(msgspec.Struct, array_like = True, tag = 's'):
+    types: list[TypeRecord]
+    bars: list[BarRecord]
+    texts: list[TextRecord]
+
+class Delta(msgspec.Struct, array_like = True, tag = 'd'):
+    types: list[TypeRecord] #appended to the type table before this frame's bars are read
+    bars: list[BarRecord] #added or changed
+    removed: list[str]
+    texts: Optional[list[TextRecord]] = None #replaces every text when present
+
+encoder = msgspec.msgpack.Encoder()
+decoder = msgspec.msgpack.Decoder(Union[Snapshot, Delta])
+
+class ProjectData:
+    """ What a project file holds once its frames are replayed, still as plain records """
+    def __init__(self):
+        self.types = [] #TypeRecord, indexed by BarRecord.bar_type
+        self.bars = {} #bar id -> BarRecord, in drawing order
+        self.texts = []
+        self.valid_end = len(MAGIC) #end of the last whole frame
+        self.snapshot_bytes = 0
+        self.delta_bytes = 0
+
+    def apply(self, frame, size):
+        if isinstance(frame, Snapshot):
+            self.types = list(frame.types)
+            self.bars = {bar.id: bar for bar in frame.bars}
+            self.texts = frame.texts
+            self.snapshot_bytes = size
+            self.delta_bytes = 0
+        else:
+            self.types.extend(frame.types)
+            for bar_id in frame.removed:
+                self.bars.pop(bar_id, None)
+            for bar in frame.bars:
+                self.bars[bar.id] = bar
+            if frame.texts is not None:
+                self.texts = frame.texts
+            self.delta_bytes += size
+
+def read_project(path):
+    """ Replays a project file into a ProjectData, reading it through a memory map """
+    data = ProjectData()
+    with open(path, 'rb') as f:
+        if os.fstat(f.fileno()).st_size < len(MAGIC):
+            raise ValueError(f"{path} is not a project file")
+        with mmap.mmap(f.fileno(), 0, access = mmap.ACCESS_READ) as mapped:
+            if mapped[:len(MAGIC)] != MAGIC:
+                raise ValueError(f"{path} is not a project file")
+            view = memoryview(mapped)
+            try:
+                position = len(MAGIC)
+                end = len(mapped)
+                while position + FRAME_HEADER.size <= end:
+                    (size,) = FRAME_HEADER.unpack_from(mapped, position)
+                    start = position + FRAME_HEADER.size
+                    if start + size > end:
+                        break #torn write, nothing after it was saved
+                    try:
+                        frame = decoder.decode(view[start:start + size])
+                    except msgspec.DecodeError:
+                        break
+                    data.apply(frame, FRAME_HEADER.size + size)
+                    position = start + size
+                    data.valid_end = position
+            finally:
+                view.release()
+    return data
+
+def frame_bytes(frame):
+    body = encoder.encode(frame)
+    return FRAME_HEADER.pack(len(body)) + body
+
+class ProjectWriter:
+    """ Saves one project file, remembering what changed since the last save """
+    def __init__(self, path, data = None):
+        self.path = path
+        self.type_indexes = {} #(name, cost_per_unit, thickness, stock_length) -> index in the file's table
+        self.new_types = []
+        self.changed = set() #bar ids added or changed since the last save
+        self.removed = set()
+        self.texts_changed = False
+        self.snapshot_bytes = 0
+        self.delta_bytes = 0
+        if data is not None:
+            #continuing a file that was just read, appends go after its last whole frame
+            self.type_indexes = {self.type_key(record): index for index, record in enumerate(data.types)}
+            self.snapshot_bytes = data.snapshot_bytes
+            self.delta_bytes = data.delta_bytes
+            if data.valid_end < os.path.getsize(path):
+                with open(path, 'r+b') as f:
+                    f.truncate(data.valid_end)
+
+    @staticmethod
+    def type_key(bar_type):
+        return (bar_type.name, bar_type.cost_per_unit, bar_type.thickness, bar_type.stock_length)
+
+    def type_index(self, bar_type):
+        """ Index of a bar type in the file's table, adding it to the next frame if it's new """
+        key = self.type_key(bar_type)
+        index = self.type_indexes.get(key)
+        if index is None:
+            index = self.type_indexes[key] = len(self.type_indexes)
+            self.new_types.append(TypeRecord(*key))
+        return index
+
+    def bar_changed(self, bar_id):
+        self.changed.add(bar_id)
+        self.removed.discard(bar_id)
+
+    def bar_removed(self, bar_id):
+        self.changed.discard(bar_id)
+        self.removed.add(bar_id)
+
+    @property
+    def dirty(self):
+        return bool(self.changed or self.removed or self.texts_changed)
+
+    @property
+    def needs_compaction(self):
+        """ True once the deltas outweigh the snapshot, a full save then reads back faster. Also
+        before the first snapshot, there's nothing to append to yet """
+        return not self.snapshot_bytes or self.delta_bytes > max(self.snapshot_bytes, 64 * 1024)
+
+    def save(self, bars, texts):
+        """ Writes the whole project, bars being a function of writer -> BarRecords """
+        self.type_indexes = {}
+        self.new_types = []
+        records = list(bars(self))
+        body = MAGIC + frame_bytes(Snapshot(types = self.new_types, bars = records, texts = texts))
+        temporary = self.path + '.tmp'
+        with open(temporary, 'wb') as f:
+            f.write(body)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(temporary, self.path)
+        self.new_types = []
+        self.changed.clear()
+        self.removed.clear()
+        self.texts_changed = False
+        self.snapshot_bytes = len(body)
+        self.delta_bytes = 0
+
+    def append(self, bar_record, texts = None):
+        """ Appends what changed since the last save, bar_record maps a bar id to its BarRecord """
+        if not self.dirty:
+            return 0
+        if not self.snapshot_bytes:
+            #a delta alone, without the header and snapshot, isn't a project file read_project can open
+            raise ValueError(f"{self.path} has no snapshot to append to, save() it first")
+        records = [bar_record(self, bar_id) for bar_id in self.changed]
+        frame = frame_bytes(Delta(types = self.new_types, bars = [record for record in records if record is not None],
+                                  removed = list(self.removed), texts = texts if self.texts_changed else None))
+        with open(self.path, 'ab') as f:
+            f.write(frame)
+            f.flush()
+            os.fsync(f.fileno())
+        self.new_types = []
+        self.changed.clear()
+        self.removed.clear()
+        self.texts_changed = False
+        self.delta_bytes += len(frame)
+        return len(frame)
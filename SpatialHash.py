@@ -0,0 +1,111 @@
+from math import floor, hypot
+from collections import Counter
+
+class SpatialHash:
+    """ Uniform grid of points, so a query only looks at the few cells around it """
+    def __init__(self, cell_size):
+        self.cell_size = cell_size
+        self.cells = {} #(column, row) -> {key: (x, y)}
+        self.points = {} #key -> (x, y)
+
+    def __len__(self):
+        return len(self.points)
+
+    def __contains__(self, key):
+        return key in self.points
+
+    def cell(self, x, y):
+        return (floor(x / self.cell_size), floor(y / self.cell_size))
+
+    def insert(self, key, x, y):
+        """ Adds a point, or moves it if the key is already there """
+        if key in self.points:
+            self.remove(key)
+        self.points[key] = (x, y)
+        self.cells.setdefault(self.cell(x, y), {})[key] = (x, y)
+
+    move = insert
+
+    def remove(self, key):
+        point = self.points.pop(key, None)
+        if point is None:
+            return
+        cell = self.cell(*point)
+        bucket = self.cells[cell]
+        del bucket[key]
+        if not bucket:
+            del self.cells[cell]
+
+    def clear(self):
+        self.cells.clear()
+        self.points.clear()
+
+    def near(self, x, y, radius):
+        """ Yields (key, x, y, distance) for every point within radius """
+        left, top = self.cell(x - radius, y - radius)
+        right, bottom = self.cell(x + radius, y + radius)
+        cells = self.cells
+        for column in range(left, right + 1):
+            for row in range(top, bottom + 1):
+                bucket = cells.get((column, row))
+                if bucket is None:
+                    continue
+                for key, (px, py) in bucket.items():
+                    distance = hypot(px - x, py - y)
+                    if distance <= radius:
+                        yield key, px, py, distance
+
+    def nearest(self, x, y, radius, exclude = ()):
+        """ (key, x, y, distance) of the closest point within radius whose key isn't excluded, or None """
+        best = None
+        for found in self.near(x, y, radius):
+            if found[0] not in exclude and (best is None or found[3] < best[3]):
+                best = found
+        return best
+
+    def clusters(self, tolerance):
+        """ Groups of keys whose points are chained together within tolerance, points with nothing that close are left out """
+        #a throwaway grid of cells twice the tolerance, anything close enough to a point is
+        #then in its own cell or the three next to it on the side of the cell the point is in
+        size = 2 * tolerance
+        fine = {}
+        for key, (x, y) in self.points.items():
+            fine.setdefault((floor(x / size), floor(y / size)), []).append(key)
+        parent = {}
+        def root(key):
+            while parent.get(key, key) != key:
+                parent[key] = parent.get(parent[key], parent[key])
+                key = parent[key]
+            return key
+        points = self.points
+        for (column, row), keys in fine.items():
+            for key in keys:
+                x, y = points[key]
+                across = column + (1 if x - column * size >= tolerance else -1)
+                down = row + (1 if y - row * size >= tolerance else -1)
+                for other_cell in ((column, row), (across, row), (column, down), (across, down)):
+                    for other in fine.get(other_cell, ()):
+                        if other != key:
+                            ox, oy = points[other]
+                            if hypot(ox - x, oy - y) <= tolerance:
+                                a, b = root(key), root(other)
+                                if a != b:
+                                    parent[a] = b
+                                    parent.setdefault(b, b)
+        groups = {}
+        for key in parent:
+            groups.setdefault(root(key), []).append(key)
+        return list(groups.values())
+
+def joint_degrees(endpoints, tolerance):
+    """ Counts joints by how many bars meet there, endpoints keyed by (bar id, end). Loose ends aren't joints """
+    degrees = Counter()
+    for cluster in endpoints.clusters(tolerance):
+        degrees[len({bar_id for bar_id, _ in cluster})] += 1
+    return degrees
+
+def estimate_fittings(degrees):
+    """ Rule of thumb: a casting wherever two or more bars meet, a post where three or more do """
+    castings = sum(count for degree, count in degrees.items() if degree >= 2)
+    posts = sum(count for degree, count in degrees.items() if degree >= 3)
+    return {'4X4 Casting': castings, '4X4 Post': posts}
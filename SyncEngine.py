@@ -0,0 +1,237 @@
+import time
+import random
+import threading
+from collections import OrderedDict
+
+SERVER_URL = "http://127.0.0.1:5000"
+
+class SyncEngine:
+    """ Write-behind sync of bar changes to the Flask server.
+
+    The GUI thread only records the latest operation for each bar id; a worker thread
+    drains them in batches to /bars/batch over one pooled session. Repeated updates to a
+    bar that hasn't been sent yet collapse into one, and failed batches are retried with
+    exponential backoff without ever blocking the caller. Nothing is thrown away: once the
+    queue is full only the ids of changed bars are kept, refill() builds their ops again as
+    the queue drains. Ops the server refuses are counted in dropped until resync() replaces
+    the server's bars with the caller's. requests is imported by the worker too, it's slow
+    to import and nothing else at startup needs it.
+    """
+    def __init__(self, server_url = SERVER_URL, max_pending = 50000, batch_size = 200,
+                 timeout = 5.0, max_backoff = 30.0):
+        self.server_url = server_url
+        self.max_pending = max_pending
+        self.batch_size = batch_size
+        self.timeout = timeout
+        self.max_backoff = max_backoff
+        self.pending = OrderedDict() #bar id -> (op, time first queued)
+        self.in_flight_since = None
+        self.condition = threading.Condition()
+        self.running = False
+        self.thread = None
+        self.overflow = set() #ids of bars changed while the queue was full, see refill()
+        self.rejected = set() #ids of bars whose ops the server refused, sent again by resync()
+        self.resync_bars = None #bar id -> bar the worker is to make the server's bars match
+        self.sent = 0
+        self.last_error = None
+        self.session = None #opened by the worker
+
+    def _open_session(self):
+        import requests
+        from requests.adapters import HTTPAdapter
+        session = requests.Session()
+        session.mount("http://", HTTPAdapter(pool_connections = 1, pool_maxsize = 2))
+        session.mount("https://", HTTPAdapter(pool_connections = 1, pool_maxsize = 2))
+        return session
+
+    def start(self):
+        if self.thread is None:
+            self.running = True
+            self.thread = threading.Thread(target = self._run, name = "SyncEngine", daemon = True)
+            self.thread.start()
+
+    def stop(self, timeout = 2.0):
+        """ Gives the worker up to timeout seconds to flush, then lets it go """
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.thread is not None:
+            self.thread.join(timeout)
+            self.thread = None
+        if self.session is not None:
+            self.session.close()
+
+    def upsert(self, bar_id, bar):
+        return self._submit(bar_id, {"op": "upsert", "id": bar_id, "bar": bar})
+
+    def delete(self, bar_id):
+        return self._submit(bar_id, {"op": "delete", "id": bar_id})
+
+    def _submit(self, bar_id, op):
+        with self.condition:
+            queued = self.pending.get(bar_id)
+            if queued is not None:
+                #only the newest state of a bar matters, keep its place and age in the queue
+                self.pending[bar_id] = (op, queued[1])
+            elif len(self.pending) >= self.max_pending:
+                #no room for the op, the bar's id is enough to build it again later
+                self.overflow.add(bar_id)
+                return False
+            else:
+                self.pending[bar_id] = (op, time.monotonic())
+                self.overflow.discard(bar_id)
+            #the newest op carries the whole bar, it replaces one the server refused
+            self.rejected.discard(bar_id)
+            self.condition.notify()
+        return True
+
+    def refill(self, lookup):
+        """ Queues the bars that changed while the queue was full, as many as there's room for.
+        lookup(bar_id) is the bar's current JSON, None once it's gone. Call it from the thread
+        that changes the bars, so none change between the lookup and the submit """
+        with self.condition:
+            room = min(self.max_pending - len(self.pending), len(self.overflow))
+            ids = [self.overflow.pop() for _ in range(max(room, 0))]
+        for bar_id in ids:
+            bar = lookup(bar_id)
+            if bar is None:
+                self.delete(bar_id)
+            else:
+                self.upsert(bar_id, bar)
+        return len(ids)
+
+    def resync(self, bars):
+        """ Makes the server's bars match bars (bar id -> bar JSON), e.g. after the server refused
+        some changes. Everything queued is replaced, the worker deletes the server's other bars """
+        with self.condition:
+            self.resync_bars = dict(bars)
+            self.pending.clear()
+            self.overflow.clear()
+            self.rejected.clear()
+            self.condition.notify()
+
+    @property
+    def depth(self):
+        return len(self.pending) + len(self.overflow)
+
+    @property
+    def dropped(self):
+        """ Bars whose last change the server refused, only a resync() sends them again """
+        return len(self.rejected)
+
+    @property
+    def lag(self):
+        """ Seconds the oldest unsent change has been waiting """
+        with self.condition:
+            oldest = [queued_at for queued_at in (self.in_flight_since,) if queued_at is not None]
+            if self.pending:
+                oldest.append(next(iter(self.pending.values()))[1])
+        return time.monotonic() - min(oldest) if oldest else 0.0
+
+    def _take_batch(self):
+        batch = []
+        while self.pending and len(batch) < self.batch_size:
+            bar_id, (op, queued_at) = self.pending.popitem(last = False)
+            batch.append((bar_id, op, queued_at))
+        self.in_flight_since = min(queued_at for _, _, queued_at in batch)
+        return batch
+
+    def _requeue(self, batch):
+        #newer changes queued while the batch was in flight win over the failed ones, and a
+        #resync asked for meanwhile sends every bar anyway
+        if self.resync_bars is not None:
+            return
+        for bar_id, op, queued_at in reversed(batch):
+            if bar_id not in self.pending and bar_id not in self.overflow:
+                self.pending[bar_id] = (op, queued_at)
+                self.pending.move_to_end(bar_id, last = False)
+
+    def _run(self):
+        if self.session is None:
+            self.session = self._open_session()
+        backoff = 0.0
+        while True:
+            with self.condition:
+                while self.running and not self.pending and self.resync_bars is None:
+                    self.condition.wait()
+                bars, self.resync_bars = self.resync_bars, None
+                if bars is None and not self.pending:
+                    return
+                batch = self._take_batch() if bars is None else []
+            if bars is not None:
+                retry = not self._queue_resync(bars)
+            else:
+                batch = self._send(batch)
+                retry = bool(batch)
+            with self.condition:
+                self.in_flight_since = None
+                if bars is not None and retry and self.resync_bars is None:
+                    self.resync_bars = bars
+                if retry:
+                    self._requeue(batch)
+                    backoff = min(self.max_backoff, backoff * 2 if backoff else 0.5)
+                    #stop() cuts the wait short, the loop then gives up once the queue is flushed or unreachable
+                    if self.running:
+                        self.condition.wait(backoff * random.uniform(0.5, 1.0))
+                    else:
+                        return
+                else:
+                    backoff = 0.0
+
+    def _queue_resync(self, bars):
+        """ Queues an upsert for each of bars and a delete for each other bar the server has,
+        returns False if the server's bars couldn't be fetched """
+        import requests
+        try:
+            response = self.session.get(f"{self.server_url}/bars", timeout = self.timeout)
+            response.raise_for_status()
+            server_ids = [bar['id'] for bar in response.json()['bars']]
+        except (requests.RequestException, ValueError, KeyError) as e:
+            self.last_error = str(e)
+            return False
+        now = time.monotonic()
+        with self.condition:
+            if self.resync_bars is not None:
+                #resync() was called again meanwhile, the newer bars are the ones to send
+                return True
+            #changes made since resync() are already queued and newer
+            for bar_id in server_ids:
+                if bar_id not in bars and bar_id not in self.pending:
+                    self.pending[bar_id] = ({"op": "delete", "id": bar_id}, now)
+            for bar_id, bar in bars.items():
+                if bar_id not in self.pending:
+                    self.pending[bar_id] = ({"op": "upsert", "id": bar_id, "bar": bar}, now)
+        self.last_error = None
+        return True
+
+    def _send(self, batch):
+        """ Posts one batch, returns the part of it that should be retried """
+        import requests
+        try:
+            response = self.session.post(f"{self.server_url}/bars/batch",
+                                         json = {"ops": [op for _, op, _ in batch]}, timeout = self.timeout)
+        except requests.RequestException as e:
+            self.last_error = str(e)
+            return batch
+        if response.status_code >= 500 or response.status_code in (408, 429):
+            self.last_error = f"HTTP {response.status_code}"
+            return batch
+        if response.status_code >= 400:
+            #a batch is all-or-nothing, so one bad op sinks the rest. Halves go on their own
+            #until only the ops the server won't take are left, sending those again won't help.
+            #They show in dropped rather than last_error, nothing is being retried
+            if len(batch) > 1:
+                middle = len(batch) // 2
+                return self._send(batch[:middle]) + self._send(batch[middle:])
+            bar_id = batch[0][0]
+            with self.condition:
+                #a newer op queued meanwhile carries the whole bar, it replaces the refused one
+                if self.resync_bars is None and bar_id not in self.pending and bar_id not in self.overflow:
+                    self.rejected.add(bar_id)
+            return []
+        with self.condition:
+            #the server has these bars as they are now, whatever it refused of them before
+            self.rejected.difference_update(bar_id for bar_id, _, _ in batch)
+        self.last_error = None
+        self.sent += len(batch)
+        return []
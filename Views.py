@@ -1,9 +1,119 @@
+""" Front, side and top views projected from the one drawing.
+
+The drawing is the plan, bars lie in its x/y, and each bar can also have an elevation
+(feet above the ground at its start) and a height (how far it rises to its end). Every
+view is a projection of those 3D bars, so nothing but the plan is ever drawn by hand.
+"""
+from PyQt6.QtWidgets import QGraphicsView, QGraphicsScene, QGraphicsLineItem
+from PyQt6.QtCore import QLineF, QTimer
+from PyQt6.QtGui import QPainter, QPen, QColor
+from DrawingSection import wheel_zoom
+
+PIXELS_PER_FOOT = 10 #scene units per foot, as in the drawing
+
 class Views:
-    def __init__(self, name):
+    def __init__(self, name, horizontal, vertical):
         self.name = name
+        #which of a bar's x, y and z go across and up the view
+        self.horizontal = horizontal
+        self.vertical = vertical
+
+    @property
+    def is_plan(self):
+        """ The top view is the drawing itself """
+        return (self.horizontal, self.vertical) == ('x', 'y')
+
+    def project(self, bar, line):
+        """ The line a bar makes in this view, from the bar and its line in the drawing """
+        z1 = bar.elevation * PIXELS_PER_FOOT
+        z2 = (bar.elevation + bar.height) * PIXELS_PER_FOOT
+        #scene y grows downwards, so up is -z
+        start = {'x': line.x1(), 'y': line.y1(), 'z': -z1}
+        end = {'x': line.x2(), 'y': line.y2(), 'z': -z2}
+        return QLineF(start[self.horizontal], start[self.vertical], end[self.horizontal], end[self.vertical])
 
 VIEW_TYPE = [
-    Views(name = "Front View"),
-    Views(name = "Side View"),
-    Views(name = "Top View")
-]
\ No newline at end of file
+    Views(name = "Front View", horizontal = 'x', vertical = 'z'),
+    Views(name = "Side View", horizontal = 'y', vertical = 'z'),
+    Views(name = "Top View", horizontal = 'x', vertical = 'y')
+]
+
+class ProjectionView(QGraphicsView):
+    """ One of VIEW_TYPE, drawn from a DrawingArea's bars.
+
+    Nothing is built until the view is first shown. After that it keeps one line item
+    per bar and the set of bars that changed while it was hidden, so showing it again
+    only redoes those bars.
+    """
+    def __init__(self, view_type, drawing_area):
+        super().__init__()
+        self.view_type = view_type
+        self.drawing_area = drawing_area
+        self.scene = QGraphicsScene(self)
+        self.setScene(self.scene)
+        self.setRenderHint(QPainter.RenderHint.Antialiasing)
+        self.items = {} #bar id -> QGraphicsLineItem
+        self.built = False
+        self.dirty = set() #ids of bars changed, added or removed since the view was last brought up to date
+        self.update_pending = False
+        drawing_area.bar_listeners.append(self.bar_changed)
+
+    def bar_changed(self, bar_id):
+        """ DrawingArea listener. Costs a set insert while the view is hidden, nothing before it's built """
+        if not self.built:
+            return
+        self.dirty.add(bar_id)
+        if self.isVisible() and not self.update_pending:
+            #one pass once control is back in the event loop, however many bars changed before then
+            self.update_pending = True
+            QTimer.singleShot(0, self.update_items)
+
+    def showEvent(self, event):
+        super().showEvent(event)
+        self.update_items()
+
+    def wheelEvent(self, event):
+        wheel_zoom(self, event)
+
+    def update_items(self):
+        self.update_pending = False
+        if not self.built:
+            self.build()
+            return
+        drawn_bars = self.drawing_area.drawn_bars
+        for bar_id in self.dirty:
+            bar_data = drawn_bars.get(bar_id)
+            item = self.items.get(bar_id)
+            if bar_data is None:
+                if item is not None:
+                    self.scene.removeItem(self.items.pop(bar_id))
+            elif item is None:
+                self.add_item(bar_data)
+            else:
+                item.setLine(self.view_type.project(bar_data['bar'], bar_data['item'].line()))
+        self.dirty.clear()
+
+    def build(self):
+        for bar_data in self.drawing_area.drawn_bars.values():
+            self.add_item(bar_data)
+        self.built = True
+        self.dirty.clear()
+        bounds = self.scene.itemsBoundingRect()
+        if not bounds.isNull():
+            self.centerOn(bounds.center())
+
+    def add_item(self, bar_data):
+        item = QGraphicsLineItem(self.view_type.project(bar_data['bar'], bar_data['item'].line()))
+        pen = QPen(bar_data['item'].pen())
+        pen.setColor(QColor(bar_data['original_color'])) #not the selection highlight
+        item.setPen(pen)
+        self.scene.addItem(item)
+        self.items[bar_data['id']] = item
+
+    def clear(self):
+        """ Forgets every bar. A hidden view is built from scratch the next time it's shown,
+        one on screen stays built and picks up the new drawing's bars as they're added """
+        self.scene.clear()
+        self.items = {}
+        self.dirty.clear()
+        self.built = self.isVisible()
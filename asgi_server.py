@@ -0,0 +1,351 @@
+""" ASGI version of server.py for heavier loads.
+
+Serves the same routes on litestar with msgspec doing the JSON work:
+
+    python -m uvicorn asgi_server:app --port 5000 --timeout-graceful-shutdown 5
+
+--workers N runs N processes over the same data directory, see bar_log for how they share
+it. Each project under /projects/<id>/ has its own state, see project_store.
+
+Change feed clients never finish on their own, the graceful shutdown timeout is what lets
+the server stop while viewers are connected. They reconnect and resume where they were.
+"""
+import asyncio
+from pathlib import Path
+from typing import Optional, Union
+import anyio
+import msgspec
+from msgspec import UNSET, UnsetType
+from litestar import Litestar, Request, Response, get, post
+from litestar.response import Stream
+from bar_state import BatchError
+from bar_log import open_state
+from project_store import ProjectStore, ProjectError
+
+class LegacyBar(msgspec.Struct):
+    """ Body of /add_bar, as sent by the web page """
+    type: str
+    length: float
+    position: str
+
+class Bar(msgspec.Struct):
+    """ A bar as the desktop app sends it, see DrawingSection.bar_to_json. bar_state.BAR_FIELDS
+    is the same schema for server.py, keep them in step """
+    bar_type: str
+    length: float
+    start_x: float
+    start_y: float
+    end_x: float
+    end_y: float
+    color: str = "#ffffffff"
+    elevation: float = 0.0
+    height: float = 0.0
+
+class BarChanges(msgspec.Struct):
+    """ The fields an update op sets, the others are left as they are """
+    bar_type: Union[str, UnsetType] = UNSET
+    length: Union[float, UnsetType] = UNSET
+    start_x: Union[float, UnsetType] = UNSET
+    start_y: Union[float, UnsetType] = UNSET
+    end_x: Union[float, UnsetType] = UNSET
+    end_y: Union[float, UnsetType] = UNSET
+    color: Union[str, UnsetType] = UNSET
+    elevation: Union[float, UnsetType] = UNSET
+    height: Union[float, UnsetType] = UNSET
+
+#batch ops, told apart by their "op" field
+class AddOp(msgspec.Struct, tag_field = "op", tag = "add", omit_defaults = True):
+    bar: Bar
+    id: Optional[str] = None
+
+class UpsertOp(msgspec.Struct, tag_field = "op", tag = "upsert"):
+    id: str
+    bar: Bar
+
+class UpdateOp(msgspec.Struct, tag_field = "op", tag = "update"):
+    id: str
+    bar: BarChanges
+
+class DeleteOp(msgspec.Struct, tag_field = "op", tag = "delete"):
+    id: str
+
+class Batch(msgspec.Struct):
+    ops: list[Union[AddOp, UpsertOp, UpdateOp, DeleteOp]]
+
+state = open_state()
+projects = ProjectStore()
+encoder = msgspec.json.Encoder()
+legacy_bar_decoder = msgspec.json.Decoder(LegacyBar)
+batch_decoder = msgspec.json.Decoder(Batch)
+full_state_cache = (None, None)
+HEARTBEAT = 15.0 #seconds between keep-alive comments on an idle change feed
+FEED_POLL = 0.5 #seconds between looks for changes made by other worker processes
+INDEX_HTML = Path(__file__).with_name("templates").joinpath("index.html")
+
+def json_response(content, status_code = 200, headers = None):
+    return Response(encoder.encode(content), status_code = status_code, media_type = "application/json", headers = headers)
+
+def error_response(message):
+    return json_response({"error": message}, status_code = 400)
+
+def conditional(request, body, state = state):
+    """ Same ETag handling as server.conditional """
+    etag = f'"{state.etag()}"'
+    if etag in request.headers.get("if-none-match", ""):
+        return Response(b"", status_code = 304, headers = {"ETag": etag})
+    return Response(body, media_type = "application/json", headers = {"ETag": etag})
+
+class ChangeFeed:
+    """ Wakes the /bars/stream clients when the state changes.
+
+    A client is a coroutine waiting on an asyncio.Event, so idle viewers cost no thread.
+    Writes happen on worker threads, the state's listener hands the wake-up to the event
+    loop. Writes made by other worker processes are picked up by one poller per feed.
+    Clients that are caught up ask for the same delta, it's encoded once per revision
+    and shared. Reading the state takes its lock and may read the log, that's done on a
+    worker thread, the event loop only hands out events that are already encoded.
+    """
+    def __init__(self, state):
+        self.state = state
+        self.loop = None
+        self.changed = None #set, then replaced, on every change
+        #(revision, since -> encoded event bringing a client from since to that revision),
+        #replaced as a whole so the event loop can read it without the lock
+        self.messages = (None, {})
+        self.poller = None
+        self.clients = 0 #only counted for project feeds, see project_events
+
+    def start(self):
+        self.loop = asyncio.get_running_loop()
+        self.changed = asyncio.Event()
+        self.state.listeners.append(self.notify)
+        self.poller = asyncio.create_task(self.poll())
+
+    def stop(self):
+        self.state.listeners.remove(self.notify)
+        self.poller.cancel()
+
+    async def poll(self):
+        while True:
+            await asyncio.sleep(FEED_POLL)
+            #calls notify when there's something new
+            await anyio.to_thread.run_sync(self.state.refresh)
+
+    def notify(self, rev):
+        self.loop.call_soon_threadsafe(self.wake)
+
+    def wake(self):
+        changed, self.changed = self.changed, asyncio.Event()
+        changed.set()
+
+    def message(self, since):
+        """ (revision, SSE event) with the changes after since, called on a worker thread """
+        with self.state.lock:
+            rev, messages = self.messages
+            if rev != self.state.rev:
+                rev, messages = self.messages = (self.state.rev, {})
+            message = messages.get(since)
+            if message is None:
+                changes = encoder.encode(self.state.changes_since(since))
+                message = messages[since] = b"id: %d\nevent: bars\ndata: %s\n\n" % (rev, changes)
+            return rev, message
+
+    async def events(self, since):
+        while True:
+            #taken before looking at the revision, a change after this point sets it
+            changed = self.changed
+            if since is None or since != self.state.rev:
+                since = -1 if since is None else since
+                #an event another client already had encoded is handed out as it is
+                rev, messages = self.messages
+                message = messages.get(since)
+                if message is None:
+                    rev, message = await anyio.to_thread.run_sync(self.message, since)
+                since = rev
+                yield message
+                continue
+            try:
+                await asyncio.wait_for(changed.wait(), HEARTBEAT)
+            except asyncio.TimeoutError:
+                yield b": keep-alive\n\n"
+
+feeds = {None: ChangeFeed(state)} #project id -> feed, None for the default state. Project feeds go with their last client
+IDLE_CHECK = 60.0 #seconds between looks for idle projects to close
+
+async def close_idle_projects():
+    while True:
+        await asyncio.sleep(IDLE_CHECK)
+        await anyio.to_thread.run_sync(projects.close_idle)
+
+idle_closer = None
+
+def start_feeds():
+    global idle_closer
+    feeds[None].start()
+    idle_closer = asyncio.create_task(close_idle_projects())
+
+def stop_feeds():
+    idle_closer.cancel()
+    for feed in feeds.values():
+        feed.stop()
+
+def not_found():
+    return json_response({"error": "no such project"}, status_code = 404)
+
+async def in_project(project_id, handle, create = False):
+    """ Runs handle(state) on a worker thread with the project held open, 404 if there's no such project.
+    Opening a project reads its log and handle takes the state's lock, neither belongs on the event loop """
+    def run():
+        try:
+            project = projects.acquire(project_id, create)
+        except ProjectError:
+            return not_found()
+        try:
+            return handle(project)
+        finally:
+            projects.release(project_id)
+    return await anyio.to_thread.run_sync(run)
+
+async def project_events(project_id, since):
+    """ A project's change feed for one client, holding the project open while it's connected """
+    try:
+        project = await anyio.to_thread.run_sync(projects.acquire, project_id)
+    except ProjectError:
+        return #gone between the request's check and the first event
+    try:
+        feed = feeds.get(project_id)
+        if feed is None:
+            feed = feeds[project_id] = ChangeFeed(project)
+            feed.start()
+        feed.clients += 1
+        try:
+            async for message in feed.events(since):
+                yield message
+        finally:
+            feed.clients -= 1
+            if not feed.clients:
+                feed.stop()
+                del feeds[project_id]
+    finally:
+        projects.release(project_id)
+
+@get("/", media_type = "text/html")
+async def home() -> str:
+    return INDEX_HTML.read_text()
+
+@post("/add_bar")
+async def add_bar(request: Request) -> Response:
+    try:
+        bar = legacy_bar_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        return error_response(str(e))
+    #writes wait for the log's fsync, keep that off the event loop
+    rev, bar_id = await anyio.to_thread.run_sync(state.add_bar, msgspec.structs.asdict(bar))
+    return json_response({"message": "Bar added successfully", "id": bar_id, "rev": rev})
+
+@get("/get_bars")
+async def get_bars(request: Request) -> Response:
+    return await anyio.to_thread.run_sync(full_state, request)
+
+def full_state(request):
+    global full_state_cache
+    with state.lock:
+        state.refresh()
+        rev, body = full_state_cache
+        if rev != state.rev:
+            rev, bars = state.all_bars()
+            body = encoder.encode(bars)
+            full_state_cache = (rev, body)
+        return conditional(request, body)
+
+def bar_changes(request, state, since):
+    with state.lock:
+        if since is None:
+            rev, bars = state.all_bars()
+            return conditional(request, encoder.encode({"rev": rev, "reset": True, "bars": bars, "deleted": []}), state)
+        return conditional(request, encoder.encode(state.changes_since(since)), state)
+
+def bar_stream(request, events, since):
+    """ Server-sent events from events(since), one per revision a client hasn't seen. Reconnecting clients resume from Last-Event-ID """
+    last_event_id = request.headers.get("last-event-id", "")
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    return Stream(events(since), media_type = "text/event-stream", headers = {"Cache-Control": "no-cache"})
+
+async def decode_batch(request):
+    """ The batch's ops as BarState takes them, or an error response. Bars that don't match Bar are rejected here """
+    try:
+        batch = batch_decoder.decode(await request.body())
+    except msgspec.DecodeError as e:
+        return error_response(str(e))
+    #plain dicts with the op tag back in and the fields an update leaves alone dropped
+    return msgspec.to_builtins(batch.ops)
+
+def apply_batch(state, ops):
+    #writes wait for the log's fsync, called on a worker thread
+    try:
+        rev, ids = state.apply_batch(ops)
+    except BatchError as e:
+        return error_response(str(e))
+    return json_response({"rev": rev, "ids": ids})
+
+def clear(state):
+    rev = state.clear()
+    return json_response({"message": "All bars cleared", "rev": rev})
+
+@get("/bars")
+async def get_bar_changes(request: Request, since: Optional[int] = None) -> Response:
+    #the state's lock, and a refresh from the log, are for a worker thread
+    return await anyio.to_thread.run_sync(bar_changes, request, state, since)
+
+@get("/bars/stream")
+async def get_bar_stream(request: Request, since: Optional[int] = None) -> Stream:
+    return bar_stream(request, feeds[None].events, since)
+
+@post("/bars/batch")
+async def post_bars_batch(request: Request) -> Response:
+    ops = await decode_batch(request)
+    if isinstance(ops, Response):
+        return ops
+    return await anyio.to_thread.run_sync(apply_batch, state, ops)
+
+@post("/clear_bars")
+async def clear_bars() -> Response:
+    return await anyio.to_thread.run_sync(clear, state)
+
+#the same routes scoped to one project, each project's bars kept apart from the others'
+@get("/projects")
+async def list_projects() -> Response:
+    #listing the data directory is disk work, kept off the event loop
+    return json_response({"projects": await anyio.to_thread.run_sync(projects.ids)})
+
+@get("/projects/{project_id:str}/bars")
+async def get_project_bars(request: Request, project_id: str, since: Optional[int] = None) -> Response:
+    return await in_project(project_id, lambda project: bar_changes(request, project, since))
+
+@get("/projects/{project_id:str}/bars/stream")
+async def get_project_bar_stream(request: Request, project_id: str, since: Optional[int] = None) -> Response:
+    #only checks the project is there, the stream holds it open itself for as long as the client stays
+    missing = await in_project(project_id, lambda project: None)
+    if missing is not None:
+        return missing
+    return bar_stream(request, lambda since: project_events(project_id, since), since)
+
+@post("/projects/{project_id:str}/bars/batch")
+async def post_project_bars_batch(request: Request, project_id: str) -> Response:
+    ops = await decode_batch(request)
+    if isinstance(ops, Response):
+        return ops
+    return await in_project(project_id, lambda project: apply_batch(project, ops), create = True)
+
+@post("/projects/{project_id:str}/bars/clear")
+async def clear_project_bars(project_id: str) -> Response:
+    return await in_project(project_id, clear)
+
+app = Litestar(route_handlers = [home, add_bar, get_bars, get_bar_changes, get_bar_stream, post_bars_batch, clear_bars,
+                                 list_projects, get_project_bars, get_project_bar_stream, post_project_bars_batch, clear_project_bars],
+               on_startup = [start_feeds], on_shutdown = [stop_feeds])
+
+if __name__ == "__main__":
+    import uvicorn
+    uvicorn.run(app, host = "127.0.0.1", port = 5000, log_level = "warning", timeout_graceful_shutdown = 5)
@@ -0,0 +1,317 @@
+""" Durable storage for BarState: an append-only change log plus periodic snapshots.
+
+The data directory holds snapshot-<rev>.json, the full state as of that revision, and
+log-<rev>.jsonl segments with one JSON record per committed change after <rev>. Writers
+append to the current segment and wait for a shared fsync (group commit). Every
+snapshot_every records the segment is rotated and a snapshot is written in the
+background, after which older segments and snapshots are deleted. Startup loads the
+newest snapshot and replays only the segments written since, so it costs the size of
+the state plus at most snapshot_every records, however long the history.
+
+Several processes can share one directory, e.g. the workers of a multi-process server.
+Writers take an exclusive flock on the directory's lock file, replay whatever the others
+appended to the current segment since they last looked, then append their own record,
+so revisions stay one sequence. Readers check the segment's size and replay new records
+the same way. A rotated segment ends with a record naming the next one.
+"""
+import os
+import json
+import time
+import threading
+import weakref
+from contextlib import contextmanager
+from bar_state import BarState
+try:
+    import fcntl
+except ImportError:
+    fcntl = None #no flock, only one process may use a directory
+
+DATA_DIR = os.environ.get('POOLSCREEN_DATA_DIR', os.path.join(os.path.dirname(os.path.abspath(__file__)), 'server_data'))
+
+def _rev_of(name):
+    return int(name.split('-', 1)[1].split('.', 1)[0])
+
+def _fsync_directory(directory):
+    if hasattr(os, 'O_DIRECTORY'):
+        fd = os.open(directory, os.O_RDONLY | os.O_DIRECTORY)
+        try:
+            os.fsync(fd)
+        finally:
+            os.close(fd)
+
+class BarLog:
+    """ The journal of one BarState. Its lock file is only taken with the state's lock held,
+    a flock is shared by the threads of a process and the state lock is what keeps them apart """
+    def __init__(self, directory, state, snapshot_every = 10000, group_window = 0.002):
+        self.directory = directory
+        self.state = state
+        self.snapshot_every = snapshot_every
+        self.group_window = group_window
+        self.condition = threading.Condition()
+        self.file_lock = threading.Lock() #held while fsyncing, so rotation can't close the file under it
+        self.written = 0
+        self.synced = 0
+        self.segment_records = 0 #records in the current segment, whichever process wrote them
+        self.snapshotting = False
+        self.running = True
+        self.file = None #appends to the current segment
+        self.tail = None #reads the current segment, from tail_offset on is what this process hasn't replayed
+        self.tail_offset = 0
+        self.lock_file = None
+        self.flusher = None
+        self.snapshotter = None
+
+    def open(self):
+        """ Rebuilds the state from disk and starts logging to the newest segment """
+        os.makedirs(self.directory, exist_ok = True)
+        self.lock_file = open(os.path.join(self.directory, 'lock'), 'ab')
+        with self.state.lock, self._flock(exclusive = True):
+            self._load_epoch()
+            self._load()
+            self.file = open(self.tail.name, 'ab', buffering = 0)
+        self._start_flusher()
+        if hasattr(os, 'register_at_fork'):
+            #hooks can't be unregistered, a weak reference lets a closed log go
+            log = weakref.ref(self)
+            os.register_at_fork(after_in_child = lambda: log() is not None and log()._after_fork())
+        return self
+
+    def _start_flusher(self):
+        self.flusher = threading.Thread(target = self._flush_loop, name = "BarLog", daemon = True)
+        self.flusher.start()
+
+    def _after_fork(self):
+        """ A server forking workers after opening the log (werkzeug's processes, gunicorn --preload) leaves each
+        child without the flusher thread and sharing the parent's flock, which then wouldn't keep them apart """
+        if not self.running:
+            return
+        self.condition = threading.Condition()
+        self.file_lock = threading.Lock()
+        self.lock_file = open(self.lock_file.name, 'ab')
+        self.snapshotting = False
+        self.snapshotter = None
+        self._start_flusher()
+
+    @contextmanager
+    def _flock(self, exclusive):
+        if fcntl is None:
+            yield
+            return
+        fcntl.flock(self.lock_file, fcntl.LOCK_EX if exclusive else fcntl.LOCK_SH)
+        try:
+            yield
+        finally:
+            fcntl.flock(self.lock_file, fcntl.LOCK_UN)
+
+    def _load_epoch(self):
+        """ One ETag epoch per directory, so every process serving it tags the same revision alike """
+        path = os.path.join(self.directory, 'epoch')
+        try:
+            with open(path) as f:
+                self.state.epoch = f.read().strip() or self.state.epoch
+        except FileNotFoundError:
+            with open(path, 'w') as f:
+                f.write(self.state.epoch)
+
+    def _load(self, exclusive = True):
+        """ Newest snapshot plus every segment, leaving the tail at the end of the last one """
+        snapshots = sorted((name for name in os.listdir(self.directory) if name.startswith('snapshot-') and name.endswith('.json')), key = _rev_of)
+        for name in reversed(snapshots):
+            try:
+                with open(os.path.join(self.directory, name), 'rb') as f:
+                    snapshot = json.load(f)
+            except (OSError, ValueError):
+                continue #a snapshot that was cut off, the older one and the log still cover it
+            self.state.restore(snapshot['rev'], snapshot['bars'])
+            break
+        segments = self._segments()
+        if not segments:
+            open(self._segment_path(self.state.rev), 'ab').close()
+            segments = self._segments()
+        #logs from before segments were chained, or whose next segment was never written, are read one by one
+        for name in segments:
+            self._open_tail(os.path.join(self.directory, name))
+            self._read_tail(exclusive, follow = False)
+
+    def _segments(self):
+        return sorted((name for name in os.listdir(self.directory) if name.startswith('log-') and name.endswith('.jsonl')), key = _rev_of)
+
+    def _segment_path(self, rev):
+        return os.path.join(self.directory, f"log-{rev:012d}.jsonl")
+
+    def _open_tail(self, path):
+        tail = open(path, 'r+b', buffering = 0)
+        if self.tail is not None:
+            self.tail.close()
+        self.tail = tail
+        self.tail_offset = 0
+        self.segment_records = 0
+
+    def _read_tail(self, exclusive, follow = True):
+        """ Replays the records appended to the tail since it was last read, following rotations """
+        while True:
+            end = os.fstat(self.tail.fileno()).st_size
+            data = self._read_at(self.tail_offset, max(0, end - self.tail_offset))
+            next_segment = None
+            for line in data.splitlines(keepends = True):
+                if not line.endswith(b'\n'):
+                    break #still being written, or torn by a crash
+                try:
+                    record = json.loads(line)
+                except ValueError:
+                    break #torn write from a crash, nothing after it was acknowledged
+                self.tail_offset += len(line)
+                if 'next' in record:
+                    next_segment = record['next']
+                    break
+                self.segment_records += 1
+                if record['rev'] > self.state.rev:
+                    self.state.replay(record)
+            if next_segment is None or not follow:
+                #writers append whole lines under the exclusive lock, so with it held anything after the last
+                #line is a crash's torn write, drop it so the next append can't glue onto it
+                if exclusive and next_segment is None and self.tail_offset < end:
+                    self.tail.truncate(self.tail_offset)
+                return
+            try:
+                self._open_tail(os.path.join(self.directory, next_segment))
+            except FileNotFoundError:
+                #this process fell so far behind that a snapshot already replaced that segment
+                self._load(exclusive)
+            self._switch_file(self.tail.name)
+
+    def _switch_file(self, path):
+        """ Appends to the segment at path from now on, after syncing what went to the old one """
+        if self.file is None or self.file.name == path:
+            return
+        with self.file_lock:
+            with self.condition:
+                old_file = self.file
+                os.fsync(old_file.fileno())
+                self.synced = self.written
+                self.file = open(path, 'ab', buffering = 0)
+                self.condition.notify_all()
+        old_file.close()
+
+    def _read_at(self, offset, size):
+        #positioned reads where there are any, a forked process shares the tail's file position with its parent
+        if hasattr(os, 'pread'):
+            return os.pread(self.tail.fileno(), size, offset)
+        self.tail.seek(offset)
+        return self.tail.read(size)
+
+    def refresh(self):
+        """ Replays what other processes logged, costs an fstat when there's nothing new """
+        if os.fstat(self.tail.fileno()).st_size == self.tail_offset:
+            return
+        with self.state.lock, self._flock(exclusive = False):
+            self._read_tail(exclusive = False)
+
+    @contextmanager
+    def exclusive(self):
+        """ Up to date and the only writer until the block ends, see BarState.apply_batch """
+        with self._flock(exclusive = True):
+            self._read_tail(exclusive = True)
+            yield
+
+    def append(self, record):
+        """ Logs one record, called inside exclusive() with the state lock held so records stay in revision order """
+        line = json.dumps(record, separators = (',', ':')).encode() + b'\n'
+        with self.condition:
+            self.file.write(line)
+            self.tail_offset += len(line) #the tail was at the end, this process has seen its own record
+            self.written += 1
+            ticket = self.written
+            self.segment_records += 1
+            self.condition.notify_all()
+        if self.segment_records >= self.snapshot_every and not self.snapshotting:
+            self._start_snapshot()
+        return ticket
+
+    def wait(self, ticket):
+        """ Blocks until the record with this ticket is on disk """
+        with self.condition:
+            while self.synced < ticket and self.running:
+                self.condition.wait()
+
+    def _flush_loop(self):
+        while True:
+            with self.condition:
+                while self.running and self.synced >= self.written:
+                    self.condition.wait()
+                if not self.running and self.synced >= self.written:
+                    return
+            #let writers that arrive in the next moment share this fsync
+            time.sleep(self.group_window)
+            self._sync()
+
+    def _sync(self):
+        with self.file_lock:
+            with self.condition:
+                target = self.written
+                self.file.flush()
+            os.fsync(self.file.fileno())
+        with self.condition:
+            self.synced = max(self.synced, target)
+            self.condition.notify_all()
+
+    def _start_snapshot(self):
+        """ Rotates to a new segment and writes the snapshot for the old ones in the background.
+        Called inside exclusive(), the other processes follow the rotation on their next read """
+        if self.segment_records == 0:
+            return #nothing since the last rotation, its snapshot covers everything
+        rev = self.state.rev
+        #bar dicts are replaced, never changed in place, so a shallow copy is a consistent view
+        bars = list(self.state.bars.values())
+        path = self._segment_path(rev)
+        open(path, 'ab').close()
+        #the old segment's last record points at the new one
+        self.file.write(json.dumps({'rev': rev, 'next': os.path.basename(path)}, separators = (',', ':')).encode() + b'\n')
+        self.snapshotting = True
+        self._open_tail(path)
+        self._switch_file(path)
+        self.snapshotter = threading.Thread(target = self._write_snapshot, args = (rev, bars), name = "BarLog snapshot", daemon = True)
+        self.snapshotter.start()
+
+    def _write_snapshot(self, rev, bars):
+        try:
+            path = os.path.join(self.directory, f"snapshot-{rev:012d}.json")
+            with open(path + '.tmp', 'w') as f:
+                json.dump({'rev': rev, 'bars': bars}, f, separators = (',', ':'))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(path + '.tmp', path)
+            _fsync_directory(self.directory)
+            #everything up to rev is in the snapshot now
+            for name in os.listdir(self.directory):
+                if (name.startswith('log-') and name.endswith('.jsonl')) or (name.startswith('snapshot-') and name.endswith('.json')):
+                    if _rev_of(name) < rev:
+                        os.remove(os.path.join(self.directory, name))
+        finally:
+            self.snapshotting = False
+
+    def snapshot(self):
+        """ Forces a snapshot now, e.g. before a planned shutdown """
+        with self.state.lock, self.exclusive():
+            if not self.snapshotting:
+                self._start_snapshot()
+
+    def close(self):
+        with self.condition:
+            self.running = False
+            self.condition.notify_all()
+        if self.flusher is not None:
+            self.flusher.join()
+        if self.snapshotter is not None:
+            self.snapshotter.join()
+        self._sync()
+        self.file.close()
+        self.tail.close()
+        self.lock_file.close()
+
+def open_state(directory = DATA_DIR, **options):
+    """ BarState restored from directory, with every later change logged there """
+    state = BarState()
+    log = BarLog(directory, state, **options).open()
+    state.journal = log
+    return state
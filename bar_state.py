@@ -0,0 +1,225 @@
+import time
+import uuid
+import threading
+from bisect import bisect_right
+from contextlib import nullcontext
+
+class BatchError(ValueError):
+    """ Raised when a batch can't be applied, nothing in the batch is applied """
+
+#a bar as the desktop app sends it, see DrawingSection.bar_to_json. asgi_server.Bar is the
+#same schema, keep the two in step so both servers take and refuse the same batches
+NUMBER = (int, float) #exact types, JSON has one number type and a bool isn't one
+TEXT = (str,)
+BAR_FIELDS = {'bar_type': TEXT, 'length': NUMBER, 'start_x': NUMBER, 'start_y': NUMBER,
+              'end_x': NUMBER, 'end_y': NUMBER, 'color': TEXT, 'elevation': NUMBER, 'height': NUMBER}
+BAR_DEFAULTS = {'color': "#ffffffff", 'elevation': 0.0, 'height': 0.0}
+
+def check_bar(index, bar, partial = False):
+    """ Raises BatchError for a bar that's missing a field or has one of the wrong type. With
+    partial, as for an update, only the fields it has are checked """
+    for name, kinds in BAR_FIELDS.items():
+        value = bar.get(name)
+        if value is None:
+            if name in bar or not (partial or name in BAR_DEFAULTS):
+                raise BatchError(f"op {index} bar needs {name}")
+        elif type(value) not in kinds:
+            raise BatchError(f"op {index} bar {name} must be a {'number' if kinds is NUMBER else 'string'}")
+
+def check_ops(ops):
+    """ check_bar for every op's bar, ops that aren't well formed are left to apply_batch """
+    for index, op in enumerate(ops):
+        if isinstance(op, dict) and isinstance(op.get('bar'), dict) and op.get('op') != 'delete':
+            check_bar(index, op['bar'], partial = op.get('op') == 'update')
+
+class BarState:
+    """ Server-side bars with a revision counter and a change log for delta queries """
+    def __init__(self, max_changes = 100000, journal = None):
+        self.bars = {} #bar id -> bar dict, insertion ordered
+        self.rev = 0
+        #(revision, bar id) of every change, oldest first, so delta queries can bisect
+        self.change_revs = []
+        self.change_ids = []
+        self.first_rev = 0 #deltas from before this revision are gone, those clients get the full state
+        self.max_changes = max_changes
+        self.epoch = uuid.uuid4().hex[:8] #keeps ETags from one server run matching another's
+        self.lock = threading.RLock()
+        self.changed = threading.Condition(self.lock) #notified after every change, see wait_for_change
+        #gets every committed change as a record, see bar_log.BarLog
+        self.journal = journal
+        #called with the new revision after every change, from the changing thread with the lock held, so keep them quick
+        self.listeners = []
+
+    def etag(self):
+        return f"{self.epoch}-{self.rev}"
+
+    def refresh(self):
+        """ Picks up changes other processes sharing the journal made """
+        if self.journal is not None:
+            self.journal.refresh()
+
+    def _exclusive(self):
+        return self.journal.exclusive() if self.journal is not None else nullcontext()
+
+    def all_bars(self):
+        with self.lock:
+            self.refresh()
+            return self.rev, list(self.bars.values())
+
+    def wait_for_change(self, since, timeout, poll = 0.5):
+        """ Blocks until the revision moves past since or timeout runs out, returns whether it moved.
+        Changes from other processes only show up on a refresh, so those are looked for every poll seconds """
+        deadline = time.monotonic() + timeout
+        with self.lock:
+            self.refresh()
+            while self.rev == since:
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    return False
+                self.changed.wait(min(poll, remaining))
+                self.refresh()
+            return True
+
+    def apply_batch(self, ops, check = True):
+        """ Applies add/update/upsert/delete ops all-or-nothing, returns (revision, affected ids).
+        Their bars are checked against BAR_FIELDS unless check is False """
+        if not isinstance(ops, list):
+            raise BatchError("ops must be a list")
+        if check:
+            check_ops(ops) #before the lock, writers don't wait on it
+        ticket = None
+        with self.lock, self._exclusive():
+            staged = {} #bar id -> new bar dict, or None when deleted
+            ids = []
+            for index, op in enumerate(ops):
+                bar_id = self._stage(index, op, staged, check)
+                ids.append(bar_id)
+            if staged:
+                ticket = self._commit(staged)
+            rev = self.rev
+        #wait for the write to be durable outside the lock, so other writers can share the fsync
+        if ticket is not None:
+            self.journal.wait(ticket)
+        return rev, ids
+
+    def _stage(self, index, op, staged, check):
+        if not isinstance(op, dict):
+            raise BatchError(f"op {index} is not an object")
+        kind = op.get('op')
+        bar_id = op.get('id')
+        if bar_id is not None and not isinstance(bar_id, str):
+            raise BatchError(f"op {index} has a non-string id")
+        if kind == 'delete':
+            if bar_id is None:
+                raise BatchError(f"op {index} needs an id")
+            staged[bar_id] = None
+            return bar_id
+        bar = op.get('bar')
+        if not isinstance(bar, dict):
+            raise BatchError(f"op {index} needs a bar object")
+        if kind == 'add':
+            bar_id = bar_id or uuid.uuid4().hex
+        elif kind == 'upsert':
+            if bar_id is None:
+                raise BatchError(f"op {index} needs an id")
+        elif kind == 'update':
+            current = staged[bar_id] if bar_id in staged else self.bars.get(bar_id)
+            if current is None:
+                raise BatchError(f"op {index} updates unknown bar {bar_id}")
+            bar = {**current, **bar}
+        else:
+            raise BatchError(f"op {index} has unknown op {kind!r}")
+        if check and kind != 'update':
+            bar = {**BAR_DEFAULTS, **bar}
+        staged[bar_id] = {**bar, 'id': bar_id}
+        return bar_id
+
+    def _commit(self, staged):
+        self._apply(self.rev + 1, staged)
+        if self.journal is not None:
+            return self.journal.append({
+                'rev': self.rev,
+                'set': {bar_id: bar for bar_id, bar in staged.items() if bar is not None},
+                'del': [bar_id for bar_id, bar in staged.items() if bar is None],
+            })
+        return None
+
+    def _apply(self, rev, staged):
+        self.rev = rev
+        for bar_id, bar in staged.items():
+            if bar is None:
+                self.bars.pop(bar_id, None)
+            else:
+                self.bars[bar_id] = bar
+            self.change_revs.append(self.rev)
+            self.change_ids.append(bar_id)
+        if len(self.change_revs) > self.max_changes:
+            #drop the older half, clients behind that point fall back to a full reload
+            cut = len(self.change_revs) // 2
+            self.first_rev = self.change_revs[cut - 1]
+            del self.change_revs[:cut]
+            del self.change_ids[:cut]
+        self._changed()
+
+    def add_bar(self, bar):
+        """ A bar from the web page's /add_bar, which has its own fields, checked by the route """
+        rev, ids = self.apply_batch([{'op': 'add', 'id': bar.get('id'), 'bar': bar}], check = False)
+        return rev, ids[0]
+
+    def clear(self):
+        ticket = None
+        with self.lock, self._exclusive():
+            self._clear(self.rev + 1)
+            if self.journal is not None:
+                ticket = self.journal.append({'rev': self.rev, 'clear': True})
+            rev = self.rev
+        if ticket is not None:
+            self.journal.wait(ticket)
+        return rev
+
+    def _clear(self, rev):
+        self.bars.clear()
+        self.rev = rev
+        self.change_revs.clear()
+        self.change_ids.clear()
+        self.first_rev = rev
+        self._changed()
+
+    def _changed(self):
+        self.changed.notify_all()
+        for listener in self.listeners:
+            listener(self.rev)
+
+    def replay(self, record):
+        """ Re-applies a journal record, without journaling it again """
+        with self.lock:
+            if record.get('clear'):
+                self._clear(record['rev'])
+            else:
+                staged = dict(record['set'])
+                staged.update(dict.fromkeys(record['del']))
+                self._apply(record['rev'], staged)
+
+    def restore(self, rev, bars):
+        """ Loads a snapshot, deltas from before it aren't available """
+        with self.lock:
+            self._clear(rev)
+            self.bars.update((bar['id'], bar) for bar in bars)
+
+    def changes_since(self, since):
+        """ Bars changed and ids deleted after revision since, or the full state if that's too old """
+        with self.lock:
+            self.refresh()
+            if since < self.first_rev or since > self.rev:
+                return {'rev': self.rev, 'reset': True, 'bars': list(self.bars.values()), 'deleted': []}
+            start = bisect_right(self.change_revs, since)
+            changed = dict.fromkeys(self.change_ids[start:])
+            bars = []
+            deleted = []
+            for bar_id in changed:
+                bar = self.bars.get(bar_id)
+                if bar is None:
+                    deleted.append(bar_id)
+                else:
+                    bars.append(bar)
+            return {'rev': self.rev, 'reset': False, 'bars': bars, 'deleted': deleted}
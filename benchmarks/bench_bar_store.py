@@ -0,0 +1,114 @@
+""" Compares PoolProject's Bar objects with the columnar BarStore, alone and backing a PoolProject.
+
+    python benchmarks/bench_bar_store.py [sizes...]
+"""
+import sys
+import time
+import tracemalloc
+from synthetic import copy_bar_types, random_bars
+from Bar import Bar, PoolProject
+from BarStore import BarStore
+try:
+    from PyQt6.QtCore import QPointF
+except ImportError: #still gives a useful lower bound without Qt
+    QPointF = None
+
+DEFAULT_SIZES = [10_000, 100_000, 1_000_000]
+
+def point(x, y):
+    return QPointF(x, y) if QPointF else (x, y)
+
+def build_objects(rows):
+    project = PoolProject()
+    drawn_bars = {}
+    for index, (bar_type, length, x1, y1, x2, y2) in enumerate(rows):
+        bar = Bar(bar_type = bar_type, length = length)
+        project.add_bar(bar)
+        #same shape as MainWindow.add_drawn_bar, minus the graphics items
+        drawn_bars[index] = {'item': None, 'bar': bar, 'start_point': point(x1, y1),
+                             'end_point': point(x2, y2), 'original_color': 0xFFFFFFFF, 'id': index}
+    return project, drawn_bars
+
+def build_backed(rows, bar_types):
+    """ PoolProject over a BarStore, with running totals and listeners like the plain one """
+    project = PoolProject(store = BarStore(bar_types))
+    bars = []
+    for bar_type, length, x1, y1, x2, y2 in rows:
+        bar = project.new_bar(bar_type, length)
+        project.add_bar(bar)
+        bars.append(bar)
+    return project, bars
+
+def build_store(rows, bar_types):
+    store = BarStore(bar_types)
+    for bar_type, length, x1, y1, x2, y2 in rows:
+        store.append(bar_type, length, x1, y1, x2, y2)
+    return store
+
+def timed(function):
+    start = time.perf_counter()
+    result = function()
+    return time.perf_counter() - start, result
+
+def measure_build(build):
+    tracemalloc.start()
+    seconds, result = timed(build)
+    memory = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return seconds, memory, result
+
+def reprice_objects(project, bar_types):
+    for bar_type in bar_types:
+        bar_type.cost_per_unit *= 1.05
+    project.reprice(bar_types)
+    return project.total_cost
+
+def run(size):
+    bar_types = copy_bar_types()
+    rows = list(random_bars(size, bar_types))
+    results = {}
+
+    build_seconds, memory, (project, drawn_bars) = measure_build(lambda: build_objects(rows))
+    results['objects'] = {
+        'build_s': build_seconds,
+        'memory_mb': memory / 1e6,
+        'total_s': timed(lambda: project.recalculate_totals()[0])[0],
+        'per_type_s': timed(project.recalculate_totals)[0],
+        'reprice_s': timed(lambda: reprice_objects(project, bar_types))[0],
+    }
+    del project, drawn_bars
+
+    bar_types = copy_bar_types()
+    rows = list(random_bars(size, bar_types))
+    build_seconds, memory, (project, bars) = measure_build(lambda: build_backed(rows, bar_types))
+    results['backed'] = {
+        'build_s': build_seconds,
+        'memory_mb': memory / 1e6,
+        'total_s': timed(project.store.calculate_total_cost)[0],
+        'per_type_s': timed(lambda: project.store.type_totals)[0],
+        'reprice_s': timed(lambda: reprice_objects(project, bar_types))[0],
+    }
+    del project, bars
+
+    bar_types = copy_bar_types()
+    rows = list(random_bars(size, bar_types))
+    build_seconds, memory, store = measure_build(lambda: build_store(rows, bar_types))
+    results['columnar'] = {
+        'build_s': build_seconds,
+        'memory_mb': memory / 1e6,
+        'total_s': timed(store.calculate_total_cost)[0],
+        'per_type_s': timed(lambda: store.type_totals)[0],
+        'reprice_s': timed(lambda: store.reprice({bar_type: bar_type.cost_per_unit * 1.05 for bar_type in bar_types}))[0],
+    }
+    return results
+
+def main(argv):
+    sizes = [int(arg) for arg in argv] or DEFAULT_SIZES
+    print(f"{'bars':>9} {'layout':>9} {'build s':>9} {'MB':>9} {'total ms':>9} {'types ms':>9} {'reprice ms':>11}")
+    for size in sizes:
+        for layout, result in run(size).items():
+            print(f"{size:>9} {layout:>9} {result['build_s']:>9.3f} {result['memory_mb']:>9.1f} "
+                  f"{result['total_s'] * 1000:>9.2f} {result['per_type_s'] * 1000:>9.2f} {result['reprice_s'] * 1000:>11.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
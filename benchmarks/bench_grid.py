@@ -0,0 +1,56 @@
+""" Frame time of DrawingArea's grid, before and after caching, on Qt's offscreen platform.
+
+    python benchmarks/bench_grid.py [frames]
+"""
+import os
+import sys
+import time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+from PyQt6.QtWidgets import QApplication
+from PyQt6.QtCore import Qt
+from PyQt6.QtGui import QPen
+from DrawingSection import DrawingArea
+
+VIEWPORTS = {'typical': (1280, 800), '4K': (3840, 2160)}
+
+def legacy_draw_background(self, painter, rect):
+    """ drawBackground as it was before the grid was cached """
+    if self.grid_enabled:
+        pen = QPen(Qt.GlobalColor.lightGray, 0, Qt.PenStyle.DotLine)
+        painter.setPen(pen)
+        left = int(rect.left()) - (int(rect.left()) % 20)
+        top = int(rect.top()) - (int(rect.top()) % 20)
+        for x in range(left, int(rect.right()), 20):
+            painter.drawLine(x, int(rect.top()), x, int(rect.bottom()))
+        for y in range(top, int(rect.bottom()), 20):
+            painter.drawLine(int(rect.left()), y, int(rect.right()), y)
+
+def frame_time(view, frames):
+    """ Average ms for a full repaint of the viewport, panning a little each frame like a drag does """
+    view.viewport().grab() #warm up, builds the grid cache
+    start = time.perf_counter()
+    for frame in range(frames):
+        view.horizontalScrollBar().setValue(frame % 40)
+        view.viewport().grab()
+    return (time.perf_counter() - start) / frames * 1000
+
+def main(argv):
+    frames = int(argv[0]) if argv else 30
+    app = QApplication(sys.argv)
+    print(f"{'viewport':>9} {'legacy ms':>10} {'cached ms':>10}")
+    for name, (width, height) in VIEWPORTS.items():
+        results = []
+        for draw_background in (legacy_draw_background, DrawingArea.drawBackground):
+            view = DrawingArea(None)
+            view.drawBackground = draw_background.__get__(view)
+            view.resize(width, height)
+            view.scene.setSceneRect(0, 0, width * 2, height * 2)
+            view.show()
+            app.processEvents()
+            results.append(frame_time(view, frames))
+            view.close()
+        print(f"{name:>9} {results[0]:>10.2f} {results[1]:>10.2f}")
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,63 @@
+""" Time-to-interactive for loading a drawing, bar by bar versus MainWindow.add_bars.
+
+    python benchmarks/bench_load.py [sizes...]
+
+Each run gets a fresh process with a MainWindow on Qt's offscreen platform. The clock
+stops once the bars are in, the window has painted and a hit test has answered, i.e.
+once a click would work.
+"""
+import os
+import sys
+import time
+import subprocess
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from synthetic import random_bars
+
+DEFAULT_SIZES = [1_000, 10_000, 50_000]
+METHODS = ['per_bar', 'bulk']
+
+def server_json(count):
+    """ count bars as /get_bars returns them """
+    return [{'id': f"bar{index}", 'bar_type': bar_type.name, 'length': length, 'start_x': x1, 'start_y': y1,
+             'end_x': x2, 'end_y': y2, 'color': '#ffffffff'}
+            for index, (bar_type, length, x1, y1, x2, y2) in enumerate(random_bars(count))]
+
+def run_one(method, count):
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QPointF
+    import DrawingApp
+    DrawingApp.SERVER_URL = "http://127.0.0.1:9" #nothing listens there, so startup loads no bars
+    app = QApplication([])
+    window = DrawingApp.MainWindow()
+    window.show()
+    app.processEvents()
+    bars = server_json(count)
+
+    start = time.perf_counter()
+    if method == 'per_bar':
+        #what load_bars_from_server did before add_bars
+        for bar_id, bar_type, length, start_point, end_point, color, elevation, height in DrawingApp.server_bars(bars):
+            item = window.drawing_area.new_bar_item(start_point, end_point, bar_type, color)
+            window.add_drawn_bar(length * 10, start_point, end_point, bar_type, color, item, bar_id)
+    else:
+        window.add_bars(DrawingApp.server_bars(bars))
+    loaded = time.perf_counter()
+    window.drawing_area.viewport().repaint()
+    app.processEvents()
+    window.drawing_area.scene.itemAt(QPointF(100, 100), window.drawing_area.transform())
+    interactive = time.perf_counter()
+    print(f"{method:>8} {count:>7} bars: loaded {loaded - start:7.3f}s, interactive {interactive - start:7.3f}s", flush = True)
+    window.sync.stop()
+    #tearing down tens of thousands of items says nothing about loading, skip it
+    os._exit(0)
+
+def main():
+    if len(sys.argv) == 4 and sys.argv[1] == '--one':
+        run_one(sys.argv[2], int(sys.argv[3]))
+    sizes = [int(arg) for arg in sys.argv[1:]] or DEFAULT_SIZES
+    for count in sizes:
+        for method in METHODS:
+            subprocess.run([sys.executable, os.path.abspath(__file__), '--one', method, str(count)], check = True)
+
+if __name__ == '__main__':
+    main()
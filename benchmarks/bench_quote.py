@@ -0,0 +1,37 @@
+""" Projects per second of quote.py as the worker count grows.
+
+    python benchmarks/bench_quote.py [projects] [bars per project]
+"""
+import os
+import sys
+import json
+import time
+import tempfile
+from synthetic import random_bars
+import quote
+
+def write_projects(directory, projects, bars_per_project):
+    for index in range(projects):
+        bars = [{'bar_type': bar_type.name, 'length': length, 'start_x': x1, 'start_y': y1, 'end_x': x2, 'end_y': y2}
+                for bar_type, length, x1, y1, x2, y2 in random_bars(bars_per_project, seed = index)]
+        with open(os.path.join(directory, f"project-{index:05d}.json"), 'w') as f:
+            json.dump(bars, f)
+
+def main():
+    projects = int(sys.argv[1]) if len(sys.argv) > 1 else 2000
+    bars_per_project = int(sys.argv[2]) if len(sys.argv) > 2 else 200
+    with tempfile.TemporaryDirectory() as directory:
+        write_projects(directory, projects, bars_per_project)
+        workers = 1
+        while True:
+            with open(os.devnull, 'w') as out:
+                start = time.perf_counter()
+                quote.run([directory], out, 'csv', workers)
+                elapsed = time.perf_counter() - start
+            print(f"{workers:>3} workers: {projects / elapsed:10.1f} projects/sec")
+            if workers >= max(2, os.cpu_count() or 1): #always measure the pool at least once
+                break
+            workers = min(workers * 2, max(2, os.cpu_count() or 1))
+
+if __name__ == '__main__':
+    main()
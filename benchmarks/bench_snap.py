@@ -0,0 +1,52 @@
+""" Endpoint snapping and joint counting on a large drawing.
+
+    python benchmarks/bench_snap.py [bar count]
+
+Times building the endpoint hash, a nearest-end query like the one run on every mouse
+move while drawing or dragging, moving a bar's ends, and the joint count the inventory
+tab shows. A query has to come in well under a 16 ms frame.
+"""
+import sys
+import time
+import random
+from synthetic import random_bars
+from SpatialHash import SpatialHash, joint_degrees, estimate_fittings
+from DrawingSection import GRID_SPACING, SNAP_PIXELS, JOINT_TOLERANCE
+
+QUERIES = 10_000
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 50_000
+    bars = list(random_bars(count))
+    rng = random.Random(1)
+    xs = [x for _, _, x1, _, x2, _ in bars for x in (x1, x2)]
+    ys = [y for _, _, _, y1, _, y2 in bars for y in (y1, y2)]
+    left, right, top, bottom = min(xs), max(xs), min(ys), max(ys)
+
+    start = time.perf_counter()
+    endpoints = SpatialHash(GRID_SPACING)
+    for index, (_, _, x1, y1, x2, y2) in enumerate(bars):
+        endpoints.insert((index, 0), x1, y1)
+        endpoints.insert((index, 1), x2, y2)
+    print(f"build {count} bars: {time.perf_counter() - start:.3f}s")
+
+    points = [(rng.uniform(left, right), rng.uniform(top, bottom)) for _ in range(QUERIES)]
+    for zoom in (1.0, 0.25):
+        start = time.perf_counter()
+        hits = sum(endpoints.nearest(x, y, SNAP_PIXELS / zoom) is not None for x, y in points)
+        per_query = (time.perf_counter() - start) / QUERIES
+        print(f"nearest at zoom {zoom:g}: {per_query * 1e6:.1f} us/query ({hits} of {QUERIES} snapped)")
+
+    start = time.perf_counter()
+    for index in range(QUERIES):
+        bar = rng.randrange(count)
+        endpoints.move((bar, 0), rng.uniform(left, right), rng.uniform(top, bottom))
+    print(f"move: {(time.perf_counter() - start) / QUERIES * 1e6:.1f} us/end")
+
+    start = time.perf_counter()
+    degrees = joint_degrees(endpoints, JOINT_TOLERANCE)
+    elapsed = time.perf_counter() - start
+    print(f"joints: {elapsed:.3f}s, by degree {dict(sorted(degrees.items()))}, {estimate_fittings(degrees)}")
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,71 @@
+""" Repaint and pan cost of a large drawing at different zoom levels.
+
+    python benchmarks/bench_view.py [bar count]
+
+Loads the bars into a MainWindow on Qt's offscreen platform, reports how much the
+process grew holding them, then times a full repaint and a 30 pixel pan step at each zoom.
+"""
+import os
+import sys
+import time
+os.environ.setdefault('QT_QPA_PLATFORM', 'offscreen')
+from synthetic import random_bars
+
+ZOOMS = [1.0, 0.6, 0.3]
+PAGE_SIZE = os.sysconf('SC_PAGE_SIZE')
+REPEATS = 5
+PAN_STEPS = 10
+
+def rss():
+    """ Resident size of this process in bytes, Linux only """
+    with open('/proc/self/statm') as statm:
+        return int(statm.read().split()[1]) * PAGE_SIZE
+
+def main():
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 20_000
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QPointF
+    from PyQt6.QtGui import QColor
+    import DrawingApp
+    DrawingApp.SERVER_URL = "http://127.0.0.1:9" #nothing listens there, so startup loads no bars
+    app = QApplication([])
+    window = DrawingApp.MainWindow()
+    window.resize(1200, 900)
+    window.show()
+    app.processEvents()
+    white = QColor('white')
+    bars = list(random_bars(count, extent = 3000.0))
+    before = rss()
+    window.add_bars((f"bar{index}", bar_type, length, QPointF(x1, y1), QPointF(x2, y2), white, 0.0, 0.0)
+                    for index, (bar_type, length, x1, y1, x2, y2) in enumerate(bars))
+    area = window.drawing_area
+    area.show_drawing()
+    app.processEvents()
+    grown = rss() - before
+    print(f"{count} bars: process grew {grown / 2**20:.1f} MiB, {grown / count:.0f} bytes per bar", flush = True)
+    viewport = area.viewport()
+    scroll = area.horizontalScrollBar()
+    for zoom in ZOOMS:
+        area.resetTransform()
+        area.scale(zoom, zoom)
+        area.show_drawing()
+        app.processEvents()
+        viewport.repaint() #first paint at a zoom also rebuilds the grid tile and lays out text
+        start = time.perf_counter()
+        for _ in range(REPEATS):
+            viewport.repaint()
+        frame = (time.perf_counter() - start) / REPEATS
+        area.show_drawing()
+        app.processEvents()
+        start = time.perf_counter()
+        for _ in range(PAN_STEPS):
+            scroll.setValue(scroll.value() + 30)
+            app.processEvents()
+        pan = (time.perf_counter() - start) / PAN_STEPS
+        print(f"zoom {zoom:4.2f}: full repaint {frame * 1000:6.1f} ms, pan step {pan * 1000:5.1f} ms", flush = True)
+    window.sync.stop()
+    #tearing down tens of thousands of items says nothing about painting, skip it
+    os._exit(0)
+
+if __name__ == '__main__':
+    main()
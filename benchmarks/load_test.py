@@ -0,0 +1,221 @@
+""" Load test for the Flask and ASGI servers.
+
+Starts the chosen server on a free local port (or uses --url), seeds it with bars and
+hammers one route from many concurrent connections, then reports requests/sec and
+latency percentiles:
+
+    python benchmarks/load_test.py --server flask --scenario get_bars
+    python benchmarks/load_test.py --server asgi --scenario add_bar --concurrency 64
+
+The feed scenario instead holds --concurrency idle /bars/stream viewers open while one
+writer makes a change every --interval seconds, and reports how long each change took to
+reach every viewer and how many threads the server needed for them:
+
+    python benchmarks/load_test.py --server asgi --scenario feed --concurrency 500
+"""
+import os
+import sys
+import time
+import socket
+import asyncio
+import argparse
+import subprocess
+from concurrent.futures import ProcessPoolExecutor
+import httpx
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SERVERS = {
+    #threaded dev server without the debugger/reloader, the fairest Flask setup that needs no extra packages
+    #several workers are forked processes, each single-threaded for Flask
+    'flask': "import server; server.app.run(host='127.0.0.1', port={port}, threaded={workers} == 1, processes={workers})",
+    'asgi': "import uvicorn; uvicorn.run('asgi_server:app', host='127.0.0.1', port={port}, workers={workers}, log_level='warning', timeout_graceful_shutdown=5)",
+}
+DESKTOP_BAR = {"bar_type": "2X4", "length": 8.0, "start_x": 10.0, "start_y": 20.0, "end_x": 90.0, "end_y": 20.0, "color": "#ffffffff"}
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+def start_server(kind, port, workers = 1, data_dir = None):
+    env = dict(os.environ)
+    if data_dir is not None:
+        env['POOLSCREEN_DATA_DIR'] = data_dir
+    process = subprocess.Popen([sys.executable, "-c", SERVERS[kind].format(port = port, workers = workers)], cwd = ROOT, env = env,
+                               stdout = subprocess.DEVNULL, stderr = subprocess.DEVNULL)
+    deadline = time.monotonic() + 30
+    while time.monotonic() < deadline:
+        try:
+            with socket.create_connection(('127.0.0.1', port), timeout = 0.2):
+                return process
+        except OSError:
+            time.sleep(0.1)
+    process.kill()
+    raise RuntimeError(f"{kind} server did not start")
+
+def make_request(scenario, worker, count):
+    if scenario == 'add_bar':
+        return 'POST', '/add_bar', {"type": "2X4", "length": 10, "position": "100,200"}
+    if scenario == 'batch':
+        ops = [{"op": "upsert", "id": f"w{worker}-{count}-{index}", "bar": DESKTOP_BAR} for index in range(20)]
+        return 'POST', '/bars/batch', {"ops": ops}
+    if scenario == 'delta':
+        return 'GET', '/bars?since=0', None
+    return 'GET', '/get_bars', None
+
+async def worker(client, scenario, worker_id, stop_at, latencies, errors):
+    count = 0
+    while time.perf_counter() < stop_at:
+        method, path, body = make_request(scenario, worker_id, count)
+        start = time.perf_counter()
+        try:
+            response = await client.request(method, path, json = body)
+            if response.status_code >= 400:
+                errors.append(response.status_code)
+        except httpx.HTTPError as e:
+            errors.append(type(e).__name__)
+        latencies.append(time.perf_counter() - start)
+        count += 1
+
+async def viewer(client, ready, received):
+    """ Follows the change feed, noting when each revision arrived """
+    async with client.stream('GET', '/bars/stream') as response:
+        async for line in response.aiter_lines():
+            if line.startswith('id: '):
+                rev = int(line[4:])
+                if not ready.done():
+                    ready.set_result(rev)
+                received.setdefault(rev, time.perf_counter())
+
+async def run_feed(url, viewers, duration, interval, process = None):
+    """ Latency from each write to its arrival at each viewer, the writes made and, for a
+    local server, its thread count with every viewer connected """
+    limits = httpx.Limits(max_connections = viewers + 1)
+    timeout = httpx.Timeout(30, read = None) #idle viewers can go a heartbeat without a byte
+    async with httpx.AsyncClient(base_url = url, limits = limits, timeout = timeout) as client:
+        loop = asyncio.get_running_loop()
+        readies = [loop.create_future() for _ in range(viewers)]
+        receiveds = [{} for _ in range(viewers)]
+        tasks = [asyncio.create_task(viewer(client, ready, received)) for ready, received in zip(readies, receiveds)]
+        await asyncio.gather(*readies)
+        threads = server_threads(process) if process is not None else None
+        sent = {} #rev -> when its write was sent
+        stop_at = time.perf_counter() + duration
+        count = 0
+        while time.perf_counter() < stop_at:
+            start = time.perf_counter()
+            response = await client.post('/bars/batch', json = {"ops": [{"op": "upsert", "id": f"feed-{count}", "bar": DESKTOP_BAR}]})
+            sent[response.json()['rev']] = start
+            count += 1
+            await asyncio.sleep(interval)
+        await asyncio.sleep(1.0) #let the last writes arrive
+        for task in tasks:
+            task.cancel()
+        await asyncio.gather(*tasks, return_exceptions = True)
+    latencies = []
+    missed = 0
+    for received in receiveds:
+        for rev, start in sent.items():
+            #a viewer that fell behind gets several revisions in one event, under the newest of them
+            arrived = next((at for got, at in sorted(received.items()) if got >= rev), None)
+            if arrived is None:
+                missed += 1
+            else:
+                latencies.append(arrived - start)
+    return latencies, missed, len(sent), threads
+
+def server_threads(process):
+    if not os.path.exists(f"/proc/{process.pid}/status"):
+        return None
+    with open(f"/proc/{process.pid}/status") as f:
+        for line in f:
+            if line.startswith('Threads:'):
+                return int(line.split()[1])
+    return None
+
+def seed(url, seed_bars):
+    with httpx.Client(base_url = url, timeout = 30) as client:
+        client.post('/clear_bars')
+        for start in range(0, seed_bars, 500):
+            ops = [{"op": "upsert", "id": f"seed-{index}", "bar": DESKTOP_BAR} for index in range(start, min(seed_bars, start + 500))]
+            client.post('/bars/batch', json = {"ops": ops})
+
+async def run(url, scenario, first_worker, concurrency, duration):
+    limits = httpx.Limits(max_connections = concurrency, max_keepalive_connections = concurrency)
+    async with httpx.AsyncClient(base_url = url, limits = limits, timeout = 30) as client:
+        latencies = []
+        errors = []
+        stop_at = time.perf_counter() + duration
+        await asyncio.gather(*(worker(client, scenario, first_worker + index, stop_at, latencies, errors) for index in range(concurrency)))
+    return latencies, errors
+
+def run_process(url, scenario, first_worker, concurrency, duration):
+    return asyncio.run(run(url, scenario, first_worker, concurrency, duration))
+
+def load(url, scenario, concurrency, duration, processes):
+    """ Splits the connections over several client processes, one Python client can't saturate a server """
+    per_process = max(1, concurrency // processes)
+    latencies = []
+    errors = []
+    began = time.perf_counter()
+    with ProcessPoolExecutor(processes) as pool:
+        futures = [pool.submit(run_process, url, scenario, index * per_process, per_process, duration) for index in range(processes)]
+        for future in futures:
+            process_latencies, process_errors = future.result()
+            latencies.extend(process_latencies)
+            errors.extend(process_errors)
+    #the pool's startup isn't load, time only the measured window
+    elapsed = min(time.perf_counter() - began, duration)
+    return latencies, errors, elapsed
+
+def percentile(values, fraction):
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+def report_feed(args, url, process):
+    latencies, missed, writes, threads = asyncio.run(run_feed(url, args.concurrency, args.duration, args.interval, process))
+    threads = f", {threads} server threads" if threads is not None else ""
+    if not latencies:
+        print("no changes arrived")
+        return
+    print(f"{args.url or args.server} feed: {writes} writes to {args.concurrency} viewers{threads}, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+          f"{missed} missed")
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices = sorted(SERVERS), default = 'asgi')
+    parser.add_argument('--url', help = "test an already running server instead of starting one")
+    parser.add_argument('--scenario', choices = ['get_bars', 'delta', 'add_bar', 'batch', 'feed'], default = 'get_bars')
+    parser.add_argument('--concurrency', type = int, default = 32)
+    parser.add_argument('--duration', type = float, default = 10.0)
+    parser.add_argument('--seed-bars', type = int, default = 1000)
+    parser.add_argument('--interval', type = float, default = 0.2, help = "seconds between writes in the feed scenario")
+    parser.add_argument('--processes', type = int, default = max(1, min(4, (os.cpu_count() or 2) // 2)),
+                        help = "client processes generating the load")
+    args = parser.parse_args()
+
+    process = None
+    url = args.url
+    if url is None:
+        port = free_port()
+        process = start_server(args.server, port)
+        url = f"http://127.0.0.1:{port}"
+    try:
+        seed(url, args.seed_bars)
+        if args.scenario == 'feed':
+            return report_feed(args, url, process)
+        latencies, errors, elapsed = load(url, args.scenario, args.concurrency, args.duration, args.processes)
+    finally:
+        if process is not None:
+            process.terminate()
+            process.wait()
+    if not latencies:
+        print("no requests completed")
+        return
+    print(f"{args.url or args.server} {args.scenario}: {len(latencies)} requests in {elapsed:.1f}s, "
+          f"{len(latencies) / elapsed:.0f} req/s, p50 {percentile(latencies, 0.50) * 1000:.1f} ms, "
+          f"p99 {percentile(latencies, 0.99) * 1000:.1f} ms, {len(errors)} errors")
+
+if __name__ == "__main__":
+    main()
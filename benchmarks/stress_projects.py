@@ -0,0 +1,164 @@
+""" Concurrency stress test for the per-project server state.
+
+Starts the server once per --workers count, every run on a fresh data directory shared
+by all of that run's worker processes. --concurrency clients then write batches to
+--projects projects for --duration seconds, mixed with delta reads. After the load
+each project is checked:
+
+  - every acknowledged batch got its own revision, none repeated or skipped
+  - every bar the acknowledged batches left is there, and nothing else, read back over
+    fresh connections so that each worker answers some of the reads
+  - the log on disk replays to that same state
+
+then throughput is reported per worker count:
+
+    python benchmarks/stress_projects.py --server asgi --workers 1 2 4
+"""
+import os
+import sys
+import time
+import asyncio
+import argparse
+import tempfile
+import httpx
+from load_test import ROOT, DESKTOP_BAR, free_port, start_server, percentile
+sys.path.insert(0, ROOT)
+from bar_log import open_state
+
+BATCH = 5 #upserts per batch
+READ_EVERY = 4 #every nth request of a client is a delta read
+
+class Client:
+    """ One writer, the only one to touch its own bar ids so it knows which of them must exist """
+    def __init__(self, index, projects):
+        self.index = index
+        self.projects = projects
+        self.expected = {project: set() for project in projects}
+        self.acks = [] #(project, revision) per acknowledged batch
+        self.latencies = []
+        self.errors = []
+
+    def next_batch(self, count):
+        project = self.projects[count % len(self.projects)]
+        ops = [{"op": "upsert", "id": f"c{self.index}-{count}-{k}", "bar": DESKTOP_BAR} for k in range(BATCH)]
+        mine = self.expected[project]
+        if count % 3 == 0 and mine:
+            ops.append({"op": "delete", "id": next(iter(mine))})
+        return project, ops
+
+    async def run(self, client, stop_at):
+        count = 0
+        while time.perf_counter() < stop_at:
+            count += 1
+            if count % READ_EVERY == 0:
+                project = self.projects[count % len(self.projects)]
+                request = client.get(f'/projects/{project}/bars', params = {'since': max(0, count - 10)})
+                ops = None
+            else:
+                project, ops = self.next_batch(count)
+                request = client.post(f'/projects/{project}/bars/batch', json = {"ops": ops})
+            start = time.perf_counter()
+            try:
+                response = await request
+            except httpx.HTTPError as e:
+                self.errors.append(type(e).__name__)
+                continue
+            self.latencies.append(time.perf_counter() - start)
+            if response.status_code == 404 and ops is None:
+                pass #read a project nobody has written to yet
+            elif response.status_code != 200:
+                self.errors.append(response.status_code)
+            elif ops is not None:
+                self.acks.append((project, response.json()['rev']))
+                for op in ops:
+                    if op['op'] == 'delete':
+                        self.expected[project].discard(op['id'])
+                    else:
+                        self.expected[project].add(op['id'])
+
+async def load(url, projects, concurrency, duration):
+    limits = httpx.Limits(max_connections = concurrency)
+    async with httpx.AsyncClient(base_url = url, limits = limits, timeout = 60) as client:
+        clients = [Client(index, projects) for index in range(concurrency)]
+        began = time.perf_counter()
+        await asyncio.gather(*(c.run(client, began + duration) for c in clients))
+        elapsed = time.perf_counter() - began
+    return clients, elapsed
+
+def read_back(url, project, times):
+    """ (revision, bar ids) as each of several fresh connections saw the project """
+    views = set()
+    for _ in range(times):
+        with httpx.Client(base_url = url, timeout = 30) as client:
+            response = client.get(f'/projects/{project}/bars')
+        if response.status_code == 404:
+            views.add((0, frozenset())) #never written to, so never created
+            continue
+        body = response.json()
+        views.add((body['rev'], frozenset(bar['id'] for bar in body['bars'])))
+    return views
+
+def check(url, data_dir, projects, clients, reads):
+    """ Problems found, an empty list when every project is consistent """
+    problems = []
+    for project in projects:
+        revs = sorted(rev for c in clients for p, rev in c.acks if p == project)
+        expected = set().union(*(c.expected[project] for c in clients))
+        if revs != list(range(1, len(revs) + 1)):
+            problems.append(f"{project}: {len(revs)} batches acknowledged with {len(set(revs))} distinct revisions up to {max(revs, default = 0)}")
+        views = read_back(url, project, reads)
+        if len(views) != 1:
+            problems.append(f"{project}: workers disagree, {len(views)} different states read back")
+        for rev, ids in views:
+            if rev != len(revs) or ids != expected:
+                problems.append(f"{project}: read back rev {rev} with {len(ids)} bars, expected rev {len(revs)} with {len(expected)}")
+    return problems
+
+def check_disk(data_dir, projects, clients):
+    problems = []
+    for project in projects:
+        expected = set().union(*(c.expected[project] for c in clients))
+        state = open_state(os.path.join(data_dir, 'projects', project))
+        rev, bars = state.all_bars()
+        state.journal.close()
+        if {bar['id'] for bar in bars} != expected:
+            problems.append(f"{project}: log replays to {len(bars)} bars at rev {rev}, expected {len(expected)}")
+    return problems
+
+def run(kind, workers, args):
+    projects = [f"stress-{index}" for index in range(args.projects)]
+    with tempfile.TemporaryDirectory() as data_dir:
+        port = free_port()
+        process = start_server(kind, port, workers = workers, data_dir = data_dir)
+        url = f"http://127.0.0.1:{port}"
+        try:
+            clients, elapsed = asyncio.run(load(url, projects, args.concurrency, args.duration))
+            problems = check(url, data_dir, projects, clients, args.reads)
+        finally:
+            process.terminate()
+            process.wait()
+        problems += check_disk(data_dir, projects, clients)
+    latencies = [latency for c in clients for latency in c.latencies]
+    batches = sum(len(c.acks) for c in clients)
+    errors = [error for c in clients for error in c.errors]
+    print(f"{kind} x{workers}: {batches / elapsed:.0f} batches/s, {len(latencies) / elapsed:.0f} req/s, "
+          f"p50 {percentile(latencies, 0.50) * 1000:.1f} ms, p99 {percentile(latencies, 0.99) * 1000:.1f} ms, "
+          f"{len(errors)} errors, {'consistent' if not problems else 'INCONSISTENT'}")
+    for problem in problems:
+        print("   ", problem)
+    return not problems and not errors
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__, formatter_class = argparse.RawDescriptionHelpFormatter)
+    parser.add_argument('--server', choices = ['asgi', 'flask'], default = 'asgi')
+    parser.add_argument('--workers', type = int, nargs = '+', default = [1, 2, 4])
+    parser.add_argument('--projects', type = int, default = 4)
+    parser.add_argument('--concurrency', type = int, default = 32)
+    parser.add_argument('--duration', type = float, default = 10.0)
+    parser.add_argument('--reads', type = int, default = 12, help = "fresh connections reading each project back")
+    args = parser.parse_args()
+    ok = all([run(args.server, workers, args) for workers in args.workers])
+    sys.exit(0 if ok else 1)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,406 @@
+""" The benchmark suite: model, scene, server and startup timings on synthetic projects, saved as JSON.
+
+    python benchmarks/suite.py [--sizes 1000 10000] [--groups model scene server startup]
+                               [--repeat 5] [--out results.json] [--compare baseline.json]
+                               [--frozen dist/DrawingApp/DrawingApp]
+
+Every (group, size) runs in a fresh process, so one case's garbage and caches can't
+leak into the next. The scene group uses Qt's offscreen platform and the server group
+Flask's test client with a throwaway data directory, so the suite runs on a headless
+box with no GPU or network. Results are keyed "group/case/size" and hold the median
+and minimum of the runs in seconds. --compare prints each case against an earlier
+results file.
+
+The startup group cold starts the desktop app in a new process per run, opening a
+project of the given size, and reads the app's own startup report (see DrawingApp's
+StartupReport) plus the wall time of the whole launch. It also records -X importtime
+totals for the app and the server, and each module the app imports at the top level
+that takes a millisecond or more, requests among them though the app only imports it
+on a background thread once the window is up. With --frozen the built executable is timed the same
+way, frozen builds ignore -X importtime so for them the report's phases stand in.
+"""
+import os
+import io
+import sys
+import json
+import time
+import random
+import platform
+import argparse
+import tempfile
+import statistics
+import subprocess
+from contextlib import redirect_stdout
+from synthetic import ROOT, copy_bar_types, random_bars
+
+GROUPS = ['model', 'scene', 'server', 'startup']
+DEFAULT_SIZES = [1_000, 10_000]
+DEFAULT_REPEAT = 5
+QUERIES = 1_000 #hit tests, length edits and the like per run
+UNDO_STEPS = 100
+BATCH = 1_000 #ops per /bars/batch request, the server caps nothing but the desktop sends 200
+LAUNCH_TIMEOUT = 120 #seconds a cold start may take before the run counts as failed
+SLOWER = 1.10 #--compare flags cases slower than this ratio
+
+def measure(results, name, function, repeat, setup = None):
+    """ Runs function repeat times and records the median and minimum, setup runs untimed before each """
+    runs = []
+    for _ in range(repeat):
+        if setup is not None:
+            setup()
+        start = time.perf_counter()
+        function()
+        runs.append(time.perf_counter() - start)
+    results[name] = summary(runs)
+
+def summary(runs):
+    return {'median': statistics.median(runs), 'min': min(runs), 'runs': runs}
+
+def bench_model(size, repeat):
+    from Bar import Bar, PoolProject
+    from CutList import cut_list
+    bar_types = copy_bar_types()
+    rows = list(random_bars(size, bar_types))
+    rng = random.Random(1)
+    results = {}
+    project = PoolProject()
+    def build():
+        project.clear()
+        for bar_type, length, _, _, _, _ in rows:
+            project.add_bar(Bar(bar_type = bar_type, length = length))
+    measure(results, 'build', build, repeat)
+    measure(results, 'calculate_total_cost', project.calculate_total_cost, repeat)
+    measure(results, 'recalculate_totals', project.recalculate_totals, repeat)
+    bars = list(project.bars.values())
+    edits = [(rng.choice(bars), rng.uniform(2.0, 24.0)) for _ in range(QUERIES)]
+    def set_lengths():
+        for bar, length in edits:
+            project.set_bar_length(bar, length)
+    measure(results, f'set_bar_length_x{QUERIES}', set_lengths, repeat)
+    measure(results, 'cut_list', lambda: cut_list(project), repeat)
+    def reprice():
+        #what a catalog reload does to an open project when every price moves
+        for bar_type in bar_types:
+            bar_type.cost_per_unit *= 1.01
+        project.reprice(bar_types)
+    measure(results, 'reprice_all_types', reprice, repeat)
+    return results
+
+def bench_scene(size, repeat):
+    os.environ['QT_QPA_PLATFORM'] = 'offscreen'
+    data_dir = tempfile.TemporaryDirectory()
+    os.environ['POOLSCREEN_DATA_DIR'] = data_dir.name
+    from PyQt6.QtWidgets import QApplication
+    from PyQt6.QtCore import QPointF, QRectF
+    from PyQt6.QtGui import QColor
+    from werkzeug.serving import make_server
+    import threading
+    import DrawingApp
+    import server
+    from PdfExport import PdfExportWorker, snapshot_scene, FIT_TO_PAGE
+
+    #the real Flask app on a local port, so load_bars_from_server goes over HTTP as it does in use
+    httpd = make_server('127.0.0.1', 0, server.app, threaded = True)
+    threading.Thread(target = httpd.serve_forever, daemon = True).start()
+    DrawingApp.SERVER_URL = f"http://127.0.0.1:{httpd.server_port}"
+    app = QApplication.instance() or QApplication([])
+    window = DrawingApp.MainWindow()
+    window.resize(1200, 900)
+    window.show()
+    window.sync.stop() #changes still queue, nothing is sent while the clock runs
+    app.processEvents()
+    area = window.drawing_area
+    white = QColor('white')
+    rows = list(random_bars(size, extent = 3000.0))
+    rng = random.Random(1)
+    results = {}
+
+    #the user's path: one bar at a time, each an undo step and a sync upsert
+    def draw_all():
+        for bar_type, length, x1, y1, x2, y2 in rows:
+            start, end = QPointF(x1, y1), QPointF(x2, y2)
+            item = area.new_bar_item(start, end, bar_type, white)
+            window.add_drawn_bar(length * 10, start, end, bar_type, white, item)
+    measure(results, 'add_drawn_bar', draw_all, 1)
+    window.clear_drawing()
+    app.processEvents()
+
+    server.state.apply_batch([{'op': 'add', 'bar': {'bar_type': bar_type.name, 'length': length, 'start_x': x1, 'start_y': y1,
+                                                    'end_x': x2, 'end_y': y2, 'color': '#ffffffff'}}
+                              for bar_type, length, x1, y1, x2, y2 in rows])
+    def load_from_server():
+        #the bars go in a chunk per pass of the event loop, timed until the last one is in
+        window.load_bars_from_server()
+        while window.loading is not None:
+            app.processEvents()
+    measure(results, 'load_bars_from_server', load_from_server, 1)
+    app.processEvents()
+
+    bounds = area.scene.itemsBoundingRect()
+    points = [QPointF(rng.uniform(bounds.left(), bounds.right()), rng.uniform(bounds.top(), bounds.bottom())) for _ in range(QUERIES)]
+    transform = area.transform()
+    def hit_test():
+        for point in points:
+            area.bar_for_item(area.scene.itemAt(point, transform))
+    measure(results, f'hit_test_x{QUERIES}', hit_test, repeat)
+    items = [bar_data['item'] for bar_data in rng.sample(list(area.drawn_bars.values()), min(QUERIES, size))]
+    def select():
+        for item in items:
+            area.select_bar(item)
+    measure(results, f'select_x{len(items)}', select, repeat)
+
+    #a quarter of the drawing picked with the rubber band, then dragged and dropped as one edit
+    band = QRectF(bounds.topLeft(), bounds.center())
+    def band_select():
+        area.select_bars(area.bars_in_rect(band))
+    measure(results, 'band_select_quarter', band_select, repeat, area.clear_selection)
+    grabbed = next(iter(area.selection.values()))
+    drag_from = grabbed['item'].line().p1()
+    steps = iter(range(1, 1_000_000))
+    def start_drag():
+        area.drag_start, area.drag_bar = drag_from, grabbed
+        area.drag_selection(drag_from + QPointF(1, 1))
+    def drag_frame():
+        #a mouse move and the repaint it causes
+        area.drag_selection(drag_from + QPointF(next(steps) % 50, 1))
+        area.viewport().repaint()
+    def drag_and_drop():
+        start_drag()
+        area.end_drag()
+    start_drag()
+    measure(results, 'drag_selection_frame', drag_frame, repeat)
+    area.end_drag()
+    measure(results, 'drop_selection', area.end_drag, repeat, start_drag)
+    measure(results, 'undo_selection_move', window.undo, repeat, drag_and_drop)
+    area.clear_selection()
+
+    viewport = area.viewport()
+    for zoom in (1.0, 0.3):
+        def at_zoom():
+            area.resetTransform()
+            area.scale(zoom, zoom)
+            area.show_drawing()
+            viewport.repaint() #grid tile and text layout for this zoom, not what's being timed
+        measure(results, f'repaint_zoom_{zoom:g}', viewport.repaint, repeat, at_zoom)
+    area.resetTransform()
+
+    front = window.projection_views[0]
+    def open_front():
+        window.tabs.setCurrentWidget(front)
+        app.processEvents()
+    def back_to_drawing():
+        window.tabs.setCurrentWidget(window.drawing_tab)
+        app.processEvents()
+    measure(results, 'front_view_first_open', open_front, 1)
+    measure(results, 'front_view_reopen', open_front, repeat, back_to_drawing)
+    some_bar = next(iter(area.drawn_bars.values()))
+    def change_one_bar():
+        back_to_drawing()
+        window.apply_bar_height(some_bar, some_bar['bar'].elevation + 1, 8.0)
+    measure(results, 'front_view_reopen_after_edit', open_front, repeat, change_one_bar)
+    back_to_drawing()
+
+    pdf_path = os.path.join(data_dir.name, 'export.pdf')
+    def export():
+        #export_to_pdf minus its dialogs, with the worker run on this thread
+        PdfExportWorker(snapshot_scene(area.scene), pdf_path, FIT_TO_PAGE).run()
+    measure(results, 'export_pdf', export, repeat)
+
+    undo_steps = min(UNDO_STEPS, size)
+    def draw_steps():
+        for bar_type, length, x1, y1, x2, y2 in rows[:undo_steps]:
+            start, end = QPointF(x1, y1 + 5), QPointF(x2, y2 + 5)
+            item = area.new_bar_item(start, end, bar_type, white)
+            window.add_drawn_bar(length * 10, start, end, bar_type, white, item)
+    def undo_all():
+        for _ in range(undo_steps):
+            window.undo()
+    measure(results, f'undo_x{undo_steps}', undo_all, repeat, draw_steps)
+    def redo_all():
+        for _ in range(undo_steps):
+            window.redo()
+    measure(results, f'redo_x{undo_steps}', redo_all, repeat, undo_all)
+
+    httpd.shutdown()
+    return results
+
+def bench_server(size, repeat):
+    data_dir = tempfile.TemporaryDirectory()
+    os.environ['POOLSCREEN_DATA_DIR'] = data_dir.name
+    import server
+    client = server.app.test_client()
+    rows = [{'bar_type': bar_type.name, 'length': length, 'start_x': x1, 'start_y': y1, 'end_x': x2, 'end_y': y2,
+             'color': '#ffffffff'} for bar_type, length, x1, y1, x2, y2 in random_bars(size)]
+    results = {}
+    def clear():
+        client.post('/clear_bars')
+    def batch_add():
+        for start in range(0, size, BATCH):
+            client.post('/bars/batch', json = {'ops': [{'op': 'add', 'bar': bar} for bar in rows[start:start + BATCH]]})
+    measure(results, 'batch_add', batch_add, repeat, clear)
+    def touch():
+        #a change, so the next /get_bars has to serialize again
+        client.post('/bars/batch', json = {'ops': [{'op': 'add', 'bar': rows[0]}]})
+    measure(results, 'get_bars_changed', lambda: client.get('/get_bars'), repeat, touch)
+    measure(results, 'get_bars_unchanged', lambda: client.get('/get_bars'), repeat)
+    etag = client.get('/get_bars').headers['ETag']
+    measure(results, 'get_bars_not_modified', lambda: client.get('/get_bars', headers = {'If-None-Match': etag}), repeat)
+    rev = server.state.rev
+    for _ in range(100):
+        touch()
+    measure(results, 'bars_since_100_changes', lambda: client.get(f'/bars?since={rev}'), repeat)
+    def add_bar_singles():
+        for _ in range(QUERIES // 10):
+            client.post('/add_bar', json = {'type': '2X4', 'length': 8.0, 'position': [0, 0]})
+    measure(results, f'add_bar_x{QUERIES // 10}', add_bar_singles, repeat)
+    server.state.journal.close()
+    return results
+
+def importtime(stderr):
+    """ {top-level module: cumulative seconds} from -X importtime output """
+    modules = {}
+    for line in stderr.splitlines():
+        if line.startswith('import time:'):
+            _, cumulative, name = line[len('import time:'):].split('|')
+            if not name.startswith('  ') and cumulative.strip().isdigit():
+                modules[name.strip()] = int(cumulative) / 1e6
+    return modules
+
+def launch(command, env, timeout = LAUNCH_TIMEOUT):
+    """ Runs a startup-reporting app to the end, returns (its report, wall seconds until the report, stderr) """
+    with tempfile.TemporaryDirectory() as work:
+        report_path = os.path.join(work, 'startup.json')
+        #stderr goes to a file, a full pipe would stall the app before it gets to the report
+        with open(os.path.join(work, 'stderr'), 'w+') as stderr:
+            start = time.perf_counter()
+            process = subprocess.Popen(command, cwd = ROOT, env = dict(env, POOLSCREEN_STARTUP_REPORT = report_path),
+                                       stdout = subprocess.DEVNULL, stderr = stderr)
+            #the window closes itself after writing the report, tearing a big drawing down isn't startup
+            while not os.path.exists(report_path):
+                if process.poll() is not None or time.perf_counter() - start > timeout:
+                    process.kill()
+                    process.wait()
+                    stderr.seek(0)
+                    raise RuntimeError(f"{command[0]} exited without a startup report: {stderr.read()[-2000:]}")
+                time.sleep(0.002)
+            wall = time.perf_counter() - start
+            with open(report_path) as f:
+                report = json.load(f)
+            process.wait(timeout = timeout)
+            stderr.seek(0)
+            return report, wall, stderr.read()
+
+def bench_startup(size, repeat, frozen = None):
+    from ProjectFile import ProjectWriter, BarRecord, PROJECT_SUFFIX
+    work = tempfile.TemporaryDirectory()
+    project_path = os.path.join(work.name, f"startup{PROJECT_SUFFIX}")
+    rows = list(random_bars(size))
+    ProjectWriter(project_path).save(lambda writer: [BarRecord(f"bar{index}", writer.type_index(bar_type), length, x1, y1, x2, y2, 0xffffffff)
+                                                     for index, (bar_type, length, x1, y1, x2, y2) in enumerate(rows)], [])
+    #an empty data directory for the server, and nothing listening where the app looks for one
+    env = dict(os.environ, QT_QPA_PLATFORM = 'offscreen', POOLSCREEN_DATA_DIR = work.name)
+    builds = [('', [sys.executable, os.path.join(ROOT, 'DrawingApp.py')])]
+    if frozen is not None:
+        builds.append(('frozen_', [os.path.abspath(frozen)]))
+    results = {}
+    for prefix, command in builds:
+        runs = {}
+        for _ in range(repeat):
+            report, wall, _ = launch(command + [project_path], env)
+            for phase in ('imports', 'window', 'first_paint', 'project_opened'):
+                runs.setdefault(f'{prefix}{phase}', []).append(report[phase])
+            runs.setdefault(f'{prefix}launch_to_project_opened', []).append(wall)
+        for name, values in runs.items():
+            results[name] = summary(values)
+    modules = {}
+    totals = {'importtime_app_total': [], 'importtime_server_total': []}
+    for _ in range(repeat):
+        _, _, stderr = launch([sys.executable, '-X', 'importtime', os.path.join(ROOT, 'DrawingApp.py'), project_path], env)
+        times = importtime(stderr)
+        totals['importtime_app_total'].append(sum(times.values()))
+        for module, seconds in times.items():
+            modules.setdefault(module, []).append(seconds)
+        server_import = subprocess.run([sys.executable, '-X', 'importtime', '-c', 'import server'], cwd = ROOT, env = env,
+                                       capture_output = True, text = True, check = True)
+        totals['importtime_server_total'].append(sum(importtime(server_import.stderr).values()))
+    for name, values in totals.items():
+        results[name] = summary(values)
+    for module, values in modules.items():
+        if statistics.median(values) >= 0.001:
+            results[f'importtime_{module}'] = summary(values)
+    work.cleanup()
+    return results
+
+def run_worker(group, size, repeat, frozen = None):
+    benches = {'model': bench_model, 'scene': bench_scene, 'server': bench_server,
+               'startup': lambda size, repeat: bench_startup(size, repeat, frozen)}
+    with redirect_stdout(io.StringIO()): #the app prints on most actions
+        results = benches[group](size, repeat)
+    print(json.dumps(results), flush = True)
+    #tearing down tens of thousands of graphics items says nothing about the code measured, skip it
+    os._exit(0)
+
+def environment():
+    info = {'python': platform.python_version(), 'platform': platform.platform(), 'machine': platform.machine(),
+            'cpus': os.cpu_count(), 'time': time.strftime('%Y-%m-%dT%H:%M:%S%z')}
+    try:
+        from PyQt6.QtCore import QT_VERSION_STR, PYQT_VERSION_STR
+        info['qt'] = QT_VERSION_STR
+        info['pyqt'] = PYQT_VERSION_STR
+    except ImportError:
+        pass
+    try:
+        info['commit'] = subprocess.run(['git', 'rev-parse', '--short', 'HEAD'], cwd = ROOT, capture_output = True,
+                                        text = True, check = True).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        pass
+    return info
+
+def compare(results, baseline_path):
+    with open(baseline_path) as f:
+        baseline = json.load(f)['results']
+    print(f"\n{'case':<44} {'baseline':>10} {'now':>10} {'ratio':>7}")
+    for name, stats in results.items():
+        old = baseline.get(name)
+        if old is None:
+            print(f"{name:<44} {'-':>10} {stats['median']:10.4f}")
+            continue
+        ratio = stats['median'] / old['median'] if old['median'] else float('inf')
+        flag = " slower" if ratio > SLOWER else (" faster" if ratio < 1 / SLOWER else "")
+        print(f"{name:<44} {old['median']:10.4f} {stats['median']:10.4f} {ratio:6.2f}x{flag}")
+
+def main():
+    parser = argparse.ArgumentParser(description = __doc__.splitlines()[0])
+    parser.add_argument('--sizes', type = int, nargs = '+', default = DEFAULT_SIZES)
+    parser.add_argument('--groups', nargs = '+', choices = GROUPS, default = GROUPS)
+    parser.add_argument('--repeat', type = int, default = DEFAULT_REPEAT)
+    parser.add_argument('--out', default = 'benchmark_results.json')
+    parser.add_argument('--compare', metavar = 'BASELINE')
+    parser.add_argument('--frozen', metavar = 'EXECUTABLE', help = "a PyInstaller build of DrawingApp to time in the startup group")
+    parser.add_argument('--worker', nargs = 2, metavar = ('GROUP', 'SIZE'), help = argparse.SUPPRESS)
+    args = parser.parse_args()
+    if args.worker:
+        run_worker(args.worker[0], int(args.worker[1]), args.repeat, args.frozen)
+
+    results = {}
+    for group in args.groups:
+        for size in args.sizes:
+            command = [sys.executable, os.path.abspath(__file__), '--worker', group, str(size), '--repeat', str(args.repeat)]
+            if args.frozen:
+                command += ['--frozen', args.frozen]
+            done = subprocess.run(command, capture_output = True, text = True)
+            if done.returncode != 0:
+                print(f"{group} {size}: failed\n{done.stderr}", file = sys.stderr)
+                continue
+            for case, stats in json.loads(done.stdout.strip().splitlines()[-1]).items():
+                name = f"{group}/{case}/{size}"
+                results[name] = stats
+                print(f"{name:<44} median {stats['median']:9.4f}s  min {stats['min']:9.4f}s", flush = True)
+    with open(args.out, 'w') as f:
+        json.dump({'environment': environment(), 'results': results}, f, indent = 1)
+    print(f"wrote {args.out}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,27 @@
+""" Synthetic pool enclosures for the benchmarks """
+import os
+import sys
+import random
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Bar import BarType
+from Catalog import BAR_TYPES
+
+def copy_bar_types():
+    """ Private copies of BAR_TYPES, so repricing in a benchmark can't leak into other runs """
+    return [BarType(name = bar_type.name, cost_per_unit = bar_type.cost_per_unit, thickness = bar_type.thickness, stock_length = bar_type.stock_length) for bar_type in BAR_TYPES]
+
+def random_bars(count, bar_types = BAR_TYPES, seed = 0, extent = 5000.0):
+    """ Yields (bar_type, length_ft, x1, y1, x2, y2) tuples laid out in a square of extent pixels """
+    rng = random.Random(seed)
+    usable = bar_types[1:] #skip the 'Select Bar Type' placeholder
+    for _ in range(count):
+        bar_type = rng.choice(usable)
+        x1 = rng.uniform(0, extent)
+        y1 = rng.uniform(0, extent)
+        length = rng.uniform(2.0, 24.0)
+        if rng.random() < 0.5:
+            x2, y2 = x1 + length * 10, y1
+        else:
+            x2, y2 = x1, y1 + length * 10
+        yield bar_type, length, x1, y1, x2, y2
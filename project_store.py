@@ -0,0 +1,117 @@
+""" Server state partitioned by project.
+
+Every project is its own BarState, with its own lock and its own log directory under
+PROJECTS_DIR. Writes to different projects never wait on each other, and like the default
+state each project's log can be shared by the workers of a multi-process server, see bar_log.
+
+A project is only created by a write, reading one that isn't on disk is a ProjectNotFound.
+Open projects are held with acquire() and release(). Ones nobody holds are closed once
+they've been idle for max_idle seconds, or sooner when more than max_open are open, so
+the log files and flusher thread each open project costs don't pile up.
+"""
+import os
+import re
+import time
+import threading
+from collections import OrderedDict
+from contextlib import contextmanager
+from bar_log import DATA_DIR, open_state
+
+PROJECTS_DIR = os.path.join(DATA_DIR, 'projects')
+PROJECT_ID = re.compile(r'[A-Za-z0-9_-]{1,64}')
+
+class ProjectError(ValueError):
+    """ Raised for a project id that can't name a project """
+
+class ProjectNotFound(ProjectError):
+    """ Raised when reading a project that has never been written to """
+
+class ProjectStore:
+    def __init__(self, directory = PROJECTS_DIR, max_open = 64, max_idle = 300.0, **options):
+        self.directory = directory
+        self.max_open = max_open
+        self.max_idle = max_idle
+        self.options = options #passed to open_state for each project
+        self.states = OrderedDict() #project id -> BarState, least recently used first
+        self.users = {} #project id -> acquire() calls not released yet, only for projects in use
+        self.last_used = {} #project id -> time.monotonic() it was last acquired or released
+        self.swept = time.monotonic()
+        #guards the three dicts and opening projects, each project's bars have their own lock
+        self.lock = threading.Lock()
+
+    def acquire(self, project_id, create = False):
+        """ The project's state, held open until release(project_id). Only create makes a project that isn't on disk """
+        if not PROJECT_ID.fullmatch(project_id):
+            raise ProjectError(f"bad project id {project_id!r}")
+        with self.lock:
+            state = self.states.get(project_id)
+            if state is None:
+                path = os.path.join(self.directory, project_id)
+                if not create and not os.path.isdir(path):
+                    raise ProjectNotFound(f"no project {project_id!r}")
+                state = self.states[project_id] = open_state(path, **self.options)
+            self.states.move_to_end(project_id)
+            self.users[project_id] = self.users.get(project_id, 0) + 1
+            self.last_used[project_id] = time.monotonic()
+            idle = self._take_idle()
+        self._close(idle)
+        return state
+
+    def release(self, project_id):
+        """ Lets go of a state from acquire(). Never closes anything, so it's safe to call from an event loop """
+        with self.lock:
+            users = self.users.pop(project_id) - 1
+            if users:
+                self.users[project_id] = users
+            self.last_used[project_id] = time.monotonic()
+
+    @contextmanager
+    def use(self, project_id, create = False):
+        state = self.acquire(project_id, create)
+        try:
+            yield state
+        finally:
+            self.release(project_id)
+
+    def _take_idle(self):
+        """ Removes the states due to be closed and returns them, called with the lock held """
+        now = time.monotonic()
+        if len(self.states) <= self.max_open and now - self.swept < self.max_idle / 4:
+            return []
+        self.swept = now
+        idle = []
+        open_count = len(self.states)
+        for project_id in list(self.states):
+            if project_id in self.users:
+                continue
+            if open_count > self.max_open or now - self.last_used[project_id] > self.max_idle:
+                idle.append(self.states.pop(project_id))
+                del self.last_used[project_id]
+                open_count -= 1
+        return idle
+
+    def _close(self, states):
+        #outside the store's lock, closing waits for the last fsync
+        for state in states:
+            state.journal.close()
+
+    def close_idle(self):
+        """ Closes what's due without waiting for the next acquire(), e.g. from a timer """
+        with self.lock:
+            self.swept = 0.0
+            idle = self._take_idle()
+        self._close(idle)
+
+    def ids(self):
+        """ Every project with a store on disk, opened here or not """
+        if not os.path.isdir(self.directory):
+            return []
+        return sorted(name for name in os.listdir(self.directory) if PROJECT_ID.fullmatch(name))
+
+    def close(self):
+        with self.lock:
+            states = list(self.states.values())
+            self.states.clear()
+            self.users.clear()
+            self.last_used.clear()
+        self._close(states)
@@ -0,0 +1,162 @@
+""" Headless quoting: prices saved projects without Qt, fanned out over a process pool.
+
+    python quote.py [--prices prices.json] [--format csv|jsonl] [--workers N] [-o out] paths...
+
+A path is a project file, a JSON file or a directory of them. Project files are the
+desktop app's .psp files (see ProjectFile). A JSON file may hold a /get_bars dump (a
+list of bars), a /bars response or a bar_log snapshot (an object with a "bars" list).
+Bars name their type in "bar_type" (desktop) or "type" (web page). --prices is a JSON object
+of bar type name -> cost per unit that overrides the prices in the catalog (see Catalog).
+Results are written as the workers finish them, so with more than one worker they aren't
+in input order; a summary with projects per second goes to stderr.
+"""
+import os
+import sys
+import csv
+import json
+import time
+import argparse
+from concurrent.futures import ProcessPoolExecutor, as_completed
+from Bar import Bar, BarType, PoolProject
+from Catalog import BAR_TYPES
+from ProjectFile import read_project, PROJECT_SUFFIX
+
+PROJECT_SUFFIXES = (PROJECT_SUFFIX, '.json')
+CSV_FIELDS = ['project', 'bar_type', 'count', 'footage', 'cost', 'error']
+
+#set in each worker by init_worker, name -> BarType
+bar_types = {bar_type.name: bar_type for bar_type in BAR_TYPES}
+
+def price_list(prices = None):
+    """ The catalog's types by name, with any prices from the override applied to copies """
+    types = {}
+    for bar_type in BAR_TYPES:
+        cost_per_unit = prices.get(bar_type.name, bar_type.cost_per_unit) if prices else bar_type.cost_per_unit
+        types[bar_type.name] = BarType(name = bar_type.name, cost_per_unit = cost_per_unit, thickness = bar_type.thickness, stock_length = bar_type.stock_length)
+    return types
+
+def init_worker(prices):
+    global bar_types
+    bar_types = price_list(prices)
+
+def project_paths(paths):
+    """ Expands directories into the project files in them, in a stable order """
+    for path in paths:
+        if os.path.isdir(path):
+            for name in sorted(os.listdir(path)):
+                if name.endswith(PROJECT_SUFFIXES):
+                    yield os.path.join(path, name)
+        else:
+            yield path
+
+def load_bars(path):
+    if path.endswith(PROJECT_SUFFIX):
+        data = read_project(path)
+        return [{'bar_type': data.types[record.bar_type].name, 'length': record.length} for record in data.bars.values()]
+    with open(path, 'rb') as f:
+        data = json.load(f)
+    if isinstance(data, dict):
+        data = data.get('bars')
+    if not isinstance(data, list):
+        raise ValueError("expected a list of bars or an object with a bars list")
+    return data
+
+def quote_bars(bars, types):
+    """ Total cost and per-type bill of materials for a list of bar dicts """
+    project = PoolProject()
+    for bar_json in bars:
+        name = bar_json.get('bar_type') or bar_json.get('type')
+        bar_type = types.get(name)
+        if bar_type is None:
+            #unknown to the price list, still counted and measured but priced at 0
+            bar_type = types[name] = BarType(name = name, cost_per_unit = 0, thickness = 2)
+        project.add_bar(Bar(bar_type = bar_type, length = float(bar_json['length'])))
+    return {
+        'bars': len(project),
+        'total_cost': round(project.total_cost, 2),
+        'types': [{'bar_type': totals.bar_type.name, 'count': totals.count,
+                   'footage': round(totals.footage, 2), 'cost': round(totals.cost, 2)}
+                  for totals in sorted(project.type_totals.values(), key = lambda totals: totals.bar_type.name)],
+    }
+
+def quote_file(path):
+    """ Runs in a worker, a bad file becomes an error result instead of stopping the batch """
+    try:
+        result = quote_bars(load_bars(path), dict(bar_types))
+    except (OSError, ValueError, KeyError, TypeError) as e:
+        return {'project': path, 'error': str(e)}
+    return {'project': path, **result}
+
+def quote_files(paths):
+    """ A chunk of projects as one task, the many small ones would otherwise cost more to send than to quote """
+    return [quote_file(path) for path in paths]
+
+def csv_rows(result):
+    if 'error' in result:
+        yield {'project': result['project'], 'error': result['error']}
+        return
+    for totals in result['types']:
+        yield {'project': result['project'], **totals}
+    yield {'project': result['project'], 'bar_type': 'TOTAL', 'count': result['bars'],
+           'footage': round(sum(totals['footage'] for totals in result['types']), 2), 'cost': result['total_cost']}
+
+def run(paths, out, output_format = 'csv', workers = None, prices = None):
+    """ Quotes every project, writing results to out as they finish, returns (projects, errors) """
+    paths = list(project_paths(paths))
+    if output_format == 'csv':
+        writer = csv.DictWriter(out, CSV_FIELDS)
+        writer.writeheader()
+        write = lambda result: writer.writerows(csv_rows(result))
+    else:
+        write = lambda result: out.write(json.dumps(result) + '\n')
+    errors = 0
+    if workers == 1:
+        #no pool, useful for profiling and as the baseline for scaling
+        init_worker(prices)
+        results = map(quote_file, paths)
+        executor = None
+    else:
+        workers = workers or os.cpu_count()
+        executor = ProcessPoolExecutor(max_workers = workers, initializer = init_worker, initargs = (prices,))
+        #each chunk is written as soon as it's done, a slow project doesn't hold up the ones after it
+        chunksize = max(1, min(64, len(paths) // (workers * 4)))
+        futures = [executor.submit(quote_files, paths[start:start + chunksize]) for start in range(0, len(paths), chunksize)]
+        results = (result for future in as_completed(futures) for result in future.result())
+    try:
+        for result in results:
+            errors += 'error' in result
+            write(result)
+    finally:
+        if executor is not None:
+            executor.shutdown(cancel_futures = True)
+    out.flush()
+    return len(paths), errors
+
+def main(argv = None):
+    parser = argparse.ArgumentParser(description = "Price saved pool screen projects")
+    parser.add_argument('paths', nargs = '+', help = "project files or directories of them")
+    parser.add_argument('--prices', help = "JSON object of bar type name -> cost per unit")
+    parser.add_argument('--format', choices = ['csv', 'jsonl'], default = 'csv')
+    parser.add_argument('--workers', type = int, default = None, help = "processes to use, default one per core")
+    parser.add_argument('-o', '--output', help = "write here instead of stdout")
+    args = parser.parse_args(argv)
+
+    prices = None
+    if args.prices:
+        with open(args.prices) as f:
+            prices = json.load(f)
+    out = open(args.output, 'w', newline = '') if args.output else sys.stdout
+    start = time.perf_counter()
+    try:
+        projects, errors = run(args.paths, out, args.format, args.workers, prices)
+    finally:
+        if args.output:
+            out.close()
+    elapsed = time.perf_counter() - start
+    rate = projects / elapsed if elapsed else 0.0
+    print(f"Quoted {projects} projects in {elapsed:.2f}s ({rate:.1f} projects/sec, "
+          f"{args.workers or os.cpu_count()} workers), {errors} errors", file = sys.stderr)
+    return 1 if errors else 0
+
+if __name__ == '__main__':
+    sys.exit(main())
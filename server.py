@@ -1,12 +1,39 @@
-from flask import Flask, render_template, request, jsonify
-import sys
-from PyQt6.QtWidgets import QApplication
-from DrawingApp import MainWindow
+from flask import Flask, render_template, request, jsonify, abort, after_this_request
+from bar_state import BatchError
+from bar_log import open_state
+from project_store import ProjectStore, ProjectError
 
 app = Flask(__name__)
 
-# Store drawn bars
-drawn_bars = []
+# Store drawn bars, kept on disk in bar_log.DATA_DIR
+state = open_state()
+# One more state per project, under bar_log.DATA_DIR/projects
+projects = ProjectStore()
+# /get_bars body for the revision it was built at, so unchanged state isn't serialized again
+full_state_cache = (None, None)
+HEARTBEAT = 15.0 # seconds between keep-alive comments on an idle change feed
+
+def conditional(response, state = state):
+    """ Tags a response with the current revision, 304 if the client already has it """
+    response.set_etag(state.etag())
+    return response.make_conditional(request)
+
+def project_state(project_id, create = False):
+    """ Holds the project open for the rest of the request, 404 for one that isn't there """
+    try:
+        state = projects.acquire(project_id, create)
+    except ProjectError:
+        abort(404)
+    after_this_request(lambda response: release_project(project_id, response))
+    return state
+
+def release_project(project_id, response):
+    if response.is_streamed:
+        #still reading the state after the view returns, let go once it's sent
+        response.call_on_close(lambda: projects.release(project_id))
+    else:
+        projects.release(project_id)
+    return response
 
 @app.route('/')
 def home():
@@ -20,17 +47,96 @@ def add_bar():
         'length': data['length'],
         'position': data['position'],
     }
-    drawn_bars.append(bar_info)
-    return jsonify({"message": "Bar added successfully", "bars": drawn_bars})
+    rev, bar_id = state.add_bar(bar_info)
+    return jsonify({"message": "Bar added successfully", "id": bar_id, "rev": rev})
 
 @app.route('/get_bars', methods=['GET'])
 def get_bars():
-    return jsonify(drawn_bars)
+    global full_state_cache
+    with state.lock:
+        state.refresh()
+        rev, body = full_state_cache
+        if rev != state.rev:
+            rev, bars = state.all_bars()
+            body = app.json.dumps(bars)
+            full_state_cache = (rev, body)
+        response = app.response_class(body, mimetype = 'application/json')
+        return conditional(response)
+
+def bar_changes(state):
+    since = request.args.get('since', type = int)
+    with state.lock:
+        if since is None:
+            rev, bars = state.all_bars()
+            return conditional(jsonify({"rev": rev, "reset": True, "bars": bars, "deleted": []}), state)
+        return conditional(jsonify(state.changes_since(since)), state)
+
+def bar_stream(state):
+    """ Server-sent events, one per revision a client hasn't seen. Each client holds a
+    server thread here, asgi_server's feed is the one for many viewers """
+    since = request.args.get('since', type = int)
+    last_event_id = request.headers.get('Last-Event-ID', '')
+    if last_event_id.isdigit():
+        since = int(last_event_id)
+    def events(since):
+        while True:
+            if since is not None and not state.wait_for_change(since, HEARTBEAT):
+                yield ": keep-alive\n\n"
+                continue
+            with state.lock:
+                changes = state.changes_since(-1 if since is None else since)
+                since = changes['rev']
+            yield f"id: {since}\nevent: bars\ndata: {app.json.dumps(changes)}\n\n"
+    return app.response_class(events(since), mimetype = 'text/event-stream', headers = {'Cache-Control': 'no-cache'})
+
+def bars_batch(state):
+    data = request.get_json(silent = True) or {}
+    try:
+        rev, ids = state.apply_batch(data.get('ops'))
+    except BatchError as e:
+        return jsonify({"error": str(e)}), 400
+    return jsonify({"rev": rev, "ids": ids})
+
+def clear(state):
+    rev = state.clear()
+    return jsonify({"message": "All bars cleared", "rev": rev})
+
+@app.route('/bars', methods=['GET'])
+def get_bar_changes():
+    return bar_changes(state)
+
+@app.route('/bars/stream', methods=['GET'])
+def get_bar_stream():
+    return bar_stream(state)
+
+@app.route('/bars/batch', methods=['POST'])
+def post_bars_batch():
+    return bars_batch(state)
 
 @app.route('/clear_bars', methods=['POST'])
 def clear_bars():
-    drawn_bars.clear()
-    return jsonify({"message": "All bars cleared"})
+    return clear(state)
+
+# The same routes scoped to one project, each project's bars kept apart from the others'
+@app.route('/projects', methods=['GET'])
+def list_projects():
+    return jsonify({"projects": projects.ids()})
+
+@app.route('/projects/<project_id>/bars', methods=['GET'])
+def get_project_bars(project_id):
+    return bar_changes(project_state(project_id))
+
+@app.route('/projects/<project_id>/bars/stream', methods=['GET'])
+def get_project_bar_stream(project_id):
+    return bar_stream(project_state(project_id))
+
+@app.route('/projects/<project_id>/bars/batch', methods=['POST'])
+def post_project_bars_batch(project_id):
+    return bars_batch(project_state(project_id, create = True))
+
+@app.route('/projects/<project_id>/bars/clear', methods=['POST'])
+def clear_project_bars(project_id):
+    return clear(project_state(project_id))
 
 if __name__ == '__main__':
     app.run(debug=True)  # Run Flask on localhost:5000
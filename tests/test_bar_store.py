@@ -0,0 +1,95 @@
+""" BarStore on its own and as the backing of a PoolProject.
+
+    python -m unittest discover tests
+"""
+import gc
+import os
+import sys
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Bar import Bar, BarType, PoolProject
+from BarStore import BarStore
+
+class BarStoreTest(unittest.TestCase):
+    def setUp(self):
+        self.two_by_two = BarType(name = "2x2", cost_per_unit = 1.5, thickness = 2)
+        self.two_by_four = BarType(name = "2x4", cost_per_unit = 2.25, thickness = 4)
+        self.store = BarStore([self.two_by_two, self.two_by_four])
+
+    def test_rows_are_reused_once(self):
+        first = self.store.append(self.two_by_two, 4.0)
+        self.store.append(self.two_by_four, 2.0)
+        self.store.remove_bar(first)
+        with self.assertRaises(KeyError):
+            self.store.remove_bar(first)
+        self.assertEqual(self.store.free_rows, [first.row])
+        again = self.store.append(self.two_by_four, 1.0)
+        self.assertEqual(again.row, first.row)
+        self.assertEqual(len(self.store), 2)
+
+    def test_reprice_keeps_shared_types(self):
+        self.store.append(self.two_by_two, 4.0)
+        total = self.store.reprice({self.two_by_two: 3.0, "2x4": 5.0})
+        self.assertAlmostEqual(total, 12.0)
+        #the store's own prices change, the BarTypes other projects use don't
+        self.assertEqual(self.two_by_two.cost_per_unit, 1.5)
+        self.assertEqual(self.store.prices(), [3.0, 5.0])
+        self.assertAlmostEqual(self.store.type_totals[self.two_by_two].cost, 12.0)
+
+    def test_copies_a_bar(self):
+        view = self.store.add_bar(Bar(self.two_by_four, 3.0, elevation = 1.0, height = 2.0))
+        self.assertEqual((view.bar_type, view.length, view.elevation, view.height), (self.two_by_four, 3.0, 1.0, 2.0))
+
+class BackedProjectTest(unittest.TestCase):
+    def setUp(self):
+        self.two_by_two = BarType(name = "2x2", cost_per_unit = 1.5, thickness = 2)
+        self.two_by_four = BarType(name = "2x4", cost_per_unit = 2.25, thickness = 4)
+        self.project = PoolProject(check = True, store = BarStore([self.two_by_two]))
+
+    def test_running_totals(self):
+        bars = [self.project.new_bar(self.two_by_two, 2.0) for _ in range(3)]
+        self.project.add_bars(bars)
+        self.project.set_bar_length(bars[0], 4.0)
+        self.project.set_bar_type(bars[1], self.two_by_four)
+        self.project.update_bars([(bars[2], self.two_by_four, 1.0)])
+        self.project.verify_totals()
+        self.assertAlmostEqual(self.project.total_cost, 4.0 * 1.5 + 3.0 * 2.25)
+        self.assertAlmostEqual(self.project.total_cost, self.project.store.calculate_total_cost())
+        self.project.remove_bar(bars[0])
+        self.assertEqual(len(self.project.store), 2)
+        self.project.clear()
+        self.assertEqual(len(self.project.store), 0)
+
+    def test_removed_bar_comes_back(self):
+        bar = self.project.new_bar(self.two_by_two, 4.0, elevation = 1.0)
+        self.assertEqual(len(self.project.store), 0) #not counted until it's added
+        self.project.add_bar(bar)
+        self.project.remove_bar(bar)
+        #as an undo would, the row still has the bar's values
+        self.project.add_bar(bar)
+        self.assertEqual((bar.bar_type, bar.length, bar.elevation), (self.two_by_two, 4.0, 1.0))
+        self.assertEqual(len(self.project.store), 1)
+        self.project.verify_totals()
+
+    def test_row_freed_with_its_view(self):
+        bar = self.project.new_bar(self.two_by_two, 4.0)
+        self.project.add_bar(bar)
+        self.project.remove_bar(bar)
+        row = bar.row
+        del bar
+        gc.collect()
+        self.assertEqual(self.project.store.free_rows, [row])
+        self.assertEqual(self.project.new_bar(self.two_by_four, 1.0).row, row)
+
+    def test_reprice_uses_the_store(self):
+        bar = self.project.new_bar(self.two_by_two, 4.0)
+        self.project.add_bar(bar)
+        self.two_by_two.cost_per_unit = 3.0
+        self.project.reprice([self.two_by_two])
+        self.project.verify_totals()
+        self.assertAlmostEqual(self.project.total_cost, 12.0)
+        self.assertAlmostEqual(bar.cost(), 12.0)
+
+if __name__ == "__main__":
+    unittest.main()
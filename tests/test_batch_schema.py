@@ -0,0 +1,49 @@
+""" Both servers take and refuse the same /bars/batch bodies.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+#the servers open their state on import, keep it out of the real data directory
+os.environ.setdefault('POOLSCREEN_DATA_DIR', tempfile.mkdtemp())
+import server
+import asgi_server
+from litestar.testing import TestClient
+
+BAR = {"bar_type": "2X4", "length": 3.0, "start_x": 0, "start_y": 0, "end_x": 30, "end_y": 0}
+BATCHES = {
+    "add": ([{"op": "add", "bar": BAR}], 200),
+    "upsert with defaults": ([{"op": "upsert", "id": "a", "bar": BAR}], 200),
+    "update": ([{"op": "upsert", "id": "b", "bar": BAR}, {"op": "update", "id": "b", "bar": {"length": 4}}], 200),
+    "delete": ([{"op": "delete", "id": "a"}], 200),
+    "missing fields": ([{"op": "upsert", "id": "x", "bar": {"start_x": 5, "length": 1.0}}], 400),
+    "string length": ([{"op": "upsert", "id": "x", "bar": {**BAR, "length": "abc"}}], 400),
+    "bool coordinate": ([{"op": "add", "bar": {**BAR, "end_y": True}}], 400),
+    "numeric color": ([{"op": "add", "bar": {**BAR, "color": 7}}], 400),
+    "bad update": ([{"op": "upsert", "id": "c", "bar": BAR}, {"op": "update", "id": "c", "bar": {"start_x": "left"}}], 400),
+    "unknown op": ([{"op": "move", "id": "a", "bar": BAR}], 400),
+    "no id": ([{"op": "upsert", "bar": BAR}], 400),
+    "bar not an object": ([{"op": "add", "bar": [1, 2]}], 400),
+}
+
+class BatchSchemaTest(unittest.TestCase):
+    def test_same_answers(self):
+        flask_client = server.app.test_client()
+        with TestClient(app = asgi_server.app) as asgi_client:
+            for name, (ops, status) in BATCHES.items():
+                with self.subTest(name):
+                    self.assertEqual(flask_client.post('/bars/batch', json = {"ops": ops}).status_code, status)
+                    self.assertEqual(asgi_client.post('/bars/batch', json = {"ops": ops}).status_code, status)
+
+    def test_defaults_filled_in(self):
+        state = server.state
+        state.apply_batch([{"op": "upsert", "id": "d", "bar": BAR}])
+        self.assertEqual(state.bars["d"]["color"], "#ffffffff")
+        self.assertEqual(state.bars["d"]["elevation"], 0.0)
+
+if __name__ == "__main__":
+    unittest.main()
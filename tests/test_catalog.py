@@ -0,0 +1,47 @@
+""" Catalog reloads update the types in place and say what changed.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import json
+import tempfile
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Catalog import Catalog
+
+def entry(type_id, name, cost):
+    return {"id": type_id, "name": name, "cost_per_unit": cost, "thickness": 2, "stock_length": 24.0}
+
+class CatalogTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "catalog.json")
+        self.write([entry(1, "2X4", 1.5), entry(2, "2X6", 2.25)])
+        self.catalog = Catalog(self.path)
+        self.changes = []
+        self.catalog.listeners.append(lambda repriced, renamed: self.changes.append((repriced, renamed)))
+
+    def write(self, entries):
+        with open(self.path, 'w') as f:
+            json.dump(entries, f)
+
+    def test_rename_and_reprice(self):
+        two_by_four, two_by_six = self.catalog.types
+        self.write([entry(1, "2X4 Beam", 1.5), entry(2, "2X6", 3.0)])
+        self.assertEqual(self.catalog.load(), {two_by_six: 2.25})
+        #the same objects, bars drawn with them pick up the new name and price
+        self.assertEqual(self.catalog.types, [two_by_four, two_by_six])
+        self.assertEqual(two_by_four.name, "2X4 Beam")
+        self.assertIs(self.catalog.get("2X4 Beam"), two_by_four)
+        self.assertIsNone(self.catalog.get("2X4"))
+        self.assertEqual(self.changes, [({two_by_six: 2.25}, {two_by_four: "2X4"})])
+
+    def test_unchanged_reload_is_quiet(self):
+        self.catalog.load()
+        self.assertEqual(self.changes, [])
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,99 @@
+""" PoolProject's running totals, checked against a full recompute after every change.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Bar import Bar, BarType, PoolProject
+
+class PoolProjectTest(unittest.TestCase):
+    def setUp(self):
+        #check mode recomputes after each change and raises if the running totals drifted
+        self.project = PoolProject(check = True)
+        self.changed = []
+        self.project.listeners.append(self.changed.append)
+        self.two_by_two = BarType(name = "2x2", cost_per_unit = 1.5, thickness = 2)
+        self.two_by_four = BarType(name = "2x4", cost_per_unit = 2.25, thickness = 4)
+
+    def assertTotals(self, total_cost, counts):
+        """ counts is BarType -> (count, footage) """
+        self.project.verify_totals()
+        self.assertAlmostEqual(self.project.calculate_total_cost(), total_cost)
+        self.assertEqual(set(self.project.type_totals), set(counts))
+        for bar_type, (count, footage) in counts.items():
+            totals = self.project.type_totals[bar_type]
+            self.assertEqual(totals.count, count)
+            self.assertAlmostEqual(totals.footage, footage)
+            self.assertAlmostEqual(totals.cost, footage * bar_type.cost_per_unit)
+
+    def test_add_and_remove(self):
+        first = Bar(self.two_by_two, 4.0)
+        second = Bar(self.two_by_four, 10.0)
+        self.project.add_bar(first)
+        self.project.add_bar(second)
+        self.assertTotals(6.0 + 22.5, {self.two_by_two: (1, 4.0), self.two_by_four: (1, 10.0)})
+        self.assertIn(first, self.project)
+        self.assertEqual(len(self.project), 2)
+        self.project.remove_bar(first)
+        self.assertTotals(22.5, {self.two_by_four: (1, 10.0)})
+        self.assertNotIn(first, self.project)
+        self.project.remove_bar(second)
+        self.assertTotals(0.0, {})
+        self.assertEqual(self.changed, [self.two_by_two, self.two_by_four, self.two_by_two, self.two_by_four])
+
+    def test_set_length_and_type(self):
+        bar = Bar(self.two_by_two, 4.0)
+        self.project.add_bar(bar)
+        self.project.set_bar_length(bar, 6.0)
+        self.assertTotals(9.0, {self.two_by_two: (1, 6.0)})
+        del self.changed[:]
+        self.project.set_bar_type(bar, self.two_by_four)
+        self.assertTotals(13.5, {self.two_by_four: (1, 6.0)})
+        self.assertEqual(self.changed, [self.two_by_two, self.two_by_four])
+
+    def test_add_bars(self):
+        bars = [Bar(self.two_by_two, 1.0 + index) for index in range(5)] + [Bar(self.two_by_four, 2.0)]
+        self.project.add_bars(bars)
+        self.assertTotals(15.0 * 1.5 + 2.0 * 2.25, {self.two_by_two: (5, 15.0), self.two_by_four: (1, 2.0)})
+        #once per type, not once per bar
+        self.assertEqual(self.changed, [self.two_by_two, self.two_by_four])
+
+    def test_update_bars(self):
+        bars = [Bar(self.two_by_two, 2.0) for _ in range(3)]
+        self.project.add_bars(bars)
+        del self.changed[:]
+        self.project.update_bars([(bars[0], self.two_by_four, 3.0), (bars[1], self.two_by_two, 5.0)])
+        self.assertTotals(7.0 * 1.5 + 3.0 * 2.25, {self.two_by_two: (2, 7.0), self.two_by_four: (1, 3.0)})
+        self.assertEqual(sorted(bar_type.name for bar_type in self.changed), ["2x2", "2x4"])
+        #moving the last bars off a type drops its entry
+        self.project.update_bars([(bars[1], self.two_by_four, 5.0), (bars[2], self.two_by_four, 2.0)])
+        self.assertTotals(10.0 * 2.25, {self.two_by_four: (3, 10.0)})
+
+    def test_reprice(self):
+        self.project.add_bars([Bar(self.two_by_two, 4.0), Bar(self.two_by_four, 2.0)])
+        del self.changed[:]
+        self.two_by_two.cost_per_unit = 3.0
+        self.project.reprice([self.two_by_two])
+        self.assertTotals(12.0 + 4.5, {self.two_by_two: (1, 4.0), self.two_by_four: (1, 2.0)})
+        self.assertEqual(self.changed, [self.two_by_two])
+
+    def test_clear(self):
+        self.project.add_bars([Bar(self.two_by_two, 4.0), Bar(self.two_by_four, 2.0)])
+        del self.changed[:]
+        self.project.clear()
+        self.assertTotals(0.0, {})
+        self.assertEqual(len(self.project), 0)
+        self.assertEqual(self.changed, [self.two_by_two, self.two_by_four])
+
+    def test_check_mode_catches_drift(self):
+        bar = Bar(self.two_by_two, 4.0)
+        self.project.add_bar(bar)
+        bar.length = 5.0 #changed behind the project's back
+        with self.assertRaises(AssertionError):
+            self.project.add_bar(Bar(self.two_by_four, 1.0))
+
+if __name__ == "__main__":
+    unittest.main()
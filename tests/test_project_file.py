@@ -0,0 +1,57 @@
+""" ProjectWriter saves and appends that read_project can replay.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import tempfile
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from Bar import BarType
+from ProjectFile import ProjectWriter, BarRecord, read_project
+
+TWO_BY_FOUR = BarType(name = "2x4", cost_per_unit = 2.25, thickness = 4)
+
+class ProjectWriterTest(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.path = os.path.join(directory.name, "project.psp")
+        self.bars = {"a": 4.0}
+
+    def record(self, writer, bar_id):
+        length = self.bars.get(bar_id)
+        if length is None:
+            return None
+        return BarRecord(bar_id, writer.type_index(TWO_BY_FOUR), length, 0.0, 0.0, length * 10, 0.0, 0xffffffff)
+
+    def save(self, writer):
+        writer.save(lambda writer: (self.record(writer, bar_id) for bar_id in self.bars), [])
+
+    def test_save_then_append(self):
+        writer = ProjectWriter(self.path)
+        self.save(writer)
+        self.bars["b"] = 2.0
+        writer.bar_changed("b")
+        del self.bars["a"]
+        writer.bar_removed("a")
+        self.assertFalse(writer.needs_compaction)
+        self.assertGreater(writer.append(self.record), 0)
+        data = read_project(self.path)
+        self.assertEqual({bar_id: record.length for bar_id, record in data.bars.items()}, {"b": 2.0})
+
+    def test_no_append_before_a_snapshot(self):
+        #e.g. Save As failed, a delta on its own would leave a file read_project rejects
+        with open(self.path, 'wb') as f:
+            f.write(b"someone else's file")
+        writer = ProjectWriter(self.path)
+        writer.bar_changed("a")
+        self.assertTrue(writer.needs_compaction)
+        with self.assertRaises(ValueError):
+            writer.append(self.record)
+        with open(self.path, 'rb') as f:
+            self.assertEqual(f.read(), b"someone else's file")
+
+if __name__ == "__main__":
+    unittest.main()
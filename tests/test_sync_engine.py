@@ -0,0 +1,122 @@
+""" SyncEngine against an in-memory BarState, no server or network involved.
+
+    python -m unittest discover tests
+"""
+import os
+import sys
+import unittest
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, ROOT)
+from bar_state import BarState, BatchError
+from SyncEngine import SyncEngine
+
+class Response:
+    def __init__(self, status_code, body = None):
+        self.status_code = status_code
+        self.body = body
+
+    def json(self):
+        return self.body
+
+    def raise_for_status(self):
+        pass
+
+class StateSession:
+    """ Answers SyncEngine's two requests the way server.py does, from a BarState """
+    def __init__(self, state):
+        self.state = state
+        self.batches = 0
+
+    def post(self, url, json, timeout):
+        self.batches += 1
+        try:
+            rev, ids = self.state.apply_batch(json['ops'])
+        except BatchError as e:
+            return Response(400, {"error": str(e)})
+        return Response(200, {"rev": rev, "ids": ids})
+
+    def get(self, url, timeout):
+        rev, bars = self.state.all_bars()
+        return Response(200, {"rev": rev, "reset": True, "bars": bars, "deleted": []})
+
+    def close(self):
+        pass
+
+def bar(length):
+    return {"bar_type": "2X4", "length": length, "start_x": 0.0, "start_y": 0.0, "end_x": length * 10, "end_y": 0.0}
+
+class SyncEngineTest(unittest.TestCase):
+    def setUp(self):
+        self.state = BarState()
+        self.sync = SyncEngine(max_pending = 3, batch_size = 4)
+        self.sync.session = StateSession(self.state)
+
+    def flush(self):
+        #the worker exits once stop() finds nothing left to send
+        self.sync.start()
+        self.sync.stop(timeout = 5.0)
+
+    def test_full_queue_keeps_ids(self):
+        for index in range(5):
+            self.sync.upsert(f"bar{index}", bar(index))
+        self.assertEqual(self.sync.depth, 5)
+        self.assertEqual(self.sync.overflow, {"bar3", "bar4"})
+        self.flush()
+        #the lookup builds the ops the queue had no room for, from the bars as they are now
+        current = {"bar3": bar(30.0)}
+        self.assertEqual(self.sync.refill(current.get), 2)
+        self.flush()
+        self.assertEqual(self.sync.depth, 0)
+        self.assertEqual(sorted(self.state.bars), ["bar0", "bar1", "bar2", "bar3"])
+        self.assertEqual(self.state.bars["bar3"]["length"], 30.0)
+
+    def test_refused_op_spares_the_rest(self):
+        self.sync.upsert("good", bar(1.0))
+        self.sync.upsert("bad", "not a bar")
+        self.sync.delete("gone")
+        self.flush()
+        self.assertEqual(sorted(self.state.bars), ["good"])
+        self.assertEqual(self.sync.dropped, 1)
+        self.assertEqual(self.sync.rejected, {"bad"})
+        #a newer change to the bar replaces the refused one
+        self.sync.upsert("bad", bar(2.0))
+        self.assertEqual(self.sync.dropped, 0)
+
+    def test_newer_op_replaces_refused_one(self):
+        session = self.sync.session
+        post = session.post
+        def edited_in_flight(url, json, timeout):
+            #the bar is fixed while its bad op is on the way, the fix is queued behind it
+            if session.batches == 0:
+                self.sync.upsert("bar", bar(2.0))
+            return post(url, json, timeout)
+        session.post = edited_in_flight
+        self.sync.upsert("bar", "not a bar")
+        self.flush()
+        self.assertEqual(self.state.bars["bar"]["length"], 2.0)
+        self.assertEqual(self.sync.dropped, 0)
+
+    def test_sent_bar_is_no_longer_refused(self):
+        self.sync.upsert("bar", "not a bar")
+        self.flush()
+        self.assertEqual(self.sync.dropped, 1)
+        #marked refused after its newer op was queued, sending that op clears it
+        self.sync.upsert("other", bar(1.0))
+        self.sync.rejected.add("other")
+        self.flush()
+        self.assertEqual(self.sync.rejected, {"bar"})
+
+    def test_resync(self):
+        self.state.apply_batch([{"op": "upsert", "id": "stale", "bar": bar(1.0)},
+                                {"op": "upsert", "id": "kept", "bar": bar(1.0)}])
+        self.sync.upsert("bad", "not a bar")
+        self.flush()
+        self.assertEqual(self.sync.dropped, 1)
+        self.sync.resync({"kept": bar(2.0), "bad": bar(3.0), "new": bar(4.0)})
+        self.assertEqual(self.sync.dropped, 0)
+        self.flush()
+        self.assertEqual({bar_id: value["length"] for bar_id, value in self.state.bars.items()},
+                         {"kept": 2.0, "bad": 3.0, "new": 4.0})
+
+if __name__ == "__main__":
+    unittest.main()